@@ -0,0 +1 @@
+"""Benchmarks do planejador (não fazem parte do pacote)."""
@@ -0,0 +1,45 @@
+"""Planilhas sintéticas de entregas na região de Jaú."""
+import random
+
+# Centro aproximado de cada cidade atendida (lat, lon)
+CIDADES = {
+    'Itapuí': (-22.2336, -48.7197),
+    'Jaú': (-22.2964, -48.5578),
+    'Bariri': (-22.0730, -48.7403),
+    'Bocaina': (-22.1364, -48.5183),
+    'Pederneiras': (-22.3517, -48.7750),
+    'Dois Córregos': (-22.3664, -48.3803),
+    'Barra Bonita': (-22.4947, -48.5578),
+    'Mineiros do Tietê': (-22.4119, -48.4508),
+}
+
+RUAS = [
+    'Rua Floriano Peixoto', 'Rua Sete de Setembro', 'Avenida Brasil', 'Rua XV de Novembro',
+    'Rua Tiradentes', 'Rua São Paulo', 'Rua Rui Barbosa', 'Avenida Independência',
+    'Rua Amaral Gurgel', 'Rua Major Prado', 'Rua Riachuelo', 'Rua Humaitá',
+]
+
+# Fração das linhas com endereço que o Nominatim falso não encontra
+FRACAO_INEXISTENTES = 0.02
+ENDERECO_INEXISTENTE = "Endereço Inexistente"
+
+def gerar_enderecos(n, semente=0):
+    """Retorna (nomes, enderecos) de n paradas, sempre iguais para a mesma semente"""
+    rng = random.Random(semente)
+    nomes, enderecos = [], []
+    for i in range(n):
+        nomes.append(f"Cliente {i + 1}")
+        if rng.random() < FRACAO_INEXISTENTES:
+            enderecos.append(f"{ENDERECO_INEXISTENTE} {i + 1}")
+            continue
+        cidade = rng.choice(list(CIDADES))
+        enderecos.append(f"{rng.choice(RUAS)}, {rng.randint(1, 2500)}, {cidade} - SP")
+    return nomes, enderecos
+
+def gerar_planilha(arquivo, n, semente=0):
+    """Grava uma planilha com as colunas Nome e Endereco e n paradas"""
+    import pandas as pd
+
+    nomes, enderecos = gerar_enderecos(n, semente)
+    pd.DataFrame({'Nome': nomes, 'Endereco': enderecos}).to_excel(arquivo, index=False)
+    return arquivo
@@ -0,0 +1,191 @@
+"""Benchmark do fluxo completo contra o Nominatim e o OSRM falsos.
+
+Para cada tamanho de planilha mede, em um diretório temporário próprio:
+
+    planilha          leitura da planilha sintética
+    geocodificacao    cache vazio (fria) e com o cache da rodada anterior (quente)
+    matriz            cache de distâncias vazio (fria) e preenchido (quente)
+    otimizacao        otimizador.resolver com tempo limite fixo
+    pdf               relatorio.gerar_pdf, com o subconjunto da fonte já gerado (como
+                      nas execuções diárias, em que fontes_cache persiste)
+
+e a distância total da rota, comparada com benchmarks/referencia.json para que
+regressões de desempenho e de qualidade apareçam juntas. Uso (na raiz do repositório):
+
+    python -m benchmarks.executar                        # 10, 50, 200 e 1000 paradas
+    python -m benchmarks.executar --tamanhos 10 50 --latencia-osrm 0.3 --taxa-429 0.05
+    python -m benchmarks.executar --gravar-referencia    # atualiza a referência
+
+Retorna 1 quando alguma rota fica mais longa que a referência além da tolerância
+ou quando alguma etapa fica mais lenta que a referência além da tolerância de tempo.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from .dados import gerar_planilha
+from .servidores import ServicoFalso
+
+TAMANHOS = (10, 50, 200, 1000)
+REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "referencia.json")
+ETAPAS = ('planilha', 'geocodificacao_fria', 'geocodificacao_quente', 'matriz_fria', 'matriz_quente',
+          'otimizacao', 'pdf')
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="benchmarks.executar", description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS))
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--latencia-nominatim", type=float, default=0.05, help="Segundos por resposta")
+    parser.add_argument("--latencia-osrm", type=float, default=0.1, help="Segundos por resposta")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Probabilidade de HTTP 503")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Probabilidade de HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After dos 503/429, em segundos")
+    parser.add_argument("--nominatim-rps", type=float, default=50.0,
+                        help="Limite do cliente para o Nominatim (o público exige 1)")
+    parser.add_argument("--osrm-rps", type=float, default=20.0, help="Limite do cliente para o OSRM")
+    parser.add_argument("--workers-geocodificacao", type=int, default=6)
+    parser.add_argument("--metodo", default="busca_local")
+    parser.add_argument("--tempo-otimizacao", type=float, default=2.0)
+    parser.add_argument("--referencia", default=REFERENCIA)
+    parser.add_argument("--gravar-referencia", action="store_true", help="Grava os resultados como nova referência")
+    parser.add_argument("--tolerancia-km", type=float, default=0.01, help="Piora relativa aceita na distância")
+    parser.add_argument("--tolerancia-tempo", type=float, default=1.0, help="Piora relativa aceita em cada etapa")
+    parser.add_argument("--resultado", help="Arquivo JSON com os resultados desta execução")
+    parser.add_argument("--verboso", action="store_true", help="Mostra a saída do planejador")
+    return parser
+
+@contextlib.contextmanager
+def _silencioso(ativo=True):
+    if not ativo:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+def _medir(tempos, etapa, funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    tempos[etapa] = time.perf_counter() - inicio
+    return resultado
+
+def executar_cenario(n, args):
+    """Roda todas as etapas para uma planilha de n paradas e retorna o resultado do cenário"""
+    from planejador import distancias, geocodificacao, otimizador, planilha, relatorio
+    from planejador.cliente_http import obter_cliente
+
+    tempos = {}
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=f"bench-{n}-") as pasta:
+        os.chdir(pasta)
+        try:
+            arquivo = gerar_planilha("ENDERECOS-ROTA.xlsx", n, args.semente)
+            with _silencioso(not args.verboso):
+                enderecos, nomes = _medir(tempos, 'planilha', planilha.ler_planilha, arquivo)
+
+                cache = geocodificacao.CacheGeocodificacao()
+                resultados = _medir(tempos, 'geocodificacao_fria', geocodificacao.geocodificar_lote, enderecos, cache,
+                                    max_workers=args.workers_geocodificacao, progresso=False)
+                cache = geocodificacao.CacheGeocodificacao()
+                _medir(tempos, 'geocodificacao_quente', geocodificacao.geocodificar_lote, enderecos, cache,
+                       max_workers=args.workers_geocodificacao, progresso=False)
+
+                validos = [(e, c) for e, c, _ in resultados if c]
+                partida = validos[0][1]
+                coordenadas = [partida] + [c for _, c in validos[1:]]
+                enderecos_validos = [e for e, _ in validos]
+
+                distancias.fechar_cache_distancia()
+                matriz = _medir(tempos, 'matriz_fria', distancias.calcular_matriz_distancias, coordenadas)
+                _medir(tempos, 'matriz_quente', distancias.calcular_matriz_distancias, coordenadas)
+                distancias.fechar_cache_distancia()
+
+                solucao = _medir(tempos, 'otimizacao', otimizador.resolver, matriz, metodo=args.metodo,
+                                 tempo_limite=args.tempo_otimizacao,
+                                 estimativa=distancias.matriz_haversine(coordenadas))
+                rota = solucao['rota']
+                _medir(tempos, 'pdf', relatorio.gerar_pdf, "rota.pdf", f"Benchmark {n}", enderecos_validos[0],
+                       solucao['distancia'], [nomes[0]] + [""] * (len(rota) - 1),
+                       [enderecos_validos[i] for i in rota],
+                       [matriz[a][b] for a, b in zip(rota, rota[1:])])
+        finally:
+            os.chdir(diretorio_original)
+
+    return {
+        'paradas': n,
+        'geocodificadas': len(validos),
+        'tempos': tempos,
+        'distancia_km': round(float(solucao['distancia']), 1),
+        'distancia_gulosa_km': round(float(solucao['distancia_gulosa']), 1),
+        'http': obter_cliente().resumo(),
+    }
+
+def comparar(resultado, referencia, tolerancia_km, tolerancia_tempo):
+    """Lista as regressões do cenário em relação à referência"""
+    problemas = []
+    if not referencia:
+        return problemas
+    if resultado['distancia_km'] > referencia['distancia_km'] * (1 + tolerancia_km):
+        problemas.append(f"distância {resultado['distancia_km']:.1f} km > referência {referencia['distancia_km']:.1f} km")
+    for etapa, tempo in resultado['tempos'].items():
+        tempo_ref = referencia.get('tempos', {}).get(etapa)
+        # Etapas muito curtas oscilam demais para serem comparadas
+        if tempo_ref and max(tempo, tempo_ref) > 0.05 and tempo > tempo_ref * (1 + tolerancia_tempo):
+            problemas.append(f"{etapa} {tempo:.2f}s > referência {tempo_ref:.2f}s")
+    return problemas
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    from planejador import distancias, geocodificacao, relatorio
+    from planejador.cliente_http import ClienteHTTP, definir_cliente
+
+    referencias = {}
+    if os.path.exists(args.referencia) and not args.gravar_referencia:
+        with open(args.referencia, 'r', encoding='utf-8') as f:
+            referencias = json.load(f)
+
+    falsos = dict(taxa_erro=args.taxa_erro, taxa_429=args.taxa_429, retry_after=args.retry_after,
+                  semente=args.semente)
+    resultados = {}
+    regressoes = 0
+    with ServicoFalso(latencia=args.latencia_nominatim, **falsos) as nominatim, \
+         ServicoFalso(latencia=args.latencia_osrm, **falsos) as osrm, \
+         tempfile.TemporaryDirectory(prefix="bench-fontes-") as fontes:
+        # Uma pasta de fontes para todos os cenários, gerada antes das medições
+        relatorio.PASTA_CACHE_FONTES = fontes
+        relatorio._fontes_unicode()
+        geocodificacao.NOMINATIM_URL = nominatim.url
+        distancias.OSRM_URL = osrm.url
+        print(f"{'paradas':>8} " + " ".join(f"{e:>21}" for e in ETAPAS) + f" {'km':>9} {'ref km':>9}")
+        for n in args.tamanhos:
+            # Cliente novo por cenário, para que as métricas HTTP sejam só deste tamanho
+            definir_cliente(ClienteHTTP(limites={'nominatim': (args.nominatim_rps, max(1, int(args.nominatim_rps))),
+                                                 'osrm': (args.osrm_rps, max(1, int(args.osrm_rps)))}))
+            resultado = executar_cenario(n, args)
+            resultados[str(n)] = resultado
+            referencia = referencias.get(str(n))
+            ref_km = f"{referencia['distancia_km']:9.1f}" if referencia else f"{'-':>9}"
+            print(f"{n:>8} " + " ".join(f"{resultado['tempos'][e]:>20.2f}s" for e in ETAPAS)
+                  + f" {resultado['distancia_km']:9.1f} {ref_km}")
+            for problema in comparar(resultado, referencia, args.tolerancia_km, args.tolerancia_tempo):
+                regressoes += 1
+                print(f"         ⚠️ {problema}")
+        print(f"Servidores falsos: nominatim {nominatim.contagem}, osrm {osrm.contagem}")
+
+    if args.resultado:
+        with open(args.resultado, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+    if args.gravar_referencia:
+        with open(args.referencia, 'w', encoding='utf-8') as f:
+            json.dump({n: {'distancia_km': r['distancia_km'], 'tempos': {e: round(t, 3) for e, t in r['tempos'].items()}}
+                       for n, r in resultados.items()},
+                      f, ensure_ascii=False, indent=2)
+        print(f"Referência gravada em {args.referencia}")
+    return 1 if regressoes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
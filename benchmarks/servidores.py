@@ -0,0 +1,139 @@
+"""Nominatim e OSRM falsos, locais, com latência, erros e 429 configuráveis.
+
+As respostas são determinísticas: o mesmo endereço cai sempre na mesma coordenada
+(perto do centro da cidade citada) e a distância por estrada de um par é a linha
+reta multiplicada por um fator fixo do par, diferente em cada sentido.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from planejador.util import remover_acentos
+
+from .dados import CIDADES, ENDERECO_INEXISTENTE
+
+RAIO_TERRA_KM = 6371.0
+RAIO_CIDADE_GRAUS = 0.03  # Dispersão dos endereços em torno do centro da cidade
+
+def _hash(texto):
+    return int(hashlib.md5(texto.encode('utf-8')).hexdigest(), 16)
+
+def _haversine_m(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2000 * RAIO_TERRA_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+def coordenada_falsa(consulta):
+    """Coordenada do endereço, ou None se ele não deve ser encontrado"""
+    texto = remover_acentos(consulta).lower()
+    if remover_acentos(ENDERECO_INEXISTENTE).lower() in texto:
+        return None
+    centro = next((c for nome, c in CIDADES.items() if remover_acentos(nome).lower() in texto), CIDADES['Jaú'])
+    h = _hash(texto)
+    angulo = (h % 3600) / 3600 * 2 * math.pi
+    raio = RAIO_CIDADE_GRAUS * math.sqrt(((h >> 12) % 1000) / 1000)
+    return round(centro[0] + raio * math.sin(angulo), 6), round(centro[1] + raio * math.cos(angulo), 6)
+
+def distancia_falsa(a, b):
+    """Distância 'por estrada' em metros: linha reta x fator entre 1,2 e 1,5 que depende do sentido"""
+    if a == b:
+        return 0.0
+    fator = 1.2 + (_hash(f"{a}{b}") % 1000) / 1000 * 0.3
+    return _haversine_m(a, b) * fator
+
+class ServicoFalso:
+    """Servidor HTTP em uma thread que responde /search, /table e /route.
+
+    latencia é o tempo de cada resposta em segundos; taxa_erro e taxa_429 são as
+    probabilidades de responder 503 ou 429 (ambos com Retry-After de retry_after s).
+    """
+
+    def __init__(self, latencia=0.0, taxa_erro=0.0, taxa_429=0.0, retry_after=0.5, semente=0):
+        self.latencia = latencia
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self.contagem = {'requisicoes': 0, 'http_503': 0, 'http_429': 0}
+        self._servidor = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def _falha(self):
+        """Sorteia a resposta de erro desta requisição (None para responder normalmente)"""
+        with self._lock:
+            self.contagem['requisicoes'] += 1
+            sorteio = self._rng.random()
+            if sorteio < self.taxa_429:
+                self.contagem['http_429'] += 1
+                return 429
+            if sorteio < self.taxa_429 + self.taxa_erro:
+                self.contagem['http_503'] += 1
+                return 503
+        return None
+
+    def _responder(self, consulta):
+        partes = urlsplit(consulta)
+        parametros = parse_qs(partes.query)
+        if partes.path.startswith('/search'):
+            coords = coordenada_falsa(parametros.get('q', [''])[0])
+            return [] if coords is None else [{'lat': str(coords[0]), 'lon': str(coords[1])}]
+        pontos = [tuple(reversed([float(x) for x in c.split(',')])) for c in partes.path.rsplit('/', 1)[-1].split(';')]
+        if '/table/' in partes.path:
+            origens = [int(i) for i in parametros['sources'][0].split(';')] if 'sources' in parametros else range(len(pontos))
+            destinos = [int(i) for i in parametros['destinations'][0].split(';')] if 'destinations' in parametros else range(len(pontos))
+            return {'code': 'Ok', 'distances': [[distancia_falsa(pontos[i], pontos[j]) for j in destinos] for i in origens]}
+        return {'code': 'Ok', 'routes': [{'distance': distancia_falsa(pontos[0], pontos[1])}]}
+
+    def iniciar(self):
+        servico = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if servico.latencia:
+                    time.sleep(servico.latencia)
+                status = servico._falha()
+                if status is None:
+                    corpo = json.dumps(servico._responder(self.path)).encode('utf-8')
+                    self.send_response(200)
+                else:
+                    corpo = b'{}'
+                    self.send_response(status)
+                    self.send_header('Retry-After', str(servico.retry_after))
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._servidor.daemon_threads = True
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
@@ -0,0 +1,33 @@
+"""Planejador de rotas de entrega.
+
+API principal (carregada sob demanda, para que importar o pacote não carregue
+pandas, fpdf ou openpyxl antes da etapa que precisa deles):
+
+    geocode_batch(enderecos, ...)       -> geocodificacao.geocodificar_lote
+    build_matrix(coordenadas, ...)      -> distancias.calcular_matriz_distancias
+    solve_route(dist_matrix, ...)       -> otimizador.resolver
+    render_pdf(arquivo_saida_pdf, ...)  -> relatorio.gerar_pdf
+"""
+import importlib
+
+_API = {
+    'geocode_batch': ('geocodificacao', 'geocodificar_lote'),
+    'build_matrix': ('distancias', 'calcular_matriz_distancias'),
+    'solve_route': ('otimizador', 'resolver'),
+    'render_pdf': ('relatorio', 'gerar_pdf'),
+    'planejar_rota': ('planejamento', 'planejar_rota'),
+    'planejar_lote': ('lote', 'planejar_lote'),
+}
+
+__all__ = list(_API)
+
+def __getattr__(nome):
+    if nome in _API:
+        modulo, atributo = _API[nome]
+        valor = getattr(importlib.import_module(f".{modulo}", __name__), atributo)
+        globals()[nome] = valor
+        return valor
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
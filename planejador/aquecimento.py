@@ -0,0 +1,212 @@
+"""Aquecimento noturno dos caches para a base de clientes recorrentes.
+
+A maior parte das linhas da planilha do dia são clientes que já apareceram, nas
+mesmas cidades. Rodado fora do horário (pelo agendador), este módulo lê a lista de
+clientes e/ou o histórico das execuções (os .estado.npz da pasta dos PDFs),
+geocodifica todos os endereços e grava nos caches persistentes (as coordenadas do
+histórico entram no cache de geocodificação com a data da execução):
+
+- as distâncias do ponto de partida para todos os clientes e de volta;
+- os blocos de cada cidade (todos contra todos os clientes da mesma cidade).
+
+As entradas vencidas que os caches ainda servem (ver revalidar_geocodificacoes e
+revalidar_distancias) são todas consultadas de novo aqui, sem o limite por execução
+da revalidação que segue o PDF.
+
+A execução da manhã encontra quase tudo no cache. O OSRM é consultado com um
+limite de taxa próprio, mais baixo que o da execução interativa; o Nominatim
+continua no limite de 1 req/s do cliente_http.
+
+    python -m planejador.aquecimento --clientes CLIENTES.xlsx --historico ROTAS-GERADAS
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+from datetime import datetime
+
+from colorama import Fore, Style
+
+from .cliente_http import ClienteHTTP, definir_cliente
+from .distancias import calcular_distancias_pares, calcular_matriz_distancias, grafo_candidatos, revalidar_distancias
+from .estado import carregar_estado
+from .geocodificacao import (CacheGeocodificacao, geocodificar_lote, geocodificar_ponto_partida,
+                             revalidar_geocodificacoes)
+from .metricas import Execucao
+from .normalizacao import chave_endereco, separar_endereco
+from .planejamento import PONTO_PARTIDA, ErroPlanejamento, imprimir_etapas, imprimir_metricas_http, resumo_caches
+from .planilha import COLUNA_ENDERECOS, ler_colunas
+from .relatorio import PASTA_ROTAS
+from .util import ajustar_coordenada, configurar_logging, id_local, logger, print_colorido
+
+OSRM_POR_SEGUNDO = 1.0  # Bem abaixo do limite interativo: o servidor público é compartilhado
+MAX_POR_CIDADE = 300  # Acima disso, a cidade usa o grafo de candidatos (K_VIZINHOS_CIDADE)
+K_VIZINHOS_CIDADE = 20
+
+def enderecos_das_planilhas(arquivos, nome_coluna_enderecos=COLUNA_ENDERECOS, nome_coluna_cidade=None):
+    """Lista de (endereco, cidade ou None) das planilhas de clientes"""
+    clientes = []
+    for arquivo in arquivos:
+        colunas = [nome_coluna_enderecos] + ([nome_coluna_cidade] if nome_coluna_cidade else [])
+        dados = ler_colunas(arquivo, colunas)
+        cidades = dados.get(nome_coluna_cidade) or [None] * len(dados[nome_coluna_enderecos])
+        clientes.extend((str(e).strip(), c) for e, c in zip(dados[nome_coluna_enderecos], cidades) if e)
+    return clientes
+
+def enderecos_do_historico(pasta=PASTA_ROTAS):
+    """Dicionário endereco -> (coordenadas, timestamp ISO do estado) das paradas das execuções anteriores"""
+    conhecidos = {}
+    for arquivo in sorted(glob.glob(os.path.join(pasta, "*.estado.npz"))):
+        estado = carregar_estado(arquivo)
+        if estado is None:
+            continue
+        timestamp = datetime.fromtimestamp(os.path.getmtime(arquivo)).isoformat()
+        # A posição 0 é o ponto de partida, aquecido à parte
+        for endereco, coords in zip(estado['enderecos'][1:], estado['coordenadas'][1:]):
+            conhecidos[endereco] = (ajustar_coordenada(coords), timestamp)
+    return conhecidos
+
+def _cidade(endereco, cidade=None):
+    if cidade:
+        return chave_endereco(cidade)
+    return separar_endereco(endereco)[2]
+
+def aquecer(clientes=(), historico=None, ponto_partida=PONTO_PARTIDA, workers_geocodificacao=2,
+            max_por_cidade=MAX_POR_CIDADE):
+    """Geocodifica os clientes e grava no cache as distâncias da partida e de cada cidade.
+
+    clientes é uma lista de (endereco, cidade ou None), como em enderecos_das_planilhas;
+    historico, um dicionário endereco -> (coordenadas, timestamp), como em
+    enderecos_do_historico: os endereços que o cache de geocodificação não tem são
+    gravados nele com essas coordenadas, e os vencidos são revalidados como os das
+    planilhas. Cidades com mais de max_por_cidade locais são roteadas só entre os
+    K_VIZINHOS_CIDADE mais próximos.
+    Retorna a Execucao com os contadores e o tempo de cada etapa.
+    """
+    historico = historico or {}
+    with Execucao({'clientes': len(clientes), 'historico': len(historico),
+                   'ponto_partida': ponto_partida}) as execucao:
+        print_colorido("\n🔥 Aquecendo os caches...", Fore.GREEN, Style.BRIGHT)
+        cache_geo = CacheGeocodificacao()
+        try:
+            with execucao.etapa('geocodificacao'):
+                coords_partida = geocodificar_ponto_partida(ponto_partida, cache_geo)
+        except ValueError as e:
+            raise ErroPlanejamento(str(e)) from e
+
+        # GEOCODIFICAÇÃO: o histórico passa pelo cache, onde só completa o que falta,
+        # então os endereços dele também são servidos (e revalidados) pelo cache
+        gravados = cache_geo.completar(historico)
+        if gravados:
+            execucao.contar('historico_no_cache', gravados)
+        conhecidos = {chave_endereco(e) for e in historico}
+        pendentes = [(e, None) for e in historico] + [(e, c) for e, c in clientes
+                                                      if chave_endereco(e) not in conhecidos]
+        print_colorido(f"\n🌍 Geocodificando {len(pendentes)} endereços...", Fore.CYAN)
+        with execucao.etapa('geocodificacao'):
+            resultados = geocodificar_lote([e for e, _ in pendentes], cache_geo, max_workers=workers_geocodificacao,
+                                           progresso=logger.isEnabledFor(logging.INFO))
+
+        # Endereços servidos vencidos: atualizados antes das distâncias, que usam as coordenadas novas
+        obsoletos = {chave_endereco(e) for e in cache_geo.obsoletos()}
+        if obsoletos:
+            print_colorido(f"\n🔁 Revalidando {len(obsoletos)} endereços vencidos...", Fore.CYAN)
+            with execucao.etapa('revalidacao'):
+                revalidar_geocodificacoes(cache_geo, limite=None)
+                if chave_endereco(ponto_partida) in obsoletos:
+                    coords_partida = geocodificar_ponto_partida(ponto_partida, cache_geo)
+                refazer = [i for i, (e, _) in enumerate(pendentes) if chave_endereco(e) in obsoletos]
+                novos = geocodificar_lote([pendentes[i][0] for i in refazer], cache_geo, progresso=False)
+                for i, resultado in zip(refazer, novos):
+                    resultados[i] = resultado
+        locais = {}  # id_local -> (coordenadas, cidade)
+        for (endereco, cidade), (_, coords, _) in zip(pendentes, resultados):
+            if coords:
+                locais.setdefault(id_local(coords), (coords, _cidade(endereco, cidade)))
+            else:
+                execucao.contar('enderecos_com_erro')
+        execucao.contar('locais', len(locais))
+        if not locais:
+            raise ErroPlanejamento("Nenhum endereço foi geocodificado.")
+
+        # PONTO DE PARTIDA: ida e volta para todos os locais
+        coordenadas = [coords for coords, _ in locais.values()]
+        print_colorido(f"\n📍 Distâncias do ponto de partida para {len(coordenadas)} locais...", Fore.CYAN)
+        with execucao.etapa('partida'):
+            calcular_distancias_pares([coords_partida], coordenadas)
+            calcular_distancias_pares(coordenadas, [coords_partida])
+
+        # CIDADES: todos contra todos dentro de cada cidade
+        cidades = {}
+        for coords, cidade in locais.values():
+            cidades.setdefault(cidade, []).append(coords)
+        for cidade, pontos in sorted(cidades.items(), key=lambda item: -len(item[1])):
+            if not cidade or len(pontos) < 2:
+                continue
+            print_colorido(f"\n🏙️ {cidade}: {len(pontos)} locais", Fore.CYAN)
+            vizinhos = grafo_candidatos(pontos, K_VIZINHOS_CIDADE) if len(pontos) > max_por_cidade else None
+            with execucao.etapa('cidades'):
+                calcular_matriz_distancias(pontos, vizinhos=vizinhos)
+            execucao.contar('cidades')
+
+        # Pares servidos vencidos pelo cache nas etapas acima
+        with execucao.etapa('revalidacao'):
+            revalidadas = revalidar_distancias(limite=None)
+        if revalidadas:
+            print_colorido(f"\n🔁 {revalidadas} distâncias vencidas atualizadas", Fore.CYAN)
+
+        cache_geo.salvar()
+        print_colorido("\n🌐 Requisições externas:", Fore.CYAN)
+        imprimir_metricas_http()
+        print_colorido("\n⏱️ Tempo por etapa:", Fore.CYAN)
+        imprimir_etapas(execucao)
+        execucao.registrar('caches', resumo_caches(cache_geo))
+        return execucao
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m planejador.aquecimento",
+                                     description="Pré-geocodifica os clientes e pré-calcula as distâncias nos caches.")
+    parser.add_argument("--clientes", action="append", default=[], metavar="PLANILHA",
+                        help="Planilha de clientes (.xlsx, .xls, .csv ou .parquet); pode ser repetida")
+    parser.add_argument("--coluna-enderecos", default=COLUNA_ENDERECOS)
+    parser.add_argument("--coluna-cidade", help="Coluna com a cidade (padrão: a cidade lida do endereço)")
+    parser.add_argument("--historico", metavar="PASTA",
+                        help=f"Usa também as paradas dos estados salvos nesta pasta (ex.: {PASTA_ROTAS})")
+    parser.add_argument("--partida", default=PONTO_PARTIDA, help="Endereço ou 'lat, lon' do ponto de partida")
+    parser.add_argument("--osrm-por-segundo", type=float, default=OSRM_POR_SEGUNDO,
+                        help=f"Limite de requisições ao OSRM (padrão: {OSRM_POR_SEGUNDO:g}/s)")
+    parser.add_argument("--max-por-cidade", type=int, default=MAX_POR_CIDADE,
+                        help="Acima deste número de locais, a cidade é roteada só entre vizinhos próximos")
+    parser.add_argument("--workers-geocodificacao", type=int, default=2)
+    parser.add_argument("--grafo-viario", metavar="PASTA", help="Roteia pelo grafo local em vez do OSRM")
+    parser.add_argument("--indice-enderecos", metavar="PASTA", help="Geocodifica pelo índice local antes do Nominatim")
+    parser.add_argument("--nivel-log", choices=("DEBUG", "INFO", "WARNING", "ERROR"), default="INFO")
+    args = parser.parse_args(argv)
+    if not args.clientes and not args.historico:
+        parser.error("informe --clientes e/ou --historico")
+    configurar_logging(args.nivel_log)
+    definir_cliente(ClienteHTTP(limites={'osrm': (args.osrm_por_segundo, 1)}))
+    if args.grafo_viario:
+        from .distancias import definir_grafo_viario
+        definir_grafo_viario(args.grafo_viario)
+    if args.indice_enderecos:
+        from .geocodificacao import definir_geocodificador_local
+        definir_geocodificador_local(args.indice_enderecos)
+
+    try:
+        clientes = enderecos_das_planilhas(args.clientes, args.coluna_enderecos, args.coluna_cidade)
+        historico = enderecos_do_historico(args.historico) if args.historico else {}
+        print_colorido(f"✅ {len(clientes)} clientes nas planilhas, {len(historico)} endereços no histórico",
+                       Fore.GREEN)
+        execucao = aquecer(clientes, historico, args.partida, args.workers_geocodificacao, args.max_por_cidade)
+    except (ErroPlanejamento, KeyError, ValueError) as e:
+        print_colorido(f"❌ Erro: {str(e)}", Fore.RED, nivel=logging.ERROR)
+        return 1
+    contadores = execucao.contadores
+    print_colorido(f"\n✅ Caches aquecidos: {contadores.get('locais', 0)} locais, {contadores.get('cidades', 0)} "
+                   f"cidades, {contadores.get('pares_roteados', 0)} pares novos", Fore.GREEN)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Linha de comando: python -m planejador --cidade Jau [opções]"""
+import argparse
+import logging
+import sys
+import traceback
+
+from colorama import Fore
+
+from .util import configurar_logging, print_colorido
+
+# Valores padrão repetidos aqui para que --help não precise importar numpy/pandas
+ARQUIVO_EXCEL = "ENDERECOS-ROTA.xlsx"
+PONTO_PARTIDA = "Rua Floriano Peixoto, 368, Centro, Itapuí - SP"
+PASTA_ROTAS = "ROTAS-GERADAS"
+METODOS_ISOLADOS = ("dbscan", "distancia")  # distancias.METODOS_OUTLIER
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="planejador", description="Gera o PDF da rota de entregas a partir da planilha.")
+    parser.add_argument("--cidade", required=True, help="Cidade das entregas (usada no título e no nome do PDF)")
+    parser.add_argument("--entrada", default=ARQUIVO_EXCEL,
+                        help=f"Planilha de endereços: .xlsx, .xls, .csv ou .parquet (padrão: {ARQUIVO_EXCEL})")
+    parser.add_argument("--partida", default=PONTO_PARTIDA, help="Endereço ou 'lat, lon' do ponto de partida")
+    parser.add_argument("--saida", default=PASTA_ROTAS, help=f"Pasta dos PDFs gerados (padrão: {PASTA_ROTAS})")
+    parser.add_argument("--coluna-enderecos", default="Endereco")
+    parser.add_argument("--coluna-nomes", default="Nome")
+    parser.add_argument("--workers-geocodificacao", type=int, default=6)
+    parser.add_argument("--workers-roteamento", type=int, default=2)
+    parser.add_argument("--sem-pipeline", action="store_true",
+                        help="Geocodifica tudo antes de calcular a matriz (modo sequencial)")
+    parser.add_argument("--candidatos", type=int, metavar="K", default=0,
+                        help="Roteia apenas os K vizinhos mais próximos de cada ponto (0 = matriz completa)")
+    parser.add_argument("--grafo-viario", metavar="PASTA",
+                        help="Roteia localmente pelo grafo gerado com python -m planejador.grafo_viario (sem OSRM)")
+    parser.add_argument("--indice-enderecos", metavar="PASTA",
+                        help="Geocodifica pelo índice gerado com python -m planejador.geocodificador_local "
+                             "antes de consultar o Nominatim")
+    parser.add_argument("--simetrica", action="store_true", help="Consulta cada par em um único sentido")
+    parser.add_argument("--metodo", default="busca_local", help="Método de otimização (guloso, busca_local, multi_inicio)")
+    parser.add_argument("--tempo-otimizacao", type=float, default=10, help="Tempo máximo de otimização em segundos")
+    parser.add_argument("--rota-fechada", action="store_true", help="Considera a volta ao ponto de partida")
+    parser.add_argument("--revisar-isolados", action="store_true",
+                        help="Tira da rota os pontos isolados e os lista como erro para revisão")
+    parser.add_argument("--raio-isolados", type=float, metavar="KM", default=25.0,
+                        help="Ponto sem outra parada a menos desta distância é isolado (padrão: 25 km)")
+    parser.add_argument("--metodo-isolados", choices=METODOS_ISOLADOS, default="dbscan",
+                        help="dbscan: sem outra parada no raio; distancia: distância média em linha reta "
+                             "2 desvios acima da média (padrão: dbscan)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Atualiza a rota do dia com as mudanças da planilha em vez de replanejar tudo")
+    parser.add_argument("--retomar", action="store_true",
+                        help="Continua uma execução interrompida do dia a partir do diário gravado ao lado do PDF, "
+                             "sem repetir as consultas já feitas")
+    saida = parser.add_mutually_exclusive_group()
+    saida.add_argument("-v", "--verboso", dest="nivel_log", action="store_const", const="DEBUG",
+                       help="Mostra cada endereço, cada par de pontos e cada trecho da rota")
+    saida.add_argument("-q", "--silencioso", dest="nivel_log", action="store_const", const="WARNING",
+                       help="Mostra só avisos e erros")
+    saida.add_argument("--nivel-log", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                       help="Nível das mensagens no console (padrão: INFO, só o resumo)")
+    parser.set_defaults(nivel_log="INFO")
+    parser.add_argument("--arquivo-log", metavar="ARQUIVO",
+                        help="Grava também um log rotativo completo (nível DEBUG) neste arquivo")
+    parser.add_argument("--perfil", choices=("cprofile", "pyinstrument"),
+                        help="Perfila as etapas e grava os perfis ao lado do relatório JSON")
+    parser.add_argument("--perfil-etapas", metavar="ETAPAS",
+                        help="Etapas a perfilar, separadas por vírgula (ex.: matriz,otimizacao); padrão: todas")
+    lote = parser.add_argument_group("várias rotas", "Gera um PDF por veículo ou por grupo da planilha")
+    divisao = lote.add_mutually_exclusive_group()
+    divisao.add_argument("--agrupar-por", metavar="COLUNA", help="Uma rota por valor da coluna (ex.: Cidade)")
+    divisao.add_argument("--veiculos", type=int, metavar="N", help="Divide as paradas entre N veículos")
+    lote.add_argument("--capacidade", type=int, help="Máximo de paradas por veículo (com --veiculos)")
+    lote.add_argument("--particao", choices=("varredura", "kmeans"), default="varredura",
+                      help="Como dividir as paradas entre os veículos (padrão: varredura)")
+    lote.add_argument("--workers-otimizacao", type=int, help="Processos para otimizar as rotas (padrão: nº de CPUs)")
+    return parser
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.capacidade is not None and not args.veiculos:
+        parser.error("--capacidade exige --veiculos")
+    if args.incremental and (args.agrupar_por or args.veiculos):
+        parser.error("--incremental não pode ser usado com --agrupar-por ou --veiculos")
+    if args.incremental and args.retomar:
+        parser.error("--retomar não pode ser usado com --incremental")
+    configurar_logging(args.nivel_log, args.arquivo_log)
+    from .relatorio import verificar_fpdf
+    try:
+        verificar_fpdf()  # Antes da geocodificação: sem o fpdf2, a execução só falharia no PDF
+    except ImportError as e:
+        print_colorido(f"❌ Erro: {str(e)}", Fore.RED, nivel=logging.ERROR)
+        return 1
+    from .planejamento import ErroPlanejamento, planejar_rota
+    if args.grafo_viario:
+        from .distancias import definir_grafo_viario
+        definir_grafo_viario(args.grafo_viario)
+    if args.indice_enderecos:
+        from .geocodificacao import definir_geocodificador_local
+        definir_geocodificador_local(args.indice_enderecos)
+
+    perfil = dict(perfil=args.perfil,
+                  etapas_perfil=[e.strip() for e in args.perfil_etapas.split(",")] if args.perfil_etapas else None)
+    try:
+        if args.agrupar_por or args.veiculos:
+            from .lote import planejar_lote
+            planejar_lote(
+                args.cidade,
+                arquivo_excel=args.entrada,
+                ponto_partida=args.partida,
+                pasta_saida=args.saida,
+                nome_coluna_enderecos=args.coluna_enderecos,
+                nome_coluna_nomes=args.coluna_nomes,
+                nome_coluna_grupo=args.agrupar_por,
+                n_veiculos=args.veiculos,
+                capacidade=args.capacidade,
+                particao=args.particao,
+                workers_geocodificacao=args.workers_geocodificacao,
+                workers_otimizacao=args.workers_otimizacao,
+                k_vizinhos=args.candidatos or None,
+                simetrica=args.simetrica,
+                metodo=args.metodo,
+                tempo_otimizacao=args.tempo_otimizacao,
+                rota_fechada=args.rota_fechada,
+                retomar=args.retomar,
+                **perfil,
+            )
+            return 0
+        planejar, opcoes = planejar_rota, dict(retomar=args.retomar)
+        if args.incremental:
+            from .replanejamento import replanejar_rota as planejar
+            opcoes = {}
+        planejar(
+            args.cidade,
+            arquivo_excel=args.entrada,
+            ponto_partida=args.partida,
+            pasta_saida=args.saida,
+            nome_coluna_enderecos=args.coluna_enderecos,
+            nome_coluna_nomes=args.coluna_nomes,
+            workers_geocodificacao=args.workers_geocodificacao,
+            workers_roteamento=args.workers_roteamento,
+            usar_pipeline=not args.sem_pipeline,
+            k_vizinhos=args.candidatos or None,
+            simetrica=args.simetrica,
+            metodo=args.metodo,
+            tempo_otimizacao=args.tempo_otimizacao,
+            rota_fechada=args.rota_fechada,
+            revisar_isolados=args.revisar_isolados,
+            raio_isolados_km=args.raio_isolados,
+            metodo_isolados=args.metodo_isolados,
+            **opcoes,
+            **perfil,
+        )
+    except ErroPlanejamento as e:
+        print_colorido(f"❌ Erro: {str(e)}", Fore.RED, nivel=logging.ERROR)
+        return 1
+    except KeyboardInterrupt:
+        print_colorido("\n⏹️ Interrompido. Rode de novo com --retomar para continuar de onde parou.", Fore.YELLOW,
+                       nivel=logging.WARNING)
+        return 130
+    except Exception as e:
+        print_colorido(f"\n❌ Erro inesperado: {str(e)}", Fore.RED, nivel=logging.ERROR)
+        print_colorido("Detalhes do erro:", Fore.RED, nivel=logging.ERROR)
+        print_colorido(traceback.format_exc(), Fore.RED, nivel=logging.ERROR)
+        if not args.incremental:
+            print_colorido("O que já foi consultado está no diário: rode de novo com --retomar.", Fore.YELLOW,
+                           nivel=logging.WARNING)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Cliente HTTP compartilhado entre as threads de geocodificação e de roteamento.
+
+Cada serviço (endpoint) tem um limitador de taxa do tipo token bucket, um pool de
+conexões keep-alive e métricas próprias. Respostas 429/403/503 pausam o endpoint
+inteiro pelo tempo do cabeçalho Retry-After, e não apenas a thread que as recebeu.
+"""
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'RotaEntregas/1.0 (https://github.com/juniorchiodi/Planejador-de-Rotas; juninho.junirj@gmail.com) Python/3.x'
+
+# Requisições por segundo e rajada de cada serviço. O Nominatim público exige no máximo 1 req/s.
+LIMITES_PADRAO = {
+    'nominatim': (1.0, 1),
+    'osrm': (5.0, 5),
+}
+ESPERA_PADRAO = {429: 5, 403: 10, 503: 5}  # Segundos, quando não há Retry-After
+
+class LimitadorTaxa:
+    """Token bucket thread-safe: aguardar() bloqueia até haver uma ficha disponível"""
+
+    def __init__(self, taxa, capacidade=1):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade)
+        self._fichas = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._pausado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        """Consome uma ficha e retorna quantos segundos a chamada esperou"""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if agora < self._pausado_ate:
+                    espera = self._pausado_ate - agora
+                elif self._fichas >= 1:
+                    self._fichas -= 1
+                    return esperado
+                else:
+                    espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+            esperado += espera
+
+    def pausar(self, segundos):
+        """Suspende o endpoint para todas as threads (usado com Retry-After)"""
+        with self._lock:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+            self._fichas = 0.0
+
+class MetricasEndpoint:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.retentativas = 0
+        self.erros_conexao = 0
+        self.status = {}
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+        self.espera_total = 0.0
+        self.bytes = 0
+
+    def registrar(self, latencia, status=None, tamanho=0):
+        with self._lock:
+            self.requisicoes += 1
+            self.latencia_total += latencia
+            self.latencia_max = max(self.latencia_max, latencia)
+            self.bytes += tamanho
+            if status is None:
+                self.erros_conexao += 1
+            else:
+                self.status[status] = self.status.get(status, 0) + 1
+
+    def registrar_espera(self, segundos, retentativa=False):
+        with self._lock:
+            self.espera_total += segundos
+            if retentativa:
+                self.retentativas += 1
+
+    def resumo(self):
+        with self._lock:
+            return {
+                'requisicoes': self.requisicoes,
+                'retentativas': self.retentativas,
+                'erros_conexao': self.erros_conexao,
+                'status': dict(self.status),
+                'latencia_media': self.latencia_total / self.requisicoes if self.requisicoes else 0.0,
+                'latencia_max': self.latencia_max,
+                'espera_total': self.espera_total,
+                'bytes': self.bytes,
+                'http_429': self.status.get(429, 0),
+                'http_403': self.status.get(403, 0),
+            }
+
+def _segundos_retry_after(valor):
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class ClienteHTTP:
+    """Sessões keep-alive por host, limitador por endpoint e retentativas com Retry-After"""
+
+    def __init__(self, limites=None, tamanho_pool=10):
+        self.tamanho_pool = tamanho_pool
+        self._limites = dict(LIMITES_PADRAO)
+        self._limites.update(limites or {})
+        self._sessoes = {}
+        self._limitadores = {}
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _sessao(self, url):
+        partes = urlsplit(url)
+        host = f"{partes.scheme}://{partes.netloc}"
+        with self._lock:
+            if host not in self._sessoes:
+                sessao = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.tamanho_pool, max_retries=0)
+                sessao.mount(host, adapter)
+                sessao.headers['User-Agent'] = USER_AGENT
+                self._sessoes[host] = sessao
+            return self._sessoes[host]
+
+    def limitador(self, endpoint):
+        with self._lock:
+            if endpoint not in self._limitadores:
+                taxa, capacidade = self._limites.get(endpoint, (10.0, 10))
+                self._limitadores[endpoint] = LimitadorTaxa(taxa, capacidade)
+                self._metricas[endpoint] = MetricasEndpoint()
+            return self._limitadores[endpoint]
+
+    def metricas(self, endpoint):
+        self.limitador(endpoint)
+        return self._metricas[endpoint]
+
+    def get(self, endpoint, url, timeout=15, max_tentativas=3, headers=None):
+        """Faz um GET respeitando o limite do endpoint.
+
+        Retorna a última resposta recebida (mesmo que não seja 200) ou None se
+        todas as tentativas falharam por erro de conexão.
+        """
+        limitador = self.limitador(endpoint)
+        metricas = self._metricas[endpoint]
+        sessao = self._sessao(url)
+        resposta = None
+        for tentativa in range(max_tentativas):
+            metricas.registrar_espera(limitador.aguardar())
+            inicio = time.perf_counter()
+            try:
+                resposta = sessao.get(url, timeout=timeout, headers=headers)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                metricas.registrar(time.perf_counter() - inicio)
+                if tentativa < max_tentativas - 1:
+                    espera = (tentativa + 1) * 5
+                    metricas.registrar_espera(espera, retentativa=True)
+                    time.sleep(espera)
+                continue
+            metricas.registrar(time.perf_counter() - inicio, resposta.status_code, len(resposta.content))
+            if resposta.status_code in ESPERA_PADRAO and tentativa < max_tentativas - 1:
+                espera = _segundos_retry_after(resposta.headers.get('Retry-After'))
+                if espera is None:
+                    espera = ESPERA_PADRAO[resposta.status_code]
+                # A pausa vale para todas as threads; a espera acontece no próximo aguardar()
+                limitador.pausar(espera)
+                metricas.registrar_espera(0, retentativa=True)
+                continue
+            return resposta
+        return resposta
+
+    def resumo(self):
+        with self._lock:
+            endpoints = list(self._metricas)
+        return {endpoint: self._metricas[endpoint].resumo() for endpoint in endpoints}
+
+    def fechar(self):
+        with self._lock:
+            for sessao in self._sessoes.values():
+                sessao.close()
+            self._sessoes.clear()
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+def obter_cliente():
+    """Cliente único do processo, compartilhado por todas as threads"""
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            _cliente = ClienteHTTP()
+        return _cliente
+
+def definir_cliente(cliente):
+    """Substitui o cliente do processo (ex.: com outros limites de taxa); retorna o anterior"""
+    global _cliente
+    with _cliente_lock:
+        anterior, _cliente = _cliente, cliente
+    return anterior
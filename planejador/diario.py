@@ -0,0 +1,136 @@
+"""Diário de uma execução longa, para retomá-la depois de uma interrupção.
+
+O diário é um arquivo JSON Lines ao lado do PDF, só com acréscimos. Cada
+geocodificação definitiva, cada bloco da matriz concluído e a melhor rota até o
+momento viram uma linha, gravada com fsync. Os blocos incluem os pares que caíram
+para a geodésica e não vão para o cache. Com retomar=True a execução seguinte relê o
+diário e não repete nenhuma dessas consultas; a última linha, se cortada pela
+interrupção, é descartada. O diário é apagado quando a execução termina sem erro.
+
+Como em metricas, o Diario ativo (usado com "with") é encontrado pelos outros
+módulos com diario_atual(); sem diário ativo nada é gravado.
+"""
+import json
+import os
+import threading
+import time
+
+from .normalizacao import chave_endereco
+
+INTERVALO_ROTA = 1.0  # Segundos entre duas gravações da rota durante a busca local
+
+_atual = None
+
+def diario_atual():
+    return _atual
+
+def caminho_diario(arquivo_pdf):
+    return os.path.splitext(arquivo_pdf)[0] + ".diario.jsonl"
+
+class Diario:
+    """Checkpoints de uma execução: geocodificações, distâncias e a melhor rota.
+
+    geocodificacoes (chave_endereco -> (coords ou None, status)), distancias
+    (chave_distancia -> km), pontos (enderecos_validos da rota) e rota trazem o que
+    foi relido ao retomar e são atualizados a cada gravação.
+    """
+
+    def __init__(self, arquivo, parametros=None, retomar=False):
+        self.arquivo = arquivo
+        self.geocodificacoes = {}
+        self.distancias = {}
+        self.pontos = None
+        self.rota = None
+        self.retomado = retomar and os.path.exists(arquivo)
+        self._lock = threading.Lock()
+        self._ultima_rota = 0.0
+        if self.retomado:
+            self._reler()
+        pasta = os.path.dirname(arquivo)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._arquivo = open(arquivo, 'a' if self.retomado else 'w', encoding='utf-8')
+        self._gravar({'tipo': 'inicio', 'retomada': self.retomado, 'parametros': parametros or {}})
+
+    def __enter__(self):
+        global _atual
+        self._anterior, _atual = _atual, self
+        return self
+
+    def __exit__(self, tipo, *exc):
+        global _atual
+        _atual = self._anterior
+        # Com erro ou Ctrl+C o diário fica para a próxima execução com retomar=True
+        self.fechar(apagar=tipo is None)
+
+    def _reler(self):
+        valido = 0
+        with open(self.arquivo, 'rb') as f:
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    break
+                valido += len(linha)
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue
+                self._aplicar(registro)
+        # Tira o pedaço de linha da interrupção, para que os próximos registros comecem em linha nova
+        with open(self.arquivo, 'r+b') as f:
+            f.truncate(valido)
+
+    def _aplicar(self, registro):
+        tipo = registro.get('tipo')
+        if tipo == 'geocodificacao':
+            coords = registro['coords']
+            self.geocodificacoes[registro['chave']] = (tuple(coords) if coords else None, registro['status'])
+        elif tipo == 'distancias':
+            self.distancias.update(registro['pares'])
+        elif tipo == 'pontos':
+            self.pontos, self.rota = registro['enderecos'], None
+        elif tipo == 'rota':
+            self.rota = registro['rota']
+
+    def _gravar(self, registro):
+        with self._lock:
+            self._aplicar(registro)
+            self._arquivo.write(json.dumps(dict(registro, timestamp=time.time()), ensure_ascii=False) + "\n")
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+
+    def geocodificacao(self, endereco):
+        """(coords ou None, status) gravados para o endereço, ou None"""
+        return self.geocodificacoes.get(chave_endereco(endereco))
+
+    def registrar_geocodificacao(self, endereco, coords, status):
+        self._gravar({'tipo': 'geocodificacao', 'chave': chave_endereco(endereco),
+                      'coords': list(coords) if coords else None, 'status': status})
+
+    def obter_distancias(self, chaves):
+        """Dicionário chave -> distância apenas para as chaves gravadas"""
+        return {chave: self.distancias[chave] for chave in chaves if chave in self.distancias}
+
+    def registrar_distancias(self, pares):
+        if pares:
+            self._gravar({'tipo': 'distancias', 'pares': {k: float(v) for k, v in pares.items()}})
+
+    def definir_pontos(self, enderecos_validos):
+        """Fixa os pontos da rota; a rota gravada só vale se os pontos forem os mesmos"""
+        if self.pontos != list(enderecos_validos):
+            self._gravar({'tipo': 'pontos', 'enderecos': list(enderecos_validos)})
+
+    def registrar_rota(self, rota, forcar=False):
+        """Grava a rota (no máximo uma vez a cada INTERVALO_ROTA, salvo com forcar)"""
+        agora = time.perf_counter()
+        rota = [int(i) for i in rota]
+        if (self.pontos is None or len(rota) != len(self.pontos) or rota == self.rota
+                or (not forcar and agora - self._ultima_rota < INTERVALO_ROTA)):
+            return
+        self._ultima_rota = agora
+        self._gravar({'tipo': 'rota', 'rota': rota})
+
+    def fechar(self, apagar=False):
+        with self._lock:
+            self._arquivo.close()
+        if apagar:
+            os.remove(self.arquivo)
@@ -0,0 +1,640 @@
+"""Distâncias entre os pontos: OSRM (/table) ou grafo viário local, linha reta e cache em SQLite."""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from colorama import Fore
+from tqdm import tqdm
+
+from .cliente_http import obter_cliente
+from .diario import diario_atual
+from .metricas import contar
+from .util import JITTER_EXPIRACAO, id_local, logger, print_colorido, validade_com_jitter
+
+OSRM_URL = os.environ.get("OSRM_URL", "http://router.project-osrm.org")
+# Pasta de um grafo gerado por grafo_viario.construir_grafo; quando definida, nada é consultado no OSRM
+# e as distâncias ficam em um cache próprio dentro da pasta (ver arquivo_cache_distancia)
+GRAFO_VIARIO = os.environ.get("GRAFO_VIARIO")
+
+_grafo_viario = None
+_grafo_viario_lock = threading.Lock()
+
+def definir_grafo_viario(pasta):
+    """Passa a rotear pelo grafo local em pasta (None volta ao OSRM)"""
+    global GRAFO_VIARIO, _grafo_viario
+    with _grafo_viario_lock:
+        GRAFO_VIARIO = pasta
+        _grafo_viario = None
+    fechar_cache_distancia()  # O próximo obter_cache_distancia() abre o cache da nova fonte
+
+def obter_grafo_viario():
+    global _grafo_viario
+    with _grafo_viario_lock:
+        if _grafo_viario is None and GRAFO_VIARIO:
+            from .grafo_viario import GrafoViario
+            _grafo_viario = GrafoViario(GRAFO_VIARIO)
+        return _grafo_viario
+
+RAIO_TERRA_KM = 6371.0088
+DISTANCIA_MAXIMA_KM = 500  # Pares mais distantes que isso são considerados erro de geocodificação
+
+def matriz_haversine(coordenadas, distancia_maxima=DISTANCIA_MAXIMA_KM):
+    """Matriz n x n de distâncias em linha reta (km), calculada de uma vez com NumPy.
+
+    Coordenadas inválidas e pares acima de distancia_maxima (None para não
+    limitar) recebem inf.
+    """
+    c = np.asarray(coordenadas, dtype=float).reshape(-1, 2)
+    lat = np.radians(c[:, 0])
+    lon = np.radians(c[:, 1])
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    dist = 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    invalidas = ~np.isfinite(c).all(axis=1) | (np.abs(c[:, 0]) > 90) | (np.abs(c[:, 1]) > 180)
+    dist[invalidas, :] = np.inf
+    dist[:, invalidas] = np.inf
+    if distancia_maxima is not None:
+        dist[dist > distancia_maxima] = np.inf
+    np.fill_diagonal(dist, 0)
+    return dist
+
+DISTANCE_CACHE_FILE = "distance_cache.json"  # Formato antigo, importado na primeira execução
+DISTANCE_CACHE_DB = "distance_cache.db"
+DISTANCE_CACHE_EXPIRATION_DAYS = 30  # ±20%, ver util.validade_com_jitter
+# Como no cache de geocodificação: vencidas há menos de DISTANCE_CACHE_FATOR_OBSOLETO vezes
+# a validade, as distâncias ainda são usadas e até MAX_REVALIDACOES_DISTANCIA pares são
+# consultados de novo depois do PDF
+DISTANCE_CACHE_FATOR_OBSOLETO = 3
+MAX_REVALIDACOES_DISTANCIA = 2500
+VERSAO_CHAVES = 1  # user_version do SQLite: 1 = chaves com id_local
+
+def chave_distancia(coords1, coords2):
+    return f"{id_local(coords1)}_{id_local(coords2)}"
+
+def _migrar_chave(chave):
+    """Reescreve uma chave antiga (coordenadas como vieram do geocodificador) com id_local"""
+    try:
+        origem, destino = (tuple(float(x) for x in ponto.split(',')) for ponto in chave.split('_'))
+        return chave_distancia(origem, destino)
+    except ValueError:
+        return chave
+
+class CacheDistancia:
+    """Armazena as distâncias em SQLite com busca por chave e expiração indexada.
+
+    Uma única conexão é compartilhada entre as threads, protegida por um lock;
+    as gravações em lote acontecem em uma só transação. estatisticas conta acertos,
+    faltas, pares gravados e as entradas expiradas removidas ao abrir o arquivo.
+    As chaves usam util.id_local; arquivos antigos são migrados uma vez ao abrir
+    (PRAGMA user_version), mantendo a entrada mais recente de cada local.
+
+    Cada entrada vale dias_expiracao com a variação fixa da sua chave; depois disso,
+    até fator_obsoleto vezes a validade, ela ainda é servida (conta em 'obsoletos') e
+    fica anotada para revalidar_distancias. Só as mais antigas são removidas.
+    """
+
+    def __init__(self, arquivo=DISTANCE_CACHE_DB, arquivo_json=DISTANCE_CACHE_FILE,
+                 dias_expiracao=DISTANCE_CACHE_EXPIRATION_DAYS, fator_obsoleto=DISTANCE_CACHE_FATOR_OBSOLETO):
+        self.arquivo = arquivo
+        self.dias_expiracao = dias_expiracao
+        self.fator_obsoleto = fator_obsoleto
+        self._lock = threading.Lock()
+        self._obsoletos = {}  # Chaves servidas vencidas, na ordem de uso
+        self.estatisticas = {'acertos': 0, 'obsoletos': 0, 'faltas': 0, 'gravados': 0, 'expirados_removidos': 0}
+        novo = not os.path.exists(arquivo)
+        self._conn = sqlite3.connect(arquivo, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS distancias ("
+                "chave TEXT PRIMARY KEY, distancia REAL NOT NULL, timestamp REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_distancias_timestamp ON distancias(timestamp)")
+        if novo and arquivo_json and os.path.exists(arquivo_json):
+            self.importar_json(arquivo_json)
+        self.remover_expirados()
+        self._migrar_chaves()
+
+    def _migrar_chaves(self):
+        with self._lock, self._conn:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= VERSAO_CHAVES:
+                return
+            linhas = {}
+            for chave, distancia, timestamp in self._conn.execute(
+                    "SELECT chave, distancia, timestamp FROM distancias ORDER BY timestamp"):
+                linhas[_migrar_chave(chave)] = (distancia, timestamp)
+            self._conn.execute("DELETE FROM distancias")
+            self._conn.executemany("INSERT INTO distancias VALUES (?, ?, ?)",
+                                   [(k, d, t) for k, (d, t) in linhas.items()])
+            self._conn.execute(f"PRAGMA user_version = {VERSAO_CHAVES}")
+
+    def _limite(self):
+        """Timestamp abaixo do qual nenhuma entrada é servida (a maior validade possível, obsoleta)"""
+        return time.time() - self.dias_expiracao * 86400 * (1 + JITTER_EXPIRACAO) * self.fator_obsoleto
+
+    def _servir(self, chave, distancia, timestamp, agora):
+        """Distância da entrada lida, ou None se ela já passou do prazo de obsoleta; conta e anota as obsoletas"""
+        validade = validade_com_jitter(chave, self.dias_expiracao)
+        idade = agora - timestamp
+        if idade >= validade * self.fator_obsoleto:
+            return None
+        if idade >= validade:
+            self.estatisticas['obsoletos'] += 1
+            self._obsoletos[chave] = True
+        return distancia
+
+    def importar_json(self, arquivo_json):
+        try:
+            with open(arquivo_json, 'r', encoding='utf-8') as f:
+                cache_data = json.load(f)
+            linhas = [
+                (k, float(v['distance']), datetime.fromisoformat(v['timestamp']).timestamp())
+                for k, v in cache_data.items()
+            ]
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO distancias VALUES (?, ?, ?)", linhas)
+            print_colorido(f"Cache de distância importado de {arquivo_json}: {len(linhas)} pares", Fore.CYAN)
+        except Exception as e:
+            print_colorido(f"Erro ao importar cache de distância: {str(e)}", Fore.RED)
+
+    def remover_expirados(self):
+        agora = time.time()
+        with self._lock, self._conn:
+            linhas = self._conn.execute("SELECT chave, timestamp FROM distancias WHERE timestamp <= ?",
+                                        (agora - self.dias_expiracao * 86400 * (1 - JITTER_EXPIRACAO)
+                                         * self.fator_obsoleto,)).fetchall()
+            vencidas = [(chave,) for chave, timestamp in linhas
+                        if agora - timestamp >= validade_com_jitter(chave, self.dias_expiracao) * self.fator_obsoleto]
+            self._conn.executemany("DELETE FROM distancias WHERE chave = ?", vencidas)
+            self.estatisticas['expirados_removidos'] += len(vencidas)
+
+    def obter(self, chave):
+        return self.obter_varios([chave]).get(chave)
+
+    def obter_varios(self, chaves, tamanho_lote=500):
+        """Retorna um dicionário chave -> distância apenas para as chaves válidas ou obsoletas no cache"""
+        chaves = list(chaves)
+        resultado = {}
+        agora = time.time()
+        limite = self._limite()
+        with self._lock:
+            for inicio in range(0, len(chaves), tamanho_lote):
+                lote = chaves[inicio:inicio + tamanho_lote]
+                marcadores = ','.join('?' * len(lote))
+                for chave, distancia, timestamp in self._conn.execute(
+                    f"SELECT chave, distancia, timestamp FROM distancias WHERE chave IN ({marcadores}) "
+                    "AND timestamp > ?",
+                    (*lote, limite)
+                ):
+                    distancia = self._servir(chave, distancia, timestamp, agora)
+                    if distancia is not None:
+                        resultado[chave] = distancia
+            self.estatisticas['acertos'] += len(resultado)
+            self.estatisticas['faltas'] += len(chaves) - len(resultado)
+        return resultado
+
+    def obsoletos(self):
+        """Chaves servidas vencidas nesta execução e ainda não revalidadas"""
+        with self._lock:
+            return list(self._obsoletos)
+
+    def salvar(self, chave, distancia):
+        self.salvar_varios({chave: distancia})
+
+    def salvar_varios(self, distancias):
+        agora = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO distancias VALUES (?, ?, ?)",
+                [(k, float(v), agora) for k, v in distancias.items()]
+            )
+            for chave in distancias:
+                self._obsoletos.pop(chave, None)
+            self.estatisticas['gravados'] += len(distancias)
+
+    def fechar(self):
+        with self._lock:
+            self._conn.close()
+
+_cache_distancia = None
+_cache_distancia_lock = threading.Lock()
+
+def arquivo_cache_distancia():
+    """Cache da fonte atual: o do OSRM ou, com grafo viário, um dentro da pasta do grafo.
+
+    As distâncias do grafo local (comprimento das vias, sem classes nem restrições de
+    conversão) não podem responder por uma consulta ao OSRM, nem o contrário.
+    """
+    if GRAFO_VIARIO:
+        return os.path.join(GRAFO_VIARIO, DISTANCE_CACHE_DB)
+    return DISTANCE_CACHE_DB
+
+def obter_cache_distancia():
+    global _cache_distancia
+    with _cache_distancia_lock:
+        if _cache_distancia is None:
+            arquivo = arquivo_cache_distancia()
+            # O JSON antigo só tem distâncias do OSRM
+            _cache_distancia = CacheDistancia(arquivo, DISTANCE_CACHE_FILE if arquivo == DISTANCE_CACHE_DB else None)
+        return _cache_distancia
+
+def fechar_cache_distancia():
+    """Fecha o cache do processo; o próximo obter_cache_distancia() reabre o arquivo"""
+    global _cache_distancia
+    with _cache_distancia_lock:
+        if _cache_distancia is not None:
+            _cache_distancia.fechar()
+            _cache_distancia = None
+
+# Serviço /table do OSRM: devolve a matriz inteira em poucas requisições
+OSRM_TABLE_TAMANHO_BLOCO = 50  # O servidor público limita a ~100 coordenadas por requisição
+
+# Grafo de candidatos: só os K_VIZINHOS mais próximos de cada ponto (e o ponto de
+# partida) são roteados; os demais pares são estimados pela linha reta
+K_VIZINHOS = 8
+
+def consultar_tabela_osrm(coords_origem, coords_destino, max_tentativas=3, url_base=None):
+    """Consulta o serviço /table do OSRM e retorna a matriz origem x destino em km (None para pares sem rota)"""
+    url_base = (url_base or OSRM_URL).rstrip('/')
+    # Coordenadas repetidas entre origens e destinos são enviadas uma única vez
+    pontos = []
+    indice_ponto = {}
+    for c in list(coords_origem) + list(coords_destino):
+        chave = (c[0], c[1])
+        if chave not in indice_ponto:
+            indice_ponto[chave] = len(pontos)
+            pontos.append(chave)
+    sources = ';'.join(str(indice_ponto[(c[0], c[1])]) for c in coords_origem)
+    destinations = ';'.join(str(indice_ponto[(c[0], c[1])]) for c in coords_destino)
+    coords_str = ';'.join(f"{lon},{lat}" for lat, lon in pontos)
+    url = f"{url_base}/table/v1/driving/{coords_str}?annotations=distance&sources={sources}&destinations={destinations}"
+    response = obter_cliente().get('osrm', url, timeout=30, max_tentativas=max_tentativas)
+    if response is None:
+        print_colorido("⚠️ Erro de conexão com o OSRM", Fore.RED, nivel=logging.WARNING)
+        return None
+    if response.status_code != 200:
+        print_colorido(f"⚠️ OSRM respondeu HTTP {response.status_code}", Fore.YELLOW, nivel=logging.WARNING)
+        return None
+    try:
+        data = response.json()
+    except ValueError as e:
+        print_colorido(f"❌ Resposta inválida do OSRM: {str(e)}", Fore.RED, nivel=logging.ERROR)
+        return None
+    if data.get('code') == 'Ok' and data.get('distances') is not None:
+        return [[d / 1000 if d is not None else None for d in linha] for linha in data['distances']]
+    return None
+
+def consultar_tabela(coords_origem, coords_destino, url_base=None):
+    """Matriz origem x destino em km pelo grafo local, se configurado, ou pelo /table do OSRM"""
+    grafo = obter_grafo_viario()
+    if grafo is not None:
+        return grafo.tabela(coords_origem, coords_destino)
+    return consultar_tabela_osrm(coords_origem, coords_destino, url_base=url_base)
+
+def grafo_candidatos(coordenadas, k=K_VIZINHOS):
+    """Lista, para cada ponto, os índices dos k vizinhos mais próximos em linha reta.
+
+    O ponto de partida (índice 0) é candidato de todos os pontos e todos são candidatos
+    dele. Usa o cKDTree do SciPy quando disponível; sem ele, ordena a matriz de haversine.
+    """
+    c = np.asarray(coordenadas, dtype=float).reshape(-1, 2)
+    n = len(c)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    try:
+        from scipy.spatial import cKDTree
+        # Em coordenadas 3D sobre a esfera a distância da corda preserva a ordem da haversine
+        lat = np.radians(c[:, 0])
+        lon = np.radians(c[:, 1])
+        xyz = np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+        _, indices = cKDTree(xyz).query(xyz, k=k + 1)
+    except ImportError:
+        geodesica = matriz_haversine(c)
+        indices = np.argsort(geodesica, axis=1, kind='stable')[:, :k + 1]
+    vizinhos = []
+    for i in range(n):
+        v = [int(j) for j in indices[i] if j != i][:k]
+        if i != 0 and 0 not in v:
+            v.append(0)
+        vizinhos.append(v)
+    vizinhos[0] = list(range(1, n))
+    return vizinhos
+
+def _ordem_espacial(coordenadas):
+    """Ordena os pontos por uma curva de Morton para que os blocos do /table fiquem compactos"""
+    c = np.asarray(coordenadas, dtype=float).reshape(-1, 2)
+    minimo = c.min(axis=0)
+    escala = np.maximum(c.max(axis=0) - minimo, 1e-9)
+    q = ((c - minimo) / escala * 65535).astype(np.uint64)
+    codigo = np.zeros(len(c), dtype=np.uint64)
+    for bit in range(16):
+        for eixo in range(2):
+            codigo |= ((q[:, eixo] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + eixo)
+    return np.argsort(codigo, kind='stable')
+
+def _distancias_do_cache(coords_origem, coords_destino, geodesica):
+    """Matriz origem x destino com as distâncias válidas do cache (nan onde falta) e as chaves dos pares"""
+    chaves = {}
+    dist = np.full((len(coords_origem), len(coords_destino)), np.nan)
+    ids_origem = [id_local(c) for c in coords_origem]
+    ids_destino = [id_local(c) for c in coords_destino]
+    for i, id1 in enumerate(ids_origem):
+        for j, id2 in enumerate(ids_destino):
+            if id1 == id2:
+                dist[i][j] = 0
+            else:
+                chaves[(i, j)] = f"{id1}_{id2}"
+    em_cache = obter_cache_distancia().obter_varios(chaves.values())
+    for (i, j), key in chaves.items():
+        if key in em_cache:
+            dist[i][j] = em_cache[key]
+    # Valores do cache muito maiores que a linha reta são considerados suspeitos e recalculados
+    with np.errstate(invalid='ignore'):
+        suspeitos = (geodesica > 0) & (dist > geodesica * 2)
+    dist[suspeitos] = np.nan
+    contar('pares_suspeitos', int(suspeitos.sum()))
+    # Ao retomar, os blocos já consultados (inclusive os pares que caíram para a geodésica) vêm do diário
+    diario = diario_atual()
+    if diario is not None and diario.distancias:
+        faltando = {key: (i, j) for (i, j), key in chaves.items() if np.isnan(dist[i][j])}
+        do_diario = diario.obter_distancias(faltando)
+        for key, distancia in do_diario.items():
+            i, j = faltando[key]
+            dist[i][j] = distancia
+        contar('pares_diario', len(do_diario))
+    return dist, chaves
+
+def _consultar_blocos(coords_origem, coords_destino, alvo, dist, geodesica, chaves,
+                      blocos_origem, blocos_destino, url_base=None, progresso=True):
+    """Consulta os pares marcados em alvo, bloco a bloco, preenchendo dist e o cache.
+
+    Só as distâncias roteadas vão para o cache; os pares que caem para a geodésica
+    preenchem dist, mas são consultados de novo na próxima execução. Com um diário
+    ativo, cada bloco concluído (com os pares da geodésica) também é gravado nele.
+    """
+    cache = obter_cache_distancia()
+    diario = diario_atual()
+    tiles = []
+    for bloco_origem in blocos_origem:
+        for bloco_destino in blocos_destino:
+            sub = alvo[np.ix_(bloco_origem, bloco_destino)]
+            if not sub.any():
+                continue
+            # Restringe o bloco às linhas e colunas que realmente têm pares faltando
+            origens = [bloco_origem[k] for k in np.flatnonzero(sub.any(axis=1))]
+            destinos = [bloco_destino[k] for k in np.flatnonzero(sub.any(axis=0))]
+            tiles.append((origens, destinos))
+
+    if progresso and logger.isEnabledFor(logging.INFO):
+        tiles = tqdm(tiles, desc="Calculando distâncias", unit="bloco")
+    for origens, destinos in tiles:
+        novas, geodesicas = {}, {}
+        tabela = consultar_tabela([coords_origem[i] for i in origens],
+                                  [coords_destino[j] for j in destinos],
+                                  url_base=url_base)
+        contar('blocos_consultados')
+        for a, i in enumerate(origens):
+            for b, j in enumerate(destinos):
+                key = chaves.get((i, j))
+                if key is None or not (alvo[i][j] or np.isnan(dist[i][j])):
+                    continue
+                dist_estrada = tabela[a][b] if tabela is not None else None
+                if dist_estrada is not None:
+                    # Pares que vieram de graça no mesmo bloco também são aproveitados
+                    dist[i][j] = round(dist_estrada * 1.1, 1)
+                    novas[key] = dist[i][j]
+                elif alvo[i][j]:
+                    dist[i][j] = round(geodesica[i][j] * 1.15, 1)
+                    geodesicas[key] = dist[i][j]
+                    contar('pares_geodesica')
+        # Grava cada bloco ao terminar, para não perder o que já foi consultado
+        cache.salvar_varios(novas)
+        if diario is not None:
+            diario.registrar_distancias({**novas, **geodesicas})
+        contar('pares_roteados', len(novas))
+
+def calcular_distancias_pares(coords_origem, coords_destino, tamanho_bloco=OSRM_TABLE_TAMANHO_BLOCO, url_base=None):
+    """Distâncias origem x destino (km) com cache e /table, para montar a matriz por partes"""
+    n_origem = len(coords_origem)
+    geodesica = matriz_haversine(list(coords_origem) + list(coords_destino))[:n_origem, n_origem:]
+    dist, chaves = _distancias_do_cache(coords_origem, coords_destino, geodesica)
+    alvo = np.isnan(dist)
+    if alvo.any():
+        blocos_origem = [list(range(i, min(i + tamanho_bloco, n_origem))) for i in range(0, n_origem, tamanho_bloco)]
+        blocos_destino = [list(range(j, min(j + tamanho_bloco, len(coords_destino))))
+                          for j in range(0, len(coords_destino), tamanho_bloco)]
+        _consultar_blocos(coords_origem, coords_destino, alvo, dist, geodesica, chaves,
+                          blocos_origem, blocos_destino, url_base=url_base, progresso=False)
+    # Sem resposta e sem fallback possível (coordenadas inválidas)
+    dist[np.isnan(dist)] = np.inf
+    return dist
+
+def revalidar_distancias(limite=MAX_REVALIDACOES_DISTANCIA, tamanho_bloco=OSRM_TABLE_TAMANHO_BLOCO, url_base=None):
+    """Consulta de novo até limite pares servidos vencidos pelo cache; retorna quantos atualizou.
+
+    Roda depois do PDF, para não atrasar a rota. Os pares são agrupados por origens e
+    destinos em blocos do /table; pares sem resposta continuam com a distância antiga.
+    """
+    cache = obter_cache_distancia()
+    pares = {}
+    for chave in cache.obsoletos()[:limite]:
+        origem, destino = chave.split('_')
+        pares.setdefault(origem, set()).add(destino)
+    if not pares:
+        return 0
+    origens = sorted(pares)
+    destinos = sorted(set().union(*pares.values()))
+    coordenada = {local: tuple(float(x) for x in local.split(',')) for local in origens + destinos}
+    atualizados = 0
+    for i in range(0, len(origens), tamanho_bloco):
+        bloco_origem = origens[i:i + tamanho_bloco]
+        for j in range(0, len(destinos), tamanho_bloco):
+            bloco_destino = destinos[j:j + tamanho_bloco]
+            if not any(d in pares[o] for o in bloco_origem for d in bloco_destino):
+                continue
+            tabela = consultar_tabela([coordenada[o] for o in bloco_origem],
+                                      [coordenada[d] for d in bloco_destino], url_base=url_base)
+            if tabela is None:
+                continue
+            novas = {f"{o}_{d}": round(tabela[a][b] * 1.1, 1)
+                     for a, o in enumerate(bloco_origem) for b, d in enumerate(bloco_destino)
+                     if d in pares[o] and tabela[a][b] is not None}
+            cache.salvar_varios(novas)
+            atualizados += len(novas)
+    contar('distancias_revalidadas', atualizados)
+    return atualizados
+
+def calcular_matriz_distancias(coordenadas, tamanho_bloco=OSRM_TABLE_TAMANHO_BLOCO, url_base=None,
+                               vizinhos=None, simetrica=False):
+    """Monta a matriz n x n de distâncias usando o cache e o /table do OSRM em blocos.
+
+    Apenas os pares ausentes do cache são consultados. As distâncias por estrada
+    recebem a correção de x1.1 e os pares sem resposta caem para a geodésica x1.15
+    (sem gravar no cache).
+
+    Com vizinhos (ver grafo_candidatos), só os pares candidatos são roteados; os demais
+    recebem a linha reta multiplicada pela razão estrada/linha reta medida nos pares
+    conhecidos. Com simetrica=True, cada par é consultado em um único sentido.
+
+    Pontos no mesmo local (mesmo util.id_local) compartilham a linha e a coluna da
+    matriz: ela é montada para os locais distintos e expandida no fim.
+    """
+    n = len(coordenadas)
+    posicao = {}
+    indice = [posicao.setdefault(id_local(c), len(posicao)) for c in coordenadas]
+    if len(posicao) < n:
+        primeiros = {}
+        for i, u in enumerate(indice):
+            primeiros.setdefault(u, i)
+        vizinhos_locais = None
+        if vizinhos is not None:
+            vizinhos_locais = [set() for _ in primeiros]
+            for i, v in enumerate(vizinhos):
+                vizinhos_locais[indice[i]].update(indice[j] for j in v)
+            vizinhos_locais = [sorted(v - {u}) for u, v in enumerate(vizinhos_locais)]
+        contar('pontos_mesmo_local', n - len(primeiros))
+        locais = calcular_matriz_distancias([coordenadas[i] for i in primeiros.values()], tamanho_bloco, url_base,
+                                            vizinhos_locais, simetrica)
+        return locais[np.ix_(indice, indice)]
+    geodesica = matriz_haversine(coordenadas)
+    dist_matrix, chaves = _distancias_do_cache(coordenadas, coordenadas, geodesica)
+
+    alvo = np.isnan(dist_matrix)
+    if vizinhos is not None:
+        candidatos = np.zeros((n, n), dtype=bool)
+        for i, v in enumerate(vizinhos):
+            candidatos[i, v] = True
+        candidatos |= candidatos.T
+        alvo &= candidatos
+    if simetrica:
+        # Basta um sentido: se um deles já está no cache, o outro é espelhado
+        conhecidos = ~np.isnan(dist_matrix)
+        alvo = (alvo | alvo.T) & ~conhecidos & ~conhecidos.T
+        alvo = np.triu(alvo, k=1)
+
+    total_alvo = int(alvo.sum())
+    print_colorido(f"Pares no cache: {int((~np.isnan(dist_matrix)).sum()) - n} | Pares a consultar: {total_alvo}", Fore.CYAN)
+
+    if total_alvo:
+        ordem = _ordem_espacial(coordenadas)
+        blocos = [ordem[inicio:inicio + tamanho_bloco].tolist() for inicio in range(0, n, tamanho_bloco)]
+        _consultar_blocos(coordenadas, coordenadas, alvo, dist_matrix, geodesica, chaves,
+                          blocos, blocos, url_base=url_base)
+
+    if simetrica:
+        espelho = np.isnan(dist_matrix) & ~np.isnan(dist_matrix.T)
+        dist_matrix[espelho] = dist_matrix.T[espelho]
+
+    restantes = np.isnan(dist_matrix)
+    if restantes.any():
+        # Estimativa calibrada: razão mediana estrada/linha reta dos pares roteados
+        with np.errstate(invalid='ignore', divide='ignore'):
+            validos = ~restantes & np.isfinite(dist_matrix) & np.isfinite(geodesica) & (geodesica > 0.5)
+            razoes = dist_matrix[validos] / geodesica[validos]
+        razao = float(np.median(razoes)) if razoes.size else 1.15
+        print_colorido(f"Pares estimados pela linha reta (x{razao:.2f}): {int(restantes.sum())}", Fore.CYAN)
+        dist_matrix[restantes] = np.round(geodesica[restantes] * razao, 1)
+        contar('pares_estimados', int(restantes.sum()))
+
+    return dist_matrix
+
+LIMITE_DESVIO_OUTLIER = 2
+
+def identificar_outliers(dist_matrix, limite_desvio=LIMITE_DESVIO_OUTLIER):
+    """Identifica pontos cuja distância média aos demais fica limite_desvio desvios acima da média geral.
+
+    Pares sem distância (inf ou nan) e a diagonal ficam mascarados. Retorna
+    (pontos_principais, outliers); pontos sem nenhuma distância conhecida não
+    entram em nenhuma das listas.
+    """
+    d = np.ma.masked_invalid(np.asarray(dist_matrix, dtype=float))
+    n = len(d)
+    if n <= 1:
+        return [], []
+    d[np.diag_indices(n)] = np.ma.masked
+    if d.count() == 0:
+        return [], []
+
+    media = d.mean()
+    desvio = d.std()
+    media_ponto = d.mean(axis=1)
+    conhecidos = ~np.ma.getmaskarray(media_ponto)
+    acima = np.ma.filled(media_ponto > media + limite_desvio * desvio, False)
+    return np.flatnonzero(~acima & conhecidos).tolist(), np.flatnonzero(acima & conhecidos).tolist()
+
+# Agrupamento por densidade (DBSCAN) em linha reta, feito antes da matriz: um ponto
+# sem nenhuma outra parada a menos de RAIO_OUTLIER_KM (ex.: endereço geocodificado
+# em outro estado) é marcado antes de gastar consultas de rota com ele
+RAIO_OUTLIER_KM = 25.0
+MIN_PONTOS_GRUPO = 2  # Incluindo o próprio ponto: basta um vizinho no raio
+
+def _vizinhos_no_raio(coordenadas, raio_km):
+    """Para cada ponto, os índices dos pontos a até raio_km em linha reta (incluindo ele mesmo)"""
+    c = np.asarray(coordenadas, dtype=float).reshape(-1, 2)
+    validas = np.isfinite(c).all(axis=1) & (np.abs(c[:, 0]) <= 90) & (np.abs(c[:, 1]) <= 180)
+    vizinhos = [np.empty(0, dtype=np.int64) for _ in range(len(c))]
+    indices = np.flatnonzero(validas)
+    if not len(indices):
+        return vizinhos
+    try:
+        from scipy.spatial import cKDTree
+        lat = np.radians(c[indices, 0])
+        lon = np.radians(c[indices, 1])
+        xyz = np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+        corda = 2 * np.sin(min(raio_km / RAIO_TERRA_KM, np.pi) / 2)
+        for k, proximos in enumerate(cKDTree(xyz).query_ball_point(xyz, corda)):
+            vizinhos[indices[k]] = indices[np.asarray(proximos, dtype=np.int64)]
+    except ImportError:
+        geodesica = matriz_haversine(c[indices], distancia_maxima=None)
+        for k, linha in enumerate(geodesica <= raio_km):
+            vizinhos[indices[k]] = indices[linha]
+    return vizinhos
+
+def agrupar_por_densidade(coordenadas, raio_km=RAIO_OUTLIER_KM, min_pontos=MIN_PONTOS_GRUPO):
+    """DBSCAN sobre as coordenadas: retorna o rótulo do grupo de cada ponto (-1 para ruído)"""
+    vizinhos = _vizinhos_no_raio(coordenadas, raio_km)
+    nucleo = np.array([len(v) >= min_pontos for v in vizinhos], dtype=bool)
+    rotulos = np.full(len(vizinhos), -1, dtype=np.int64)
+    grupo = 0
+    for inicio in np.flatnonzero(nucleo):
+        if rotulos[inicio] != -1:
+            continue
+        rotulos[inicio] = grupo
+        fila = [inicio]
+        while fila:
+            p = fila.pop()
+            if not nucleo[p]:
+                continue  # Ponto de borda: entra no grupo, mas não o expande
+            novos = vizinhos[p][rotulos[vizinhos[p]] == -1]
+            rotulos[novos] = grupo
+            fila.extend(novos.tolist())
+        grupo += 1
+    return rotulos
+
+# Como os pontos isolados são detectados antes da matriz: 'dbscan' (sem vizinho no raio) ou
+# 'distancia' (distância média em linha reta LIMITE_DESVIO_OUTLIER desvios acima da média)
+METODOS_OUTLIER = ('dbscan', 'distancia')
+METODO_OUTLIER = 'dbscan'
+
+def outliers_espaciais(coordenadas, raio_km=RAIO_OUTLIER_KM, min_pontos=MIN_PONTOS_GRUPO, metodo=METODO_OUTLIER):
+    """Índices dos pontos isolados, sem contar o ponto de partida (índice 0).
+
+    Com metodo='dbscan' são o ruído de agrupar_por_densidade; com 'distancia', os
+    outliers de identificar_outliers sobre a matriz em linha reta (raio_km e
+    min_pontos não são usados).
+    """
+    if metodo == 'distancia':
+        _, outliers = identificar_outliers(matriz_haversine(coordenadas))
+        return [int(i) for i in outliers if i != 0]
+    if metodo != 'dbscan':
+        raise ValueError(f"Método de outliers desconhecido: {metodo} (use {', '.join(METODOS_OUTLIER)})")
+    rotulos = agrupar_por_densidade(coordenadas, raio_km, min_pontos)
+    return [int(i) for i in np.flatnonzero(rotulos == -1) if i != 0]
@@ -0,0 +1,47 @@
+"""Estado de uma execução (coordenadas, matriz e rota) salvo ao lado do PDF.
+
+É o ponto de partida do replanejamento incremental: quando a planilha muda, só
+os endereços novos são geocodificados e roteados. O arquivo é um .npz sem
+objetos Python (np.load sem allow_pickle).
+"""
+import json
+import os
+
+import numpy as np
+
+VERSAO_ESTADO = 1
+
+def caminho_estado(arquivo_pdf):
+    return os.path.splitext(arquivo_pdf)[0] + ".estado.npz"
+
+def salvar_estado(arquivo, ponto_partida, enderecos_validos, coordenadas, dist_matrix, rota, fechada):
+    """Grava o estado; enderecos_validos e coordenadas incluem o ponto de partida na posição 0"""
+    meta = {'versao': VERSAO_ESTADO, 'ponto_partida': ponto_partida, 'fechada': bool(fechada)}
+    temporario = arquivo + ".tmp.npz"
+    np.savez_compressed(
+        temporario,
+        meta=np.array(json.dumps(meta, ensure_ascii=False)),
+        enderecos=np.array([str(e) for e in enderecos_validos]),
+        coordenadas=np.asarray(coordenadas, dtype=float).reshape(-1, 2),
+        matriz=np.asarray(dist_matrix, dtype=float),
+        rota=np.asarray(rota, dtype=np.int64),
+    )
+    os.replace(temporario, arquivo)
+    return arquivo
+
+def carregar_estado(arquivo):
+    """Retorna o estado salvo como dicionário, ou None se não existir ou for de outra versão"""
+    if not os.path.exists(arquivo):
+        return None
+    with np.load(arquivo) as dados:
+        meta = json.loads(str(dados['meta']))
+        if meta.get('versao') != VERSAO_ESTADO:
+            return None
+        return {
+            'ponto_partida': meta['ponto_partida'],
+            'fechada': meta['fechada'],
+            'enderecos': dados['enderecos'].tolist(),
+            'coordenadas': [tuple(c) for c in dados['coordenadas'].tolist()],
+            'matriz': dados['matriz'],
+            'rota': dados['rota'].tolist(),
+        }
@@ -0,0 +1,359 @@
+"""Geocodificação dos endereços (índice local e Nominatim) com cache em memória.
+
+Com um índice local definido (GEOCODIFICADOR_LOCAL ou definir_geocodificador_local,
+ver geocodificador_local), os endereços que não estão no cache são procurados nele
+primeiro; o Nominatim só é consultado quando o índice não conhece o endereço.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from colorama import Fore
+from tqdm import tqdm
+
+from .cliente_http import obter_cliente
+from .diario import diario_atual
+from .metricas import contar
+from .normalizacao import chave_endereco, expandir_abreviacoes, indexar_enderecos
+from .util import (ajustar_coordenada, extrair_coordenada, is_coordenada, print_colorido, remover_acentos,
+                   validade_com_jitter)
+
+# Cache para geocodificação com timestamp
+CACHE_FILE = "geocodificacao_cache.json"
+CACHE_EXPIRATION_DAYS = 30  # Cache expira após 30 dias (±20%, ver util.validade_com_jitter)
+
+CACHE_FALHA_EXPIRATION_DAYS = 3  # Endereços não encontrados são tentados de novo após 3 dias
+
+# Entradas encontradas e vencidas há menos de CACHE_FATOR_OBSOLETO vezes a validade continuam
+# sendo usadas (obsoletas) e são consultadas de novo depois do PDF, no máximo
+# MAX_REVALIDACOES_GEOCODIFICACAO por execução; as mais antigas são descartadas
+CACHE_FATOR_OBSOLETO = 3
+MAX_REVALIDACOES_GEOCODIFICACAO = 20
+
+def _idade(v, current_time):
+    return (current_time - datetime.fromisoformat(v['timestamp'])).total_seconds()
+
+def _entrada_valida(k, v, current_time):
+    dias = CACHE_EXPIRATION_DAYS if v.get('coords') else CACHE_FALHA_EXPIRATION_DAYS
+    return _idade(v, current_time) < validade_com_jitter(k, dias)
+
+def _entrada_utilizavel(k, v, current_time):
+    """Válida ou, se encontrada, ainda obsoleta; endereços não encontrados não são servidos vencidos"""
+    if not v.get('coords'):
+        return _entrada_valida(k, v, current_time)
+    return _idade(v, current_time) < validade_com_jitter(k, CACHE_EXPIRATION_DAYS) * CACHE_FATOR_OBSOLETO
+
+def _migrar_chaves(cache_data):
+    """Reescreve as chaves com chave_endereco (caches antigos usam o texto da planilha), mantendo a mais recente"""
+    migrado = {}
+    for k, v in cache_data.items():
+        chave = chave_endereco(k)
+        if chave not in migrado or v['timestamp'] > migrado[chave]['timestamp']:
+            migrado[chave] = v
+    return migrado
+
+def carregar_cache(expirados=None):
+    """Carrega as entradas válidas ou obsoletas do cache; as chaves descartadas são adicionadas ao set expirados"""
+    if os.path.exists(CACHE_FILE):
+        try:
+            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                cache_data = _migrar_chaves(json.load(f))
+                current_time = datetime.now()
+                if expirados is not None:
+                    expirados.update(k for k, v in cache_data.items()
+                                     if not _entrada_utilizavel(k, v, current_time))
+                cache_data = {
+                    k: v for k, v in cache_data.items()
+                    if _entrada_utilizavel(k, v, current_time)
+                }
+                return cache_data
+        except Exception as e:
+            print_colorido(f"Erro ao carregar cache: {str(e)}", Fore.RED, nivel=logging.ERROR)
+            return {}
+    return {}
+
+def salvar_cache(cache):
+    try:
+        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print_colorido(f"Erro ao salvar cache: {str(e)}", Fore.RED, nivel=logging.ERROR)
+
+class CacheGeocodificacao:
+    """Cache de geocodificação em memória, carregado uma vez e gravado em lote.
+
+    As chaves são normalizadas com chave_endereco, então variações de escrita do mesmo
+    endereço compartilham a entrada. Entradas com 'coords' igual a None registram
+    endereços que o Nominatim não encontrou; elas expiram em CACHE_FALHA_EXPIRATION_DAYS.
+    As entradas encontradas e vencidas são servidas como acertos e anotadas para
+    revalidar_geocodificacoes. estatisticas conta os acertos, os acertos obsoletos,
+    os acertos negativos, as faltas e quantas faltas eram entradas expiradas.
+
+    Quem altera o cache grava com salvar; na saída do processo, só a instância mais
+    recente é gravada (ver _salvar_cache_atual), para uma instância antiga não
+    sobrescrever as entradas de uma nova.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expirados = set()
+        self._dados = carregar_cache(self._expirados)
+        self._obsoletos = {}  # chave -> endereço como consultado, na ordem de uso
+        self._alterado = False
+        self.estatisticas = {'acertos': 0, 'obsoletos': 0, 'negativos': 0, 'faltas': 0, 'expirados': 0}
+        global _cache_atual
+        _cache_atual = weakref.ref(self)
+
+    def obter(self, endereco):
+        chave = chave_endereco(endereco)
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                self.estatisticas['faltas'] += 1
+                if chave in self._expirados:
+                    self.estatisticas['expirados'] += 1
+            elif entrada['coords']:
+                self.estatisticas['acertos'] += 1
+                if not _entrada_valida(chave, entrada, datetime.now()):
+                    self.estatisticas['obsoletos'] += 1
+                    self._obsoletos.setdefault(chave, endereco)
+            else:
+                self.estatisticas['negativos'] += 1
+            return entrada
+
+    def obsoletos(self):
+        """Endereços servidos vencidos nesta execução e ainda não revalidados"""
+        with self._lock:
+            return list(self._obsoletos.values())
+
+    def registrar(self, endereco, resultado):
+        endereco = chave_endereco(endereco)
+        with self._lock:
+            self._dados[endereco] = resultado
+            self._obsoletos.pop(endereco, None)
+            self._alterado = True
+
+    def completar(self, conhecidos):
+        """Grava os endereços que o cache não tem (ou só tem como não encontrados).
+
+        conhecidos é um dicionário endereco -> (coords, timestamp ISO) de coordenadas já
+        obtidas em outra execução; com o timestamp original, as entradas vencem e são
+        revalidadas como as demais. Retorna quantas entradas foram gravadas.
+        """
+        gravadas = 0
+        with self._lock:
+            for endereco, (coords, timestamp) in conhecidos.items():
+                chave = chave_endereco(endereco)
+                entrada = self._dados.get(chave)
+                if entrada is None or not entrada['coords']:
+                    self._dados[chave] = {'coords': tuple(coords), 'timestamp': timestamp}
+                    gravadas += 1
+            self._alterado = self._alterado or gravadas > 0
+        return gravadas
+
+    def registrar_falha(self, endereco):
+        self.registrar(endereco, {'coords': None, 'timestamp': datetime.now().isoformat()})
+
+    def salvar(self):
+        with self._lock:
+            if not self._alterado:
+                return
+            salvar_cache(self._dados)
+            self._alterado = False
+
+_cache_atual = None  # weakref da última CacheGeocodificacao criada
+
+def _salvar_cache_atual():
+    """Grava, na saída do processo, o que a instância mais recente ainda não gravou"""
+    cache = _cache_atual() if _cache_atual is not None else None
+    if cache is not None:
+        cache.salvar()
+
+atexit.register(_salvar_cache_atual)
+
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+
+GEOCODIFICADOR_LOCAL = os.environ.get("GEOCODIFICADOR_LOCAL")
+
+_geocodificador_local = None
+_geocodificador_local_lock = threading.Lock()
+
+def definir_geocodificador_local(pasta):
+    """Passa a procurar os endereços no índice local em pasta antes do Nominatim (None desativa)"""
+    global GEOCODIFICADOR_LOCAL, _geocodificador_local
+    with _geocodificador_local_lock:
+        GEOCODIFICADOR_LOCAL = pasta
+        _geocodificador_local = None
+
+def obter_geocodificador_local():
+    global _geocodificador_local
+    with _geocodificador_local_lock:
+        if _geocodificador_local is None and GEOCODIFICADOR_LOCAL:
+            from .geocodificador_local import GeocodificadorLocal
+            _geocodificador_local = GeocodificadorLocal(GEOCODIFICADOR_LOCAL)
+        return _geocodificador_local
+
+def geocodificar_local(endereco):
+    """Coordenadas pelo índice local, ou None sem índice ou se ele não conhece o endereço"""
+    geocodificador = obter_geocodificador_local()
+    if geocodificador is None:
+        return None
+    coords = geocodificador.geocodificar(endereco)
+    contar('geocodificados_local' if coords else 'faltas_local')
+    return coords
+
+def geocodificar_endereco(endereco, max_tentativas=3):
+    endereco_sem_acento = remover_acentos(expandir_abreviacoes(endereco))
+    endereco_formatado = f"{endereco_sem_acento}, Brasil"
+    url = f"{NOMINATIM_URL.rstrip('/')}/search?q={requests.utils.quote(endereco_formatado)}&format=json&limit=1"
+    # O limite de 1 req/s e as pausas de 403/429 ficam a cargo do cliente compartilhado
+    response = obter_cliente().get('nominatim', url, timeout=10, max_tentativas=max_tentativas)
+    if response is None or response.status_code != 200:
+        return None
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if not data:
+        # O Nominatim respondeu, mas não conhece o endereço: não adianta repetir
+        return {'coords': None, 'timestamp': datetime.now().isoformat()}
+    lat = float(data[0]['lat'])
+    lon = float(data[0]['lon'])
+    return {
+        'coords': (lat, lon),
+        'timestamp': datetime.now().isoformat()
+    }
+
+def processar_endereco(endereco, cache):
+    """Resolve um endereço da planilha; retorna (endereco, coords ou None, status).
+
+    As coordenadas saem na grade de util.id_local, para que pequenas variações do mesmo
+    ponto caiam nas mesmas entradas do cache de distâncias. Com um diário ativo (ver
+    diario), as respostas do Nominatim são gravadas nele e as de uma execução
+    interrompida são reaproveitadas sem nova consulta.
+    """
+    return _na_grade(_processar_endereco(endereco, cache))
+
+def _na_grade(resultado):
+    endereco, coords, status = resultado
+    return endereco, ajustar_coordenada(coords) if coords else None, status
+
+def _processar_endereco(endereco, cache):
+    resultado, entrada = _resolver_sem_consulta(endereco, cache)
+    return resultado or _consultar_endereco(endereco, cache, entrada)
+
+def _resolver_sem_consulta(endereco, cache):
+    """((endereco, coords, status) ou None, entrada do cache): resolve coordenadas, diário e cache, sem rede"""
+    if is_coordenada(endereco):
+        coords = extrair_coordenada(endereco)
+        if coords:
+            return (endereco, coords, 'coordenada'), None
+        else:
+            return (endereco, None, 'erro'), None
+    diario = diario_atual()
+    salvo = diario.geocodificacao(endereco) if diario is not None else None
+    if salvo is not None:
+        contar('geocodificados_diario')
+        return (endereco, *salvo), None
+    entrada = cache.obter(endereco)
+    if entrada is not None and entrada['coords']:
+        return (endereco, entrada['coords'], 'cache'), entrada
+    return None, entrada
+
+def _consultar_endereco(endereco, cache, entrada):
+    """Índice local e Nominatim para um endereço que _resolver_sem_consulta não resolveu"""
+    # O índice local não vai para o cache: é tão rápido quanto ele e acompanha as atualizações do índice
+    coords = geocodificar_local(endereco)
+    if coords:
+        return endereco, coords, 'local'
+    if entrada is not None:
+        return endereco, None, 'erro_cache'
+    resultado = geocodificar_endereco(endereco)
+    if resultado is None:
+        return endereco, None, 'erro'
+    cache.registrar(endereco, resultado)
+    status = 'geocodificado' if resultado['coords'] else 'erro'
+    diario = diario_atual()
+    if diario is not None:
+        diario.registrar_geocodificacao(endereco, resultado['coords'], status)
+    return endereco, resultado['coords'], status
+
+def geocodificar_ponto_partida(ponto_partida, cache):
+    """Retorna as coordenadas do ponto de partida (na grade de util.id_local) ou levanta ValueError"""
+    return ajustar_coordenada(_geocodificar_ponto_partida(ponto_partida, cache))
+
+def _geocodificar_ponto_partida(ponto_partida, cache):
+    if is_coordenada(ponto_partida):
+        coords = extrair_coordenada(ponto_partida)
+        if coords:
+            return coords
+        raise ValueError(f"Não foi possível interpretar as coordenadas do ponto de partida: {ponto_partida}")
+    diario = diario_atual()
+    salvo = diario.geocodificacao(ponto_partida) if diario is not None else None
+    if salvo is not None and salvo[0]:
+        return salvo[0]
+    entrada = cache.obter(ponto_partida)
+    if entrada and entrada['coords']:
+        print_colorido("✅ Usando coordenadas do cache para ponto de partida", Fore.GREEN, nivel=logging.DEBUG)
+        return entrada['coords']
+    coords = geocodificar_local(ponto_partida)
+    if coords:
+        return coords
+    resultado = geocodificar_endereco(ponto_partida)
+    if resultado and resultado['coords']:
+        cache.registrar(ponto_partida, resultado)
+        if diario is not None:
+            diario.registrar_geocodificacao(ponto_partida, resultado['coords'], 'geocodificado')
+        return resultado['coords']
+    raise ValueError(f"Não foi possível geocodificar o ponto de partida: {ponto_partida}")
+
+def geocodificar_lote(enderecos, cache=None, max_workers=6, progresso=True):
+    """Geocodifica uma lista de endereços em paralelo.
+
+    Retorna uma lista de (endereco, coords ou None, status) na mesma ordem da entrada
+    e grava o cache uma única vez ao final. Endereços com a mesma chave_endereco são
+    geocodificados uma única vez.
+    """
+    cache = cache or CacheGeocodificacao()
+    unicos, indice = indexar_enderecos(enderecos)
+    # Coordenadas, diário e cache são resolvidos aqui mesmo; só o que precisa de consulta vai para as threads
+    resultados = [None] * len(unicos)
+    faltando = []
+    for k, i in enumerate(unicos):
+        resultado, entrada = _resolver_sem_consulta(enderecos[i], cache)
+        if resultado is not None:
+            resultados[k] = _na_grade(resultado)
+        else:
+            faltando.append((k, entrada))
+    if faltando:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(faltando))) as executor:
+            consultas = executor.map(
+                lambda f: _na_grade(_consultar_endereco(enderecos[unicos[f[0]]], cache, f[1])), faltando)
+            if progresso:
+                consultas = tqdm(consultas, total=len(faltando), desc="Progresso", unit="endereço")
+            for (k, _), resultado in zip(faltando, consultas):
+                resultados[k] = resultado
+    cache.salvar()
+    return [(endereco, *resultados[u][1:]) for endereco, u in zip(enderecos, indice)]
+
+def revalidar_geocodificacoes(cache, limite=MAX_REVALIDACOES_GEOCODIFICACAO):
+    """Consulta de novo no Nominatim até limite endereços servidos vencidos pelo cache; retorna quantos atualizou.
+
+    Roda depois do PDF, para não atrasar a rota. Se o Nominatim não responder ou não
+    encontrar o endereço, a entrada antiga continua até ser descartada.
+    """
+    atualizados = 0
+    for endereco in cache.obsoletos()[:limite]:
+        resultado = geocodificar_endereco(endereco)
+        if resultado and resultado['coords']:
+            cache.registrar(endereco, resultado)
+            atualizados += 1
+    cache.salvar()
+    contar('geocodificacoes_revalidadas', atualizados)
+    return atualizados
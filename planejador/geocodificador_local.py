@@ -0,0 +1,451 @@
+"""Geocodificação local a partir de um extrato do OpenStreetMap e/ou de uma tabela de CEPs, sem rede.
+
+O índice fica em uma pasta com um .npy por array, carregados com mmap (como o
+grafo_viario): as ruas, ordenadas pelo nome normalizado, com a geometria, os
+números conhecidos ao longo dela e um índice de trigramas dos nomes. Uma consulta
+procura a rua pelo nome exato, por prefixo ou por trigramas, filtra pela cidade e
+interpola o número entre os endereços conhecidos da rua. Sem endereços conhecidos,
+usa a numeração métrica (o número é a distância em metros do início da rua). O CEP
+só é usado quando a rua não está no índice, e nunca um CEP geral de cidade
+(terminado em 000, como o 17230-000 de Itapuí): todos os endereços com ele cairiam
+no mesmo ponto.
+
+Construção (uma vez por região):
+
+    python -m planejador.geocodificador_local sao-paulo-latest.osm.pbf ceps.csv indice-sp
+
+Arquivos .osm/.osm.bz2 são lidos com a biblioteca padrão e .pbf exige o pacote
+osmium. A tabela de CEPs é um CSV com as colunas cep, lat e lon e, opcionalmente,
+logradouro e cidade (ruas sem geometria no OSM passam a existir pelos pontos).
+"""
+import bz2
+import csv
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from .normalizacao import extrair_cep, nome_rua, separar_endereco, tokens_endereco
+
+RAIO_TERRA_M = 6371008.8
+
+TIPOS_LUGAR = {'city', 'town', 'village'}
+DISTANCIA_MAXIMA_ENDERECO_M = 300  # Endereço mais longe que isso da rua de mesmo nome não é usado na interpolação
+METROS_POR_NUMERO = 1.0  # Numeração métrica
+LIMIAR_SIMILARIDADE = 0.6  # Coeficiente de Dice dos trigramas para aceitar um nome aproximado
+
+ARQUIVOS = ('nomes', 'rua_cidade', 'cidades', 'geom_indptr', 'geom_coords', 'geom_acum',
+            'num_indptr', 'num_valor', 'num_pos', 'tri_chaves', 'tri_indptr', 'tri_ruas', 'rua_ntri',
+            'cep_chaves', 'cep_coords')
+
+def cep_generico(cep):
+    """CEP geral da cidade (sufixo 000), compartilhado por todos os endereços de cidades pequenas"""
+    return cep % 1000 == 0
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _trigramas(nome):
+    """Trigramas (inteiros de 24 bits) do nome com dois espaços antes e um depois"""
+    b = f"  {nome} ".encode('utf-8')
+    return np.unique([(b[i] << 16) | (b[i + 1] << 8) | b[i + 2] for i in range(len(b) - 2)]).astype(np.int64)
+
+def _acumulado(coords):
+    """Distância em metros do início da linha até cada vértice"""
+    trechos = _haversine_m(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    return np.concatenate(([0.0], np.cumsum(trechos)))
+
+def _projetar(coords, acum, lat, lon):
+    """Projeta o ponto na linha; retorna (distância até a linha, posição ao longo dela), em metros"""
+    if len(coords) == 1:
+        return float(_haversine_m(lat, lon, coords[0, 0], coords[0, 1])), 0.0
+    # Plano local (equirretangular) em metros: basta para trechos de rua
+    escala = np.array([1.0, np.cos(np.radians(lat))]) * np.radians(1) * RAIO_TERRA_M
+    xy = (coords - (lat, lon)) * escala
+    a, b = xy[:-1], xy[1:]
+    ab = b - a
+    comprimento2 = np.einsum('ij,ij->i', ab, ab)
+    t = np.clip(-np.einsum('ij,ij->i', a, ab) / np.where(comprimento2 > 0, comprimento2, 1), 0, 1)
+    distancias = np.hypot(*(a + t[:, None] * ab).T)
+    k = int(np.argmin(distancias))
+    return float(distancias[k]), float(acum[k] + t[k] * (acum[k + 1] - acum[k]))
+
+def _cidade(nome):
+    return " ".join(tokens_endereco(nome))
+
+# --- Leitura do extrato -------------------------------------------------------
+
+def _ler_xml(arquivo):
+    """Lê um .osm (XML) em duas passadas: vias com nome e endereços, depois os nós que eles usam"""
+    abrir = bz2.open if arquivo.endswith('.bz2') else open
+    vias, predios, usados = [], [], set()
+    with abrir(arquivo, 'rb') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == 'way':
+                tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                if tags.get('highway') and tags.get('name'):
+                    vias.append((tags['name'], refs))
+                    usados.update(refs)
+                elif tags.get('addr:street') and tags.get('addr:housenumber'):
+                    predios.append((tags, refs))
+                    usados.update(refs)
+            if elem.tag in ('node', 'way', 'relation'):
+                elem.clear()
+    nos, lugares, enderecos = {}, [], []
+    with abrir(arquivo, 'rb') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == 'node':
+                osm_id = int(elem.get('id'))
+                coords = (float(elem.get('lat')), float(elem.get('lon')))
+                if osm_id in usados:
+                    nos[osm_id] = coords
+                tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                if tags.get('place') in TIPOS_LUGAR and tags.get('name'):
+                    lugares.append((tags['name'], coords))
+                if tags.get('addr:street') and tags.get('addr:housenumber'):
+                    enderecos.append((tags, coords))
+            if elem.tag in ('node', 'way', 'relation'):
+                elem.clear()
+    for tags, refs in predios:
+        pontos = [nos[r] for r in refs if r in nos]
+        if pontos:
+            enderecos.append((tags, tuple(np.mean(pontos, axis=0))))
+    vias = [(nome, [nos[r] for r in refs if r in nos], [r for r in refs if r in nos]) for nome, refs in vias]
+    return vias, lugares, enderecos
+
+def _ler_pbf(arquivo):
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError("Ler arquivos .pbf requer o pacote osmium (pip install osmium)") from e
+
+    class Leitor(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.vias, self.lugares, self.enderecos = [], [], []
+
+        def node(self, n):
+            tags = {t.k: t.v for t in n.tags}
+            coords = (n.location.lat, n.location.lon)
+            if tags.get('place') in TIPOS_LUGAR and tags.get('name'):
+                self.lugares.append((tags['name'], coords))
+            if tags.get('addr:street') and tags.get('addr:housenumber'):
+                self.enderecos.append((tags, coords))
+
+        def way(self, w):
+            tags = {t.k: t.v for t in w.tags}
+            nos = [n for n in w.nodes if n.location.valid()]
+            if not nos:
+                return
+            if tags.get('highway') and tags.get('name'):
+                self.vias.append((tags['name'], [(n.location.lat, n.location.lon) for n in nos],
+                                  [n.ref for n in nos]))
+            elif tags.get('addr:street') and tags.get('addr:housenumber'):
+                self.enderecos.append((tags, tuple(np.mean([(n.location.lat, n.location.lon) for n in nos], axis=0))))
+
+    leitor = Leitor()
+    leitor.apply_file(arquivo, locations=True)
+    return leitor.vias, leitor.lugares, leitor.enderecos
+
+def _ler_ceps(arquivo):
+    """Lê a tabela de CEPs; retorna {cep: (lat, lon)} e os pontos (nome, cidade, coords) com logradouro"""
+    ceps, pontos = {}, []
+    with open(arquivo, newline='', encoding='utf-8') as f:
+        for linha in csv.DictReader(f):
+            cep, _ = extrair_cep(linha.get('cep', ''))
+            try:
+                coords = (float(linha['lat']), float(linha['lon']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if cep is not None:
+                ceps[cep] = coords
+            if linha.get('logradouro'):
+                pontos.append((linha['logradouro'], linha.get('cidade') or "", coords))
+    return ceps, pontos
+
+def _encadear(trechos):
+    """Junta os trechos (lista de (coords, refs)) de uma rua pelas pontas em comum; retorna listas de coords"""
+    por_ponta = {}
+    for i, (_, refs) in enumerate(trechos):
+        por_ponta.setdefault(refs[0], []).append(i)
+        por_ponta.setdefault(refs[-1], []).append(i)
+    usados = set()
+    cadeias = []
+
+    def proximo(ponta):
+        for j in por_ponta.get(ponta, ()):
+            if j not in usados:
+                return j
+        return None
+
+    for i in range(len(trechos)):
+        if i in usados:
+            continue
+        usados.add(i)
+        coords, refs = list(trechos[i][0]), list(trechos[i][1])
+        for _ in range(2):  # Estende pelo fim e, depois de inverter, pelo início
+            j = proximo(refs[-1])
+            while j is not None:
+                usados.add(j)
+                c, r = trechos[j]
+                if r[0] != refs[-1]:
+                    c, r = c[::-1], r[::-1]
+                coords.extend(c[1:])
+                refs.extend(r[1:])
+                j = proximo(refs[-1])
+            coords.reverse()
+            refs.reverse()
+        cadeias.append(coords)
+    return cadeias
+
+def _numero(valor):
+    digitos = ""
+    for c in str(valor).strip():
+        if not c.isdigit():
+            break
+        digitos += c
+    return int(digitos) if digitos else None
+
+def construir_indice(arquivos, pasta):
+    """Constrói o índice em pasta a partir de extratos do OSM e tabelas de CEP (.csv); retorna (ruas, números, CEPs)"""
+    vias, lugares, enderecos, ceps, avulsos = [], [], [], {}, []
+    for arquivo in arquivos:
+        if arquivo.endswith('.csv'):
+            c, p = _ler_ceps(arquivo)
+            ceps.update(c)
+            avulsos.extend(p)
+        else:
+            v, l, e = _ler_pbf(arquivo) if arquivo.endswith('.pbf') else _ler_xml(arquivo)
+            vias.extend(v)
+            lugares.extend(l)
+            enderecos.extend(e)
+
+    coords_lugares = np.array([c for _, c in lugares], dtype=float).reshape(-1, 2)
+    nomes_lugares = [_cidade(n) for n, _ in lugares]
+
+    def cidade_mais_proxima(lat, lon):
+        if not len(coords_lugares):
+            return ""
+        return nomes_lugares[int(np.argmin(_haversine_m(lat, lon, coords_lugares[:, 0], coords_lugares[:, 1])))]
+
+    # Ruas: trechos com o mesmo nome são encadeados; cada cadeia recebe a cidade mais próxima do seu meio
+    por_nome = {}
+    for nome, coords, refs in vias:
+        if len(coords) >= 2:
+            por_nome.setdefault(nome_rua(nome), []).append((coords, refs))
+    ruas = []  # (nome, cidade, coords, acumulado, {número: [posições]})
+    for nome, trechos in por_nome.items():
+        for coords in _encadear(trechos):
+            meio = coords[len(coords) // 2]
+            coords = np.array(coords, dtype=float)
+            ruas.append((nome, cidade_mais_proxima(*meio), coords, _acumulado(coords), {}))
+    ruas_por_nome = {}
+    for i, rua in enumerate(ruas):
+        ruas_por_nome.setdefault(rua[0], []).append(i)
+
+    # Endereços conhecidos: viram números ao longo da rua de mesmo nome mais próxima
+    sem_rua = {}
+    for tags, (lat, lon) in enderecos:
+        numero = _numero(tags['addr:housenumber'])
+        if numero is None:
+            continue
+        nome = nome_rua(tags['addr:street'])
+        cidade = _cidade(tags['addr:city']) if tags.get('addr:city') else cidade_mais_proxima(lat, lon)
+        melhor = None
+        for i in ruas_por_nome.get(nome, ()):
+            _, cidade_rua, coords, acum, _ = ruas[i]
+            if cidade_rua and cidade and cidade_rua != cidade:
+                continue
+            distancia, posicao = _projetar(coords, acum, lat, lon)
+            if distancia <= DISTANCIA_MAXIMA_ENDERECO_M and (melhor is None or distancia < melhor[0]):
+                melhor = (distancia, i, posicao)
+        if melhor is None:
+            sem_rua.setdefault((nome, cidade), []).append((numero, (lat, lon)))
+        else:
+            ruas[melhor[1]][4].setdefault(numero, []).append(melhor[2])
+
+    # Ruas que só existem pelos endereços ou pela tabela de CEPs: a geometria liga os pontos
+    for nome, cidade, coords in avulsos:
+        nome = nome_rua(nome)
+        if nome not in ruas_por_nome:
+            sem_rua.setdefault((nome, _cidade(cidade)), []).append((None, coords))
+    for (nome, cidade), pontos in sem_rua.items():
+        pontos.sort(key=lambda p: (p[0] is None, p[0] or 0))
+        coords = np.array([c for _, c in pontos], dtype=float)
+        acum = _acumulado(coords)
+        numeros = {}
+        for k, (numero, _) in enumerate(pontos):
+            if numero is not None:
+                numeros.setdefault(numero, []).append(acum[k])
+        ruas.append((nome, cidade, coords, acum, numeros))
+
+    return _gravar(pasta, ruas, ceps)
+
+def _gravar(pasta, ruas, ceps):
+    ruas.sort(key=lambda r: (r[0], r[1]))
+    cidades = sorted({r[1] for r in ruas})
+    indice_cidade = {c: i for i, c in enumerate(cidades)}
+
+    geom_indptr = np.zeros(len(ruas) + 1, dtype=np.int64)
+    num_indptr = np.zeros(len(ruas) + 1, dtype=np.int64)
+    geom_coords, geom_acum, num_valor, num_pos = [], [], [], []
+    for i, (_, _, coords, acum, numeros) in enumerate(ruas):
+        geom_coords.append(coords)
+        geom_acum.append(acum)
+        geom_indptr[i + 1] = geom_indptr[i] + len(coords)
+        # Números repetidos (lados da rua, vários pontos) ficam com a posição média
+        for numero in sorted(numeros):
+            num_valor.append(numero)
+            num_pos.append(float(np.mean(numeros[numero])))
+        num_indptr[i + 1] = len(num_valor)
+
+    postagens = {}
+    rua_ntri = np.zeros(len(ruas), dtype=np.int32)
+    for i, rua in enumerate(ruas):
+        trigramas = _trigramas(rua[0])
+        rua_ntri[i] = len(trigramas)
+        for t in trigramas.tolist():
+            postagens.setdefault(t, []).append(i)
+    tri_chaves = np.array(sorted(postagens), dtype=np.int64)
+    tri_indptr = np.zeros(len(tri_chaves) + 1, dtype=np.int64)
+    np.cumsum([len(postagens[t]) for t in tri_chaves.tolist()], out=tri_indptr[1:])
+    tri_ruas = np.array([i for t in tri_chaves.tolist() for i in postagens[t]], dtype=np.int32)
+
+    cep_chaves = np.array(sorted(ceps), dtype=np.int64)
+    arrays = {
+        'nomes': np.array([r[0].encode('utf-8') for r in ruas], dtype=bytes),
+        'rua_cidade': np.array([indice_cidade[r[1]] for r in ruas], dtype=np.int32),
+        'cidades': np.array([c.encode('utf-8') for c in cidades], dtype=bytes),
+        'geom_indptr': geom_indptr,
+        'geom_coords': np.concatenate(geom_coords) if geom_coords else np.empty((0, 2)),
+        'geom_acum': np.concatenate(geom_acum) if geom_acum else np.empty(0),
+        'num_indptr': num_indptr,
+        'num_valor': np.array(num_valor, dtype=np.int64),
+        'num_pos': np.array(num_pos, dtype=np.float64),
+        'tri_chaves': tri_chaves,
+        'tri_indptr': tri_indptr,
+        'tri_ruas': tri_ruas,
+        'rua_ntri': rua_ntri,
+        'cep_chaves': cep_chaves,
+        'cep_coords': np.array([ceps[c] for c in cep_chaves.tolist()], dtype=np.float64).reshape(-1, 2),
+    }
+    os.makedirs(pasta, exist_ok=True)
+    for nome, array in arrays.items():
+        np.save(os.path.join(pasta, f"{nome}.npy"), array)
+    return len(ruas), len(num_valor), len(cep_chaves)
+
+# --- Consulta -------------------------------------------------------------------
+
+class GeocodificadorLocal:
+    """Índice de ruas e CEPs carregado com mmap; geocodificar() retorna (lat, lon) ou None"""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        for nome in ARQUIVOS:
+            setattr(self, nome, np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode='r'))
+        self._cidades = {c.decode('utf-8'): i for i, c in enumerate(self.cidades.tolist())}
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def candidatos(self, nome):
+        """Índices das ruas pelo nome normalizado e a similaridade (1 para o nome exato)"""
+        chave = nome.encode('utf-8')
+        inicio, fim = np.searchsorted(self.nomes, chave, 'left'), np.searchsorted(self.nomes, chave, 'right')
+        if fim > inicio:
+            return np.arange(inicio, fim), np.ones(fim - inicio)
+
+        trigramas = _trigramas(nome)
+        posicoes = np.searchsorted(self.tri_chaves, trigramas)
+        achados = posicoes < len(self.tri_chaves)
+        achados[achados] = self.tri_chaves[posicoes[achados]] == trigramas[achados]
+        posicoes = posicoes[achados]
+        if not len(posicoes):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        postagens = np.concatenate([self.tri_ruas[self.tri_indptr[p]:self.tri_indptr[p + 1]] for p in posicoes])
+        ruas, comuns = np.unique(postagens, return_counts=True)
+        similaridade = 2 * comuns / (len(trigramas) + self.rua_ntri[ruas])
+
+        # Nome digitado pela metade ("rafael reg"): os nomes com esse prefixo ficam logo depois dele
+        fim_prefixo = np.searchsorted(self.nomes, chave + b'\xff', 'left')
+        if fim_prefixo > inicio:
+            prefixo = np.arange(inicio, fim_prefixo)
+            ruas = np.concatenate((ruas, prefixo))
+            similaridade = np.concatenate((similaridade, np.full(len(prefixo), 0.95)))
+        aceitas = similaridade >= LIMIAR_SIMILARIDADE
+        return ruas[aceitas], similaridade[aceitas]
+
+    def _posicao(self, rua, numero, comprimento):
+        """Distância em metros do início da rua até o número"""
+        if numero is None:
+            return comprimento / 2
+        valores = self.num_valor[self.num_indptr[rua]:self.num_indptr[rua + 1]]
+        posicoes = self.num_pos[self.num_indptr[rua]:self.num_indptr[rua + 1]]
+        if len(valores) == 0:
+            return numero * METROS_POR_NUMERO
+        if len(valores) == 1:
+            return posicoes[0] + (numero - valores[0]) * METROS_POR_NUMERO
+        if valores[0] <= numero <= valores[-1]:
+            return float(np.interp(numero, valores, posicoes))
+        inclinacao = (posicoes[-1] - posicoes[0]) / (valores[-1] - valores[0])
+        ponta = 0 if numero < valores[0] else -1
+        return posicoes[ponta] + (numero - valores[ponta]) * inclinacao
+
+    def _ponto(self, rua, numero):
+        coords = self.geom_coords[self.geom_indptr[rua]:self.geom_indptr[rua + 1]]
+        acum = self.geom_acum[self.geom_indptr[rua]:self.geom_indptr[rua + 1]]
+        if len(coords) == 1:
+            return float(coords[0, 0]), float(coords[0, 1])
+        p = min(max(self._posicao(rua, numero, acum[-1]), 0.0), float(acum[-1]))
+        k = min(max(int(np.searchsorted(acum, p)), 1), len(acum) - 1)
+        t = (p - acum[k - 1]) / (acum[k] - acum[k - 1]) if acum[k] > acum[k - 1] else 0.0
+        lat, lon = coords[k - 1] + t * (coords[k] - coords[k - 1])
+        return float(lat), float(lon)
+
+    def geocodificar(self, endereco):
+        """Coordenadas do endereço pela rua e número ou, sem a rua, pelo CEP; None se não estiver no índice"""
+        coords = self._pela_rua(endereco)
+        if coords is None:
+            cep, _ = extrair_cep(endereco)
+            if cep is not None and not cep_generico(cep):
+                coords = self._pelo_cep(cep)
+        return coords
+
+    def _pelo_cep(self, cep):
+        if not len(self.cep_chaves):
+            return None
+        k = int(np.searchsorted(self.cep_chaves, cep))
+        if k < len(self.cep_chaves) and self.cep_chaves[k] == cep:
+            return float(self.cep_coords[k, 0]), float(self.cep_coords[k, 1])
+        return None
+
+    def _pela_rua(self, endereco):
+        rua, numero, cidade = separar_endereco(endereco)
+        if not rua:
+            return None
+        ruas, similaridade = self.candidatos(rua)
+        if cidade:
+            # A cidade precisa bater, exceto nas ruas sem cidade (extrato sem lugares)
+            aceitas = np.isin(self.rua_cidade[ruas], [self._cidades.get(cidade, -1), self._cidades.get("", -1)])
+            ruas, similaridade = ruas[aceitas], similaridade[aceitas]
+        if not len(ruas):
+            return None
+        melhores = ruas[similaridade == similaridade.max()]
+        # Entre ruas igualmente parecidas, a que tem o número entre os conhecidos e depois a mais longa
+        return self._ponto(int(max(melhores.tolist(), key=lambda r: self._preferencia(r, numero))), numero)
+
+    def _preferencia(self, rua, numero):
+        valores = self.num_valor[self.num_indptr[rua]:self.num_indptr[rua + 1]]
+        cobre = numero is not None and len(valores) > 0 and valores[0] <= numero <= valores[-1]
+        return cobre, len(valores), float(self.geom_acum[self.geom_indptr[rua + 1] - 1])
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python -m planejador.geocodificador_local EXTRATO.osm[.pbf|.bz2] [CEPS.csv ...] PASTA_DO_INDICE")
+        sys.exit(2)
+    n_ruas, n_numeros, n_ceps = construir_indice(sys.argv[1:-1], sys.argv[-1])
+    print(f"Índice salvo em {sys.argv[-1]}: {n_ruas} ruas, {n_numeros} números conhecidos, {n_ceps} CEPs")
@@ -0,0 +1,251 @@
+"""Roteamento local a partir de um extrato do OpenStreetMap, sem acesso à rede.
+
+O grafo viário é guardado em formato CSR (indptr, indices, pesos em km) em uma
+pasta com um .npy por array, carregados com mmap: abrir o grafo não lê o arquivo
+inteiro, só as páginas que o Dijkstra visita.
+
+Construção (uma vez por extrato):
+
+    python -m planejador.grafo_viario sao-paulo-latest.osm.pbf grafo-sp
+
+Arquivos .osm/.osm.bz2 são lidos com a biblioteca padrão; .pbf exige o pacote
+osmium. O Dijkstra usa o scipy.sparse.csgraph quando disponível e, sem ele, uma
+implementação com heapq que para assim que todos os destinos são alcançados.
+"""
+import bz2
+import glob
+import heapq
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:
+    dijkstra = None
+
+RAIO_TERRA_KM = 6371.0
+
+# Vias transitáveis por carro
+TIPOS_VIA = {
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link', 'unclassified',
+    'residential', 'living_street', 'service', 'road',
+}
+
+# Folga sobre a maior distância em linha reta ao limitar a busca do Dijkstra
+FATOR_LIMITE_BUSCA = 3.0
+FOLGA_LIMITE_BUSCA_KM = 5.0
+
+ARQUIVOS = ('indptr', 'indices', 'pesos', 'coordenadas')
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _sentido(tags):
+    """1 para mão única no sentido da via, -1 no sentido contrário, 0 para mão dupla"""
+    oneway = tags.get('oneway', '')
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway == 'no':
+        return 0
+    if tags.get('highway') == 'motorway' or tags.get('junction') == 'roundabout':
+        return 1
+    return 0
+
+def _vias_xml(arquivo):
+    """Lê um .osm (XML) em duas passadas: vias transitáveis e depois só os nós que elas usam"""
+    abrir = bz2.open if arquivo.endswith('.bz2') else open
+    vias = []
+    usados = set()
+    with abrir(arquivo, 'rb') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == 'way':
+                tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                if tags.get('highway') in TIPOS_VIA:
+                    refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                    vias.append((refs, _sentido(tags)))
+                    usados.update(refs)
+            if elem.tag in ('node', 'way', 'relation'):
+                elem.clear()
+    nos = {}
+    with abrir(arquivo, 'rb') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == 'node':
+                osm_id = int(elem.get('id'))
+                if osm_id in usados:
+                    nos[osm_id] = (float(elem.get('lat')), float(elem.get('lon')))
+            if elem.tag in ('node', 'way', 'relation'):
+                elem.clear()
+    return vias, nos
+
+def _vias_pbf(arquivo):
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError("Ler arquivos .pbf requer o pacote osmium (pip install osmium)") from e
+
+    class Leitor(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.vias = []
+            self.nos = {}
+
+        def way(self, w):
+            tags = {t.k: t.v for t in w.tags}
+            if tags.get('highway') not in TIPOS_VIA:
+                return
+            refs = []
+            for n in w.nodes:
+                if n.location.valid():
+                    self.nos[n.ref] = (n.location.lat, n.location.lon)
+                    refs.append(n.ref)
+            self.vias.append((refs, _sentido(tags)))
+
+    leitor = Leitor()
+    leitor.apply_file(arquivo, locations=True)
+    return leitor.vias, leitor.nos
+
+def construir_grafo(arquivo_osm, pasta):
+    """Converte um extrato do OSM no grafo CSR salvo em pasta; retorna (nós, arestas)"""
+    vias, nos = _vias_pbf(arquivo_osm) if arquivo_osm.endswith('.pbf') else _vias_xml(arquivo_osm)
+
+    indice = {}
+    origem, destino = [], []
+    for refs, sentido in vias:
+        refs = [r for r in refs if r in nos]
+        for a, b in zip(refs, refs[1:]):
+            ia = indice.setdefault(a, len(indice))
+            ib = indice.setdefault(b, len(indice))
+            if sentido >= 0:
+                origem.append(ia)
+                destino.append(ib)
+            if sentido <= 0:
+                origem.append(ib)
+                destino.append(ia)
+
+    coordenadas = np.empty((len(indice), 2), dtype=np.float64)
+    for osm_id, i in indice.items():
+        coordenadas[i] = nos[osm_id]
+    origem = np.asarray(origem, dtype=np.int64)
+    destino = np.asarray(destino, dtype=np.int32)
+    pesos = _haversine(coordenadas[origem, 0], coordenadas[origem, 1],
+                       coordenadas[destino, 0], coordenadas[destino, 1]).astype(np.float32)
+
+    # Um trecho em duas vias (vias sobrepostas) vira uma aresta só, com o menor peso: o csr_matrix
+    # do scipy somaria as duplicadas. Nós repetidos em sequência não geram laço.
+    n = len(indice)
+    par = origem * n + destino
+    ordem = np.argsort(par, kind='stable')
+    pares, inicio = np.unique(par[ordem], return_index=True)
+    pesos = np.minimum.reduceat(pesos[ordem], inicio) if len(pares) else pesos
+    origem, destino = pares // n, (pares % n).astype(np.int32)
+    laco = origem == destino
+    origem, destino, pesos = origem[~laco], destino[~laco], pesos[~laco]
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origem, minlength=n), out=indptr[1:])
+
+    os.makedirs(pasta, exist_ok=True)
+    # Distâncias calculadas com o grafo anterior (ver distancias.arquivo_cache_distancia)
+    from .distancias import DISTANCE_CACHE_DB
+    for arquivo in glob.glob(os.path.join(pasta, DISTANCE_CACHE_DB + "*")):
+        os.remove(arquivo)
+    for nome, array in zip(ARQUIVOS, (indptr, destino, pesos, coordenadas)):
+        np.save(os.path.join(pasta, f"{nome}.npy"), array)
+    return n, len(destino)
+
+class GrafoViario:
+    """Grafo viário em CSR carregado com mmap; distâncias em km"""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        arrays = {nome: np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode='r') for nome in ARQUIVOS}
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.pesos = arrays['pesos']
+        self.coordenadas = arrays['coordenadas']
+        self._arvore = None
+        self._matriz = None
+        self._dijkstra = self._dijkstra_scipy if dijkstra is not None else self._dijkstra_heapq
+
+    def __len__(self):
+        return len(self.coordenadas)
+
+    def no_mais_proximo(self, coords):
+        """Índices dos nós mais próximos de cada (lat, lon) e a distância até eles em km"""
+        c = np.asarray(coords, dtype=float).reshape(-1, 2)
+        try:
+            from scipy.spatial import cKDTree
+            if self._arvore is None:
+                self._arvore = cKDTree(self._xyz(self.coordenadas))
+            _, nos = self._arvore.query(self._xyz(c))
+        except ImportError:
+            nos = np.array([int(np.argmin(_haversine(lat, lon, self.coordenadas[:, 0], self.coordenadas[:, 1])))
+                            for lat, lon in c], dtype=np.int64)
+        nos = np.asarray(nos, dtype=np.int64)
+        return nos, _haversine(c[:, 0], c[:, 1], self.coordenadas[nos, 0], self.coordenadas[nos, 1])
+
+    @staticmethod
+    def _xyz(c):
+        lat = np.radians(c[:, 0])
+        lon = np.radians(c[:, 1])
+        return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+    def _dijkstra_scipy(self, origem, destinos, limite):
+        if self._matriz is None:
+            n = len(self)
+            self._matriz = csr_matrix((self.pesos, self.indices, self.indptr), shape=(n, n))
+        return dijkstra(self._matriz, directed=True, indices=int(origem), limit=limite)[destinos]
+
+    def _dijkstra_heapq(self, origem, destinos, limite):
+        faltando = set(int(d) for d in destinos)
+        distancia = {int(origem): 0.0}
+        resolvidos = {}
+        fila = [(0.0, int(origem))]
+        while fila and faltando:
+            d, u = heapq.heappop(fila)
+            if u in resolvidos:
+                continue
+            if d > limite:
+                break
+            resolvidos[u] = d
+            faltando.discard(u)
+            for k in range(self.indptr[u], self.indptr[u + 1]):
+                v = int(self.indices[k])
+                nd = d + float(self.pesos[k])
+                if nd < distancia.get(v, np.inf):
+                    distancia[v] = nd
+                    heapq.heappush(fila, (nd, v))
+        return np.array([resolvidos.get(int(d), np.inf) for d in destinos])
+
+    def tabela(self, coords_origem, coords_destino):
+        """Matriz origem x destino em km, no mesmo formato de consultar_tabela_osrm (None sem rota)"""
+        nos_origem, encaixe_origem = self.no_mais_proximo(coords_origem)
+        nos_destino, encaixe_destino = self.no_mais_proximo(coords_destino)
+
+        destino = np.asarray(coords_destino, dtype=float).reshape(-1, 2)
+        por_no = {}
+        resultado = []
+        for (lat, lon), no, encaixe in zip(np.asarray(coords_origem, dtype=float).reshape(-1, 2),
+                                           nos_origem, encaixe_origem):
+            if no not in por_no:
+                limite = float(np.max(_haversine(lat, lon, destino[:, 0], destino[:, 1])))
+                por_no[no] = self._dijkstra(no, nos_destino, limite * FATOR_LIMITE_BUSCA + FOLGA_LIMITE_BUSCA_KM)
+            linha = por_no[no] + encaixe + encaixe_destino
+            resultado.append([float(d) if np.isfinite(d) else None for d in linha])
+        return resultado
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python -m planejador.grafo_viario EXTRATO.osm[.pbf|.bz2] PASTA_DO_GRAFO")
+        sys.exit(2)
+    n_nos, n_arestas = construir_grafo(sys.argv[1], sys.argv[2])
+    print(f"Grafo salvo em {sys.argv[2]}: {n_nos} nós, {n_arestas} arestas")
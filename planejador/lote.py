@@ -0,0 +1,282 @@
+"""Planejamento de várias rotas (veículos ou cidades) em uma única execução.
+
+As paradas são geocodificadas uma única vez, com o mesmo cache de geocodificação;
+como em planejar_rota, linhas com o mesmo endereço (chave_endereco) no mesmo grupo
+viram uma parada só, com os nomes juntos. Cada grupo tem sua matriz calculada
+sobre o mesmo cache de distâncias. Cada rota é otimizada em um processo separado:
+enquanto um grupo é otimizado, a matriz do próximo já está sendo consultada.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from colorama import Fore, Style
+
+from .distancias import calcular_matriz_distancias, grafo_candidatos, matriz_haversine
+from .geocodificacao import CacheGeocodificacao, geocodificar_lote, geocodificar_ponto_partida
+from .metricas import Execucao
+from .normalizacao import indexar_enderecos, nomes_por_endereco
+from .otimizador import METODO_OTIMIZACAO, ROTA_FECHADA, TEMPO_OTIMIZACAO, custo_rota, resolver
+from .planejamento import (PONTO_PARTIDA, ErroPlanejamento, abrir_diario, imprimir_etapas, imprimir_metricas_http,
+                           resumo_caches, revalidar_caches)
+from .planilha import ARQUIVO_EXCEL, COLUNA_ENDERECOS, COLUNA_NOMES, ler_planilha_grupos, marcar_enderecos_erro_excel
+from .relatorio import PASTA_ROTAS, caminho_pdf, gerar_pdf, titulo_rota
+from .util import logger, print_colorido
+
+PARTICOES = ('varredura', 'kmeans')
+
+def _coordenadas_planas(coords_partida, coordenadas):
+    """Projeta (lat, lon) em um plano local centrado no ponto de partida (em graus de latitude)"""
+    pts = np.asarray(coordenadas, dtype=float).reshape(-1, 2)
+    lat0, lon0 = coords_partida
+    return np.column_stack([pts[:, 0] - lat0, (pts[:, 1] - lon0) * np.cos(np.radians(lat0))])
+
+def _tamanhos_equilibrados(n, n_veiculos, capacidade=None):
+    if n_veiculos < 1:
+        raise ValueError("O número de veículos deve ser pelo menos 1")
+    if capacidade is not None and n > n_veiculos * capacidade:
+        raise ValueError(f"{n} paradas não cabem em {n_veiculos} veículos com capacidade {capacidade}")
+    base, resto = divmod(n, n_veiculos)
+    return [base + (1 if i < resto else 0) for i in range(n_veiculos)]
+
+def particionar_varredura(coords_partida, coordenadas, n_veiculos, capacidade=None):
+    """Divide as paradas em setores angulares em torno do ponto de partida (sweep).
+
+    O corte começa no maior intervalo angular sem paradas, e os setores têm tamanhos
+    equilibrados (nunca acima da capacidade). Retorna listas de índices de coordenadas.
+    """
+    n = len(coordenadas)
+    if n == 0:
+        return []
+    plano = _coordenadas_planas(coords_partida, coordenadas)
+    angulos = np.arctan2(plano[:, 0], plano[:, 1])
+    ordem = np.argsort(angulos, kind='stable')
+    if n > 1:
+        ordenados = angulos[ordem]
+        intervalos = np.diff(np.append(ordenados, ordenados[0] + 2 * np.pi))
+        ordem = np.roll(ordem, -((int(np.argmax(intervalos)) + 1) % n))
+    grupos, inicio = [], 0
+    for tamanho in _tamanhos_equilibrados(n, n_veiculos, capacidade):
+        if tamanho:
+            grupos.append(ordem[inicio:inicio + tamanho].tolist())
+        inicio += tamanho
+    return grupos
+
+def particionar_kmeans(coords_partida, coordenadas, n_veiculos, capacidade=None, max_iteracoes=50, semente=0):
+    """Agrupa as paradas com k-means (Lloyd) respeitando a capacidade de cada veículo.
+
+    A atribuição com capacidade é gulosa: os pares (parada, centro) são percorridos
+    do mais próximo para o mais distante e cada parada vai para o primeiro centro
+    que ainda tem vaga. Retorna listas de índices de coordenadas.
+    """
+    n = len(coordenadas)
+    if n == 0:
+        return []
+    _tamanhos_equilibrados(n, n_veiculos, capacidade)
+    k = min(n_veiculos, n)
+    vagas = capacidade if capacidade is not None else n
+    plano = _coordenadas_planas(coords_partida, coordenadas)
+
+    # Inicialização k-means++ determinística
+    rng = np.random.default_rng(semente)
+    centros = [plano[rng.integers(n)]]
+    for _ in range(1, k):
+        d2 = np.min(((plano[:, None, :] - np.array(centros)[None, :, :]) ** 2).sum(axis=2), axis=1)
+        centros.append(plano[rng.choice(n, p=d2 / d2.sum())] if d2.sum() > 0 else plano[rng.integers(n)])
+    centros = np.array(centros)
+
+    rotulos = np.full(n, -1)
+    for _ in range(max_iteracoes):
+        d2 = ((plano[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2)
+        novos = np.full(n, -1)
+        ocupacao = np.zeros(k, dtype=int)
+        for idx in np.argsort(d2, axis=None, kind='stable'):
+            ponto, centro = divmod(int(idx), k)
+            if novos[ponto] < 0 and ocupacao[centro] < vagas:
+                novos[ponto] = centro
+                ocupacao[centro] += 1
+        if np.array_equal(novos, rotulos):
+            break
+        rotulos = novos
+        for c in range(k):
+            if ocupacao[c]:
+                centros[c] = plano[rotulos == c].mean(axis=0)
+    return [np.flatnonzero(rotulos == c).tolist() for c in range(k) if np.any(rotulos == c)]
+
+def particionar_por_coluna(grupos):
+    """Agrupa os índices pelo valor da coluna de agrupamento, na ordem de primeira aparição"""
+    indices = {}
+    for i, grupo in enumerate(grupos):
+        indices.setdefault(grupo, []).append(i)
+    return indices
+
+def planejar_lote(cidade, arquivo_excel=ARQUIVO_EXCEL, ponto_partida=PONTO_PARTIDA, pasta_saida=PASTA_ROTAS,
+                  nome_coluna_enderecos=COLUNA_ENDERECOS, nome_coluna_nomes=COLUNA_NOMES,
+                  nome_coluna_grupo=None, n_veiculos=None, capacidade=None, particao='varredura',
+                  workers_geocodificacao=6, workers_otimizacao=None, k_vizinhos=None, simetrica=False,
+                  metodo=METODO_OTIMIZACAO, tempo_otimizacao=TEMPO_OTIMIZACAO, rota_fechada=ROTA_FECHADA,
+                  retomar=False, perfil=None, etapas_perfil=None):
+    """Gera um PDF por rota e retorna a lista de caminhos.
+
+    As paradas são agrupadas pela coluna nome_coluna_grupo (ex.: cidade ou veículo já
+    definido na planilha) ou, se ela não for informada, divididas entre n_veiculos
+    pela partição escolhida ('varredura' ou 'kmeans'), com no máximo capacidade
+    paradas por veículo. O relatório da execução (ver planejamento.planejar_rota)
+    é gravado na pasta dos PDFs, assim como o diário das geocodificações e dos blocos
+    da matriz usado por retomar.
+    """
+    parametros = {k: v for k, v in locals().items() if k not in ('perfil', 'etapas_perfil', 'retomar')}
+    diario = abrir_diario(caminho_pdf(titulo_rota(f"{cidade} - Lote"), pasta_saida), parametros, retomar)
+    with diario, Execucao(dict(parametros, retomar=retomar), perfil=perfil, etapas_perfil=etapas_perfil) as execucao:
+        return _planejar_lote(execucao, **parametros)
+
+def _planejar_lote(execucao, cidade, arquivo_excel, ponto_partida, pasta_saida, nome_coluna_enderecos,
+                   nome_coluna_nomes, nome_coluna_grupo, n_veiculos, capacidade, particao,
+                   workers_geocodificacao, workers_otimizacao, k_vizinhos, simetrica, metodo,
+                   tempo_otimizacao, rota_fechada):
+    if nome_coluna_grupo is None and not n_veiculos:
+        raise ErroPlanejamento("Informe a coluna de agrupamento ou o número de veículos.")
+    if particao not in PARTICOES:
+        raise ErroPlanejamento(f"Partição desconhecida: {particao} (use {', '.join(PARTICOES)})")
+
+    print_colorido("\n🚀 Iniciando processamento em lote...", Fore.GREEN, Style.BRIGHT)
+    if not os.path.exists(arquivo_excel):
+        raise ErroPlanejamento(f"O arquivo {arquivo_excel} não foi encontrado.")
+
+    # LER PLANILHA
+    print_colorido("\n📊 Lendo planilha...", Fore.CYAN)
+    try:
+        with execucao.etapa('planilha'):
+            linhas, enderecos, nomes, grupos_planilha = ler_planilha_grupos(
+                arquivo_excel, nome_coluna_enderecos, nome_coluna_nomes, nome_coluna_grupo)
+    except Exception as e:
+        raise ErroPlanejamento(f"Erro ao ler planilha: {str(e)}") from e
+    print_colorido(f"✅ Total de endereços encontrados: {len(enderecos)}", Fore.GREEN)
+    if not enderecos:
+        raise ErroPlanejamento("Nenhum endereço encontrado na planilha.")
+
+    # GEOCODIFICAÇÃO (uma vez para todas as rotas)
+    print_colorido(f"\n📍 Processando ponto de partida: {ponto_partida}", Fore.CYAN)
+    cache_geo = CacheGeocodificacao()
+    try:
+        with execucao.etapa('geocodificacao'):
+            coords_partida = geocodificar_ponto_partida(ponto_partida, cache_geo)
+    except ValueError as e:
+        raise ErroPlanejamento(str(e)) from e
+
+    # Endereços repetidos (mesma chave normalizada) são geocodificados uma vez e, dentro de
+    # cada grupo, viram uma única parada com os nomes de todas as linhas
+    unicos, indice = indexar_enderecos(enderecos)
+    if len(unicos) < len(enderecos):
+        execucao.contar('enderecos_repetidos', len(enderecos) - len(unicos))
+        print_colorido(f"🔗 {len(enderecos) - len(unicos)} endereços repetidos agrupados: {len(unicos)} pontos",
+                       Fore.GREEN)
+
+    print_colorido("\n🔄 Geocodificando endereços...", Fore.CYAN)
+    with execucao.etapa('geocodificacao'):
+        resultados = geocodificar_lote([enderecos[i] for i in unicos], cache_geo, max_workers=workers_geocodificacao,
+                                       progresso=logger.isEnabledFor(logging.INFO))
+    coords_linha = [resultados[u][1] for u in indice]
+    com_erro = [i for i, coords in enumerate(coords_linha) if not coords]
+    enderecos_com_erro = [(linhas[i], enderecos[i]) for i in com_erro]
+    if enderecos_com_erro:
+        marcar_enderecos_erro_excel(arquivo_excel, nome_coluna_enderecos, enderecos_com_erro)
+
+    # Paradas: posições das linhas com o mesmo endereço (e o mesmo grupo da planilha)
+    posicoes_parada = {}
+    for i, coords in enumerate(coords_linha):
+        if coords:
+            grupo = grupos_planilha[i] if nome_coluna_grupo is not None else None
+            posicoes_parada.setdefault((grupo, indice[i]), []).append(i)
+    paradas = list(posicoes_parada.values())
+    if not paradas:
+        raise ErroPlanejamento("Nenhum endereço foi geocodificado com sucesso além do ponto de partida.")
+    coordenadas_parada = [coords_linha[p[0]] for p in paradas]
+    nomes_parada = [nomes_por_endereco([enderecos[i] for i in p], [nomes[i] for i in p], [enderecos[p[0]]])[0]
+                    for p in paradas]
+    geocodificados = len(enderecos) - len(com_erro)
+    execucao.contar('enderecos', len(enderecos))
+    execucao.contar('geocodificados', geocodificados)
+    execucao.contar('enderecos_com_erro', len(com_erro))
+    print_colorido(f"\n✅ Total de endereços geocodificados com sucesso: {geocodificados}", Fore.GREEN)
+    print_colorido(f"⚠️ Total de endereços com erro: {len(enderecos_com_erro)}", Fore.YELLOW)
+
+    # AGRUPAMENTO (sobre as paradas)
+    if nome_coluna_grupo is not None:
+        por_grupo = particionar_por_coluna([grupos_planilha[p[0]] for p in paradas])
+        rotas = [(str(g) or "Sem grupo", idx) for g, idx in por_grupo.items()]
+        erros_por_grupo = {}
+        for i in com_erro:
+            erros_por_grupo.setdefault(grupos_planilha[i] or "Sem grupo", []).append((linhas[i], enderecos[i]))
+    else:
+        particionar = particionar_varredura if particao == 'varredura' else particionar_kmeans
+        try:
+            indices = particionar(coords_partida, coordenadas_parada, n_veiculos, capacidade)
+        except ValueError as e:
+            raise ErroPlanejamento(str(e)) from e
+        rotas = [(f"Veículo {v}", idx) for v, idx in enumerate(indices, 1)]
+        # Sem grupo na planilha, os endereços com erro vão para o PDF do primeiro veículo
+        erros_por_grupo = {rotas[0][0]: enderecos_com_erro}
+    print_colorido(f"\n🚚 {len(rotas)} rotas: " + ", ".join(f"{nome} ({len(idx)})" for nome, idx in rotas), Fore.CYAN)
+
+    # MATRIZES E OTIMIZAÇÃO: a matriz do próximo grupo é consultada enquanto o anterior é otimizado
+    nomes_por_linha = [""] * max(linhas)
+    for linha, nome in zip(linhas, nomes):
+        nomes_por_linha[linha - 1] = nome
+    max_workers = min(len(rotas), workers_otimizacao or os.cpu_count() or 1)
+    pdfs = []
+    rotas_relatorio = []
+    renderizacoes = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        tarefas = []
+        for nome_grupo, indices in rotas:
+            print_colorido(f"\n📏 Calculando matriz de distância: {nome_grupo}", Fore.CYAN)
+            coordenadas = [coords_partida] + [coordenadas_parada[i] for i in indices]
+            vizinhos = grafo_candidatos(coordenadas, k_vizinhos) if k_vizinhos else None
+            with execucao.etapa('matriz'):
+                dist_matrix = calcular_matriz_distancias(coordenadas, vizinhos=vizinhos, simetrica=simetrica)
+            tarefas.append((nome_grupo, indices, dist_matrix, executor.submit(
+                resolver, dist_matrix, metodo=metodo, tempo_limite=tempo_otimizacao, fechada=rota_fechada,
+                vizinhos=vizinhos, estimativa=matriz_haversine(coordenadas))))
+
+        print_colorido("\n🗺️ Calculando melhores rotas...", Fore.CYAN)
+        for nome_grupo, indices, dist_matrix, tarefa in tarefas:
+            # Só a espera pelo processo conta: a otimização corre em paralelo com as matrizes
+            with execucao.etapa('otimizacao'):
+                resultado = tarefa.result()
+            ordem_rota = resultado['rota']
+            if len(ordem_rota) != len(indices) + 1:
+                raise ErroPlanejamento(f"A rota {nome_grupo} não inclui todos os pontos!")
+            distancias_parciais = [dist_matrix[a][b] for a, b in zip(ordem_rota, ordem_rota[1:])]
+            distancia_total = custo_rota(dist_matrix, ordem_rota, rota_fechada)
+            print_colorido(f"   {nome_grupo}: {len(indices)} entregas, {distancia_total:.2f} km "
+                           f"(economia de {resultado['melhoria_km']:.2f} km sobre a rota gulosa)", Fore.GREEN)
+
+            # Os PDFs são renderizados nos mesmos processos, enquanto as outras rotas terminam
+            ordem = [indices[p - 1] for p in ordem_rota[1:]]
+            titulo = titulo_rota(f"{cidade} - {nome_grupo}")
+            renderizacoes.append(executor.submit(
+                gerar_pdf, caminho_pdf(titulo, pasta_saida), titulo, ponto_partida, distancia_total,
+                [""] + [nomes_parada[i] for i in ordem], [ponto_partida] + [enderecos[paradas[i][0]] for i in ordem],
+                distancias_parciais, erros_por_grupo.get(nome_grupo, []), nomes_por_linha))
+            rotas_relatorio.append({'rota': nome_grupo, 'paradas': len(indices),
+                                    'distancia_km': round(float(distancia_total), 1)})
+
+        with execucao.etapa('pdf'):
+            for rota, renderizacao in zip(rotas_relatorio, renderizacoes):
+                rota['pdf'] = renderizacao.result()
+                pdfs.append(rota['pdf'])
+
+    print_colorido(f"\n✅ {len(pdfs)} PDFs gerados em {pasta_saida}", Fore.GREEN)
+    revalidar_caches(execucao, cache_geo)
+    print_colorido("\n🌐 Requisições externas:", Fore.CYAN)
+    imprimir_metricas_http()
+    print_colorido("\n⏱️ Tempo por etapa:", Fore.CYAN)
+    imprimir_etapas(execucao)
+
+    execucao.registrar('caches', resumo_caches(cache_geo))
+    execucao.registrar('resultado', rotas_relatorio)
+    relatorio = execucao.salvar(os.path.splitext(caminho_pdf(titulo_rota(f"{cidade} - Lote"), pasta_saida))[0] + ".json")
+    print_colorido(f"📝 Relatório da execução: {relatorio}", Fore.CYAN)
+    return pdfs
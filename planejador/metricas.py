@@ -0,0 +1,154 @@
+"""Tempo por etapa, contadores e relatório JSON de cada execução.
+
+Uma Execucao ativa (usada com "with") recebe os contadores registrados com
+contar() em qualquer módulo; sem execução ativa, contar() não faz nada. Cada
+etapa pode ser perfilada com o cProfile ou, se instalado, com o pyinstrument.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+PERFIS = ('cprofile', 'pyinstrument')
+
+logger = logging.getLogger(__name__)
+
+_atual = None
+
+def contar(nome, n=1):
+    """Soma n ao contador nome da execução ativa"""
+    execucao = _atual
+    if execucao is not None:
+        execucao.contar(nome, n)
+
+def execucao_atual():
+    return _atual
+
+class Execucao:
+    """Coleta o tempo de cada etapa, contadores e dados para o relatório da execução.
+
+    perfil ('cprofile' ou 'pyinstrument') perfila as etapas em etapas_perfil (todas
+    se None); os perfis de cada vez que a etapa roda são guardados juntos e gravados
+    por salvar(), ao lado do relatório.
+    """
+
+    def __init__(self, parametros=None, perfil=None, etapas_perfil=None):
+        if perfil is not None and perfil not in PERFIS:
+            raise ValueError(f"Perfil desconhecido: {perfil} (use {', '.join(PERFIS)})")
+        self.parametros = dict(parametros or {})
+        self.perfil = perfil
+        self.etapas_perfil = set(etapas_perfil) if etapas_perfil else None
+        self.inicio = datetime.now()
+        self._inicio = time.perf_counter()
+        self.etapas = {}
+        self.contadores = {}
+        self.dados = {}
+        self._perfis = {}  # etapa -> perfis de cada vez que ela rodou
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        global _atual
+        self._anterior, _atual = _atual, self
+        return self
+
+    def __exit__(self, *exc):
+        global _atual
+        _atual = self._anterior
+
+    def contar(self, nome, n=1):
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + n
+
+    def registrar(self, chave, valor):
+        """Guarda um valor qualquer (serializável em JSON) no relatório"""
+        with self._lock:
+            self.dados[chave] = valor
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o tempo da etapa (somado se ela se repetir) e a perfila se pedido"""
+        perfilador = self._iniciar_perfil(nome)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            self._parar_perfil(nome, perfilador)
+            with self._lock:
+                self.etapas[nome] = self.etapas.get(nome, 0.0) + duracao
+
+    def _iniciar_perfil(self, nome):
+        if self.perfil is None or (self.etapas_perfil is not None and nome not in self.etapas_perfil):
+            return None
+        if self.perfil == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument não está instalado; usando cProfile")
+                self.perfil = 'cprofile'
+            else:
+                perfilador = Profiler()
+                perfilador.start()
+                return perfilador
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+        return perfilador
+
+    def _parar_perfil(self, nome, perfilador):
+        if perfilador is None:
+            return
+        if isinstance(perfilador, cProfile.Profile):
+            perfilador.disable()
+        else:
+            perfilador.stop()
+        with self._lock:
+            self._perfis.setdefault(nome, []).append(perfilador)
+
+    def _perfis_cprofile(self, nome):
+        return [p for p in self._perfis.get(nome, ()) if isinstance(p, cProfile.Profile)]
+
+    def resumo_perfil(self, nome, linhas=15):
+        """Texto com as funções de maior tempo acumulado da etapa, somando todas as vezes (só cProfile)"""
+        perfis = self._perfis_cprofile(nome)
+        if not perfis:
+            return ""
+        saida = io.StringIO()
+        pstats.Stats(*perfis, stream=saida).sort_stats('cumulative').print_stats(linhas)
+        return saida.getvalue()
+
+    def relatorio(self):
+        from .cliente_http import obter_cliente
+
+        with self._lock:
+            return {
+                'inicio': self.inicio.isoformat(timespec='seconds'),
+                'duracao_total': time.perf_counter() - self._inicio,
+                'parametros': self.parametros,
+                'etapas': dict(self.etapas),
+                'contadores': dict(self.contadores),
+                **self.dados,
+                'http': obter_cliente().resumo(),
+            }
+
+    def salvar(self, arquivo_json):
+        """Grava o relatório (e os perfis, com o mesmo nome base) e retorna o caminho"""
+        base = os.path.splitext(arquivo_json)[0]
+        for nome, perfis in self._perfis.items():
+            cprofile = self._perfis_cprofile(nome)
+            if cprofile:
+                pstats.Stats(*cprofile).dump_stats(f"{base}.{nome}.prof")
+            # O pyinstrument não soma perfis: um HTML por vez que a etapa rodou
+            html = [p for p in perfis if not isinstance(p, cProfile.Profile)]
+            for i, perfilador in enumerate(html, 1):
+                sufixo = f".{i}" if len(html) > 1 else ""
+                with open(f"{base}.{nome}{sufixo}.html", 'w', encoding='utf-8') as f:
+                    f.write(perfilador.output_html())
+        with open(arquivo_json, 'w', encoding='utf-8') as f:
+            json.dump(self.relatorio(), f, ensure_ascii=False, indent=2, default=str)
+        return arquivo_json
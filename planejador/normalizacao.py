@@ -0,0 +1,190 @@
+"""Normalização de endereços: chave canônica para o cache e índice de duplicados.
+
+"Rua Rafael Regina, 59, Bariri, SP" e "R. Rafael Regina 59 Bariri" viram a mesma chave
+("rua rafael regina 59 bariri"): sem acentos, em minúsculas, sem pontuação, com as
+abreviações expandidas e sem a UF no fim e "Brasil". O tipo de logradouro fica na
+chave: "Rua Brasil, 10" e "Avenida Brasil, 10" são lugares diferentes.
+Endereços com a mesma chave são geocodificados uma vez e viram um único ponto da rota.
+"""
+import re
+from functools import lru_cache
+
+from .util import extrair_coordenada, id_local, is_coordenada, remover_acentos
+
+# Abreviações comuns nas planilhas, por token já sem acento e em minúsculas
+ABREVIACOES = {
+    'r': 'rua',
+    'av': 'avenida',
+    'avd': 'avenida',
+    'al': 'alameda',
+    'tv': 'travessa',
+    'trav': 'travessa',
+    'est': 'estrada',
+    'rod': 'rodovia',
+    'pc': 'praca',
+    'pca': 'praca',
+    'lgo': 'largo',
+    'jd': 'jardim',
+    'jdm': 'jardim',
+    'vl': 'vila',
+    'pq': 'parque',
+    'res': 'residencial',
+    'dr': 'doutor',
+    'prof': 'professor',
+    'cel': 'coronel',
+    'sto': 'santo',
+    'sta': 'santa',
+}
+
+LOGRADOUROS = {'rua', 'avenida', 'alameda', 'travessa', 'estrada', 'rodovia', 'praca', 'largo'}
+
+# "nº 59", "n. 59", "num 59": o marcador sai da chave, o número fica
+MARCADORES_NUMERO = {'n', 'no', 'nº', 'num', 'numero', 'nro'}
+
+PAISES = {'brasil', 'brazil'}
+
+ESTADOS = {
+    'acre': 'ac', 'alagoas': 'al', 'amapa': 'ap', 'amazonas': 'am', 'bahia': 'ba', 'ceara': 'ce',
+    'distrito federal': 'df', 'espirito santo': 'es', 'goias': 'go', 'maranhao': 'ma', 'mato grosso': 'mt',
+    'mato grosso do sul': 'ms', 'minas gerais': 'mg', 'para': 'pa', 'paraiba': 'pb', 'parana': 'pr',
+    'pernambuco': 'pe', 'piaui': 'pi', 'rio de janeiro': 'rj', 'rio grande do norte': 'rn',
+    'rio grande do sul': 'rs', 'rondonia': 'ro', 'roraima': 'rr', 'santa catarina': 'sc', 'sao paulo': 'sp',
+    'sergipe': 'se', 'tocantins': 'to',
+}
+UFS = set(ESTADOS.values())
+
+# Antes destas palavras a UF ou o estado faz parte do nome ("Praça da Sé", "Rua Rio de Janeiro")
+_ANTES_DE_NOME = {'da', 'de', 'do', 'das', 'dos', 'e'} | set(ABREVIACOES) | set(ABREVIACOES.values())
+
+_TOKEN = re.compile(r"\w+")
+_CEP = re.compile(r"\b(\d{5})-?(\d{3})\b")
+_SEPARADOR = re.compile(r"[,;/]|\s-\s")
+# Abreviação no início do endereço (posição do tipo de logradouro), seguida de ponto ou espaço:
+# "R. X", "Av X"; no resto do texto "AL" é Alagoas e "R." é a inicial de um nome
+_ABREVIACAO = re.compile(r"^(\s*)(" + "|".join(sorted(ABREVIACOES, key=len, reverse=True)) + r")\b\.?(?=\s|$)",
+                         re.IGNORECASE)
+
+def expandir_abreviacoes(endereco):
+    """Expande a abreviação do tipo de logradouro, só no primeiro token ("R. Rafael" -> "Rua Rafael").
+
+    >>> expandir_abreviacoes("Av. José R. Silva, 10, Maceió, AL")
+    'Avenida José R. Silva, 10, Maceió, AL'
+    """
+    def expandir(m):
+        completo = ABREVIACOES[m.group(2).lower()]
+        return m.group(1) + (completo.capitalize() if m.group(2)[0].isupper() else completo)
+    return _ABREVIACAO.sub(expandir, endereco, count=1)
+
+def _tokens(endereco):
+    return _TOKEN.findall(remover_acentos(str(endereco)).lower().replace('_', ' '))
+
+def _expandir_tokens(tokens):
+    resultado = []
+    for i, token in enumerate(tokens):
+        if token in MARCADORES_NUMERO and i + 1 < len(tokens) and tokens[i + 1].isdigit():
+            continue
+        resultado.append(ABREVIACOES.get(token, token))
+    return resultado
+
+def tokens_endereco(endereco):
+    """Tokens do endereço sem acentos, em minúsculas e com as abreviações expandidas"""
+    return _expandir_tokens(_tokens(endereco))
+
+# A mesma linha passa por chave_endereco várias vezes (duplicados, cache, diário, nomes)
+@lru_cache(maxsize=65536)
+def chave_endereco(endereco):
+    """Chave canônica do endereço; coordenadas "lat, lon" viram o id_local do ponto.
+
+    >>> chave_endereco("R. Brasil, 10, Jaú - SP") == chave_endereco("Rua Brasil 10 Jau")
+    True
+    >>> chave_endereco("Rua Brasil, 10, Jaú") == chave_endereco("Av. Brasil, 10, Jaú")
+    False
+    >>> chave_endereco("Rua 10, 25, Bariri") == chave_endereco("Avenida 10, 25, Bariri")
+    False
+    """
+    texto = str(endereco).strip()
+    if is_coordenada(texto):
+        return id_local(extrair_coordenada(texto))
+    # País e UF (ou nome do estado) saem antes de expandir as abreviações: "AL" no fim é Alagoas
+    tokens = _tokens(texto)
+    while tokens and tokens[-1] in PAISES:
+        tokens.pop()
+    for tamanho in (4, 3, 2, 1):
+        final = " ".join(tokens[-tamanho:])
+        if (len(tokens) > tamanho and (final in ESTADOS or (tamanho == 1 and final in UFS))
+                and tokens[-tamanho - 1] not in _ANTES_DE_NOME):
+            del tokens[-tamanho:]
+            break
+    return " ".join(_expandir_tokens(tokens))
+
+def extrair_cep(endereco):
+    """Retorna (cep como int ou None, texto sem o CEP)"""
+    texto = str(endereco)
+    m = _CEP.search(texto)
+    if m is None:
+        return None, texto
+    return int(m.group(1) + m.group(2)), texto[:m.start()] + texto[m.end():]
+
+def separar_endereco(endereco):
+    """Separa (rua, numero, cidade) de um endereço em texto livre; rua e cidade normalizadas, numero int ou None.
+
+    Com separadores (vírgula, ";", "/" ou " - "), a rua é a primeira parte e a cidade a
+    última, depois de tirar CEP, UF e país; sem eles, a rua vem antes do número e a
+    cidade depois dele ("R. Rafael Regina 59 Bariri").
+    """
+    _, texto = extrair_cep(endereco)
+    partes = []
+    for parte in _SEPARADOR.split(texto):
+        tokens = _tokens(parte)
+        final = " ".join(tokens)
+        if not tokens or final in PAISES or final in ESTADOS or (partes and final in UFS):
+            continue
+        partes.append(_expandir_tokens(tokens))
+    if not partes:
+        return "", None, ""
+    rua, resto, numero, cidade = partes[0], partes[1:], None, []
+    # "Rua 10" é nome de rua; o número vem depois dele
+    inicio = 2 if len(rua) >= 2 and rua[0] in LOGRADOUROS and rua[1].isdigit() else 1
+    posicao = next((k for k, t in enumerate(rua[inicio:], inicio) if t.isdigit()), None)
+    if posicao:
+        rua, numero, cidade = rua[:posicao], int(rua[posicao]), rua[posicao + 1:]
+    elif resto and len(resto[0]) == 1 and resto[0][0].isdigit():
+        numero, resto = int(resto[0][0]), resto[1:]
+    if resto:
+        cidade = resto[-1]
+    if len(rua) > 1 and rua[0] in LOGRADOUROS:
+        rua = rua[1:]
+    return " ".join(rua), numero, " ".join(cidade)
+
+def nome_rua(nome):
+    """Nome de rua normalizado como em separar_endereco (sem o tipo de logradouro)"""
+    tokens = tokens_endereco(nome)
+    if len(tokens) > 1 and tokens[0] in LOGRADOUROS:
+        tokens = tokens[1:]
+    return " ".join(tokens)
+
+def indexar_enderecos(enderecos):
+    """Agrupa os endereços com a mesma chave_endereco.
+
+    Retorna (unicos, indice): unicos são as posições da primeira ocorrência de cada
+    chave, na ordem da planilha, e indice[i] é a posição em unicos do endereço i.
+    """
+    posicao = {}
+    unicos, indice = [], []
+    for i, endereco in enumerate(enderecos):
+        chave = chave_endereco(endereco)
+        if chave not in posicao:
+            posicao[chave] = len(unicos)
+            unicos.append(i)
+        indice.append(posicao[chave])
+    return unicos, indice
+
+def nomes_por_endereco(enderecos, nomes, consultados):
+    """Nomes (distintos, separados por " / ") das linhas com a mesma chave de cada endereço consultado"""
+    grupos = {}
+    for endereco, nome in zip(enderecos, nomes):
+        nome = "" if nome is None or nome != nome else str(nome).strip()  # nome != nome: NaN do pandas
+        lista = grupos.setdefault(chave_endereco(endereco), [])
+        if nome and nome not in lista:
+            lista.append(nome)
+    return [" / ".join(grupos.get(chave_endereco(e), ())) for e in consultados]
@@ -0,0 +1,372 @@
+"""Otimização da ordem de visita a partir da matriz de distâncias.
+
+A rota sempre começa no índice 0 (ponto de partida). Para tratar rotas abertas e
+fechadas do mesmo jeito, o caminho interno termina em um nó "fim" virtual:
+na rota fechada ele custa a volta ao ponto de partida, na aberta custa zero.
+As matrizes do OSRM não são simétricas, então o 2-opt usa somas de prefixo
+nos dois sentidos para avaliar a inversão de um trecho em O(1).
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from colorama import Fore
+
+from .diario import diario_atual
+from .util import logger, print_colorido
+
+METODO_OTIMIZACAO = "busca_local"  # Ver RESOLVEDORES
+TEMPO_OTIMIZACAO = 10  # Tempo máximo de busca local, em segundos
+ROTA_FECHADA = False  # True para considerar a volta ao ponto de partida
+
+def custo_rota(dist_matrix, rota, fechada=False):
+    total = 0.0
+    for a, b in zip(rota, rota[1:]):
+        total += dist_matrix[a][b]
+    if fechada and len(rota) > 1:
+        total += dist_matrix[rota[-1]][rota[0]]
+    return float(total)
+
+def rota_vizinho_mais_proximo(dist_matrix):
+    """Rota gulosa: a partir do índice 0, sempre segue para o ponto mais próximo"""
+    n = len(dist_matrix)
+    rota = [0]
+    pontos_nao_visitados = set(range(1, n))
+    while pontos_nao_visitados:
+        atual = rota[-1]
+        proximo = min(pontos_nao_visitados, key=lambda x: dist_matrix[atual][x])
+        rota.append(proximo)
+        pontos_nao_visitados.remove(proximo)
+    return rota
+
+def _matriz_estendida_array(dist_matrix, fechada):
+    """Matriz (n+1)x(n+1) com o nó "fim" no índice n"""
+    d = np.asarray(dist_matrix, dtype=float)
+    n = len(d)
+    ext = np.zeros((n + 1, n + 1))
+    ext[:n, :n] = d
+    if fechada:
+        ext[:n, n] = d[:, 0]
+    # Pares sem distância conhecida continuam proibitivos, mas sem quebrar a aritmética
+    ext[~np.isfinite(ext)] = 1e9
+    return ext
+
+def _matriz_estendida(dist_matrix, fechada):
+    """Matriz estendida em listas Python, mais rápidas que o numpy para acessos escalares"""
+    return _matriz_estendida_array(dist_matrix, fechada).tolist()
+
+def _vizinhos_estendidos(vizinhos, n):
+    """Lista de candidatos com o nó "fim", que pode ser ligado a qualquer ponto"""
+    if vizinhos is None:
+        return None
+    return [list(v) + [n] for v in vizinhos] + [list(range(n))]
+
+def _prefixos(D, caminho):
+    frente = [0.0] * len(caminho)
+    tras = [0.0] * len(caminho)
+    for k in range(1, len(caminho)):
+        a, b = caminho[k - 1], caminho[k]
+        frente[k] = frente[k - 1] + D[a][b]
+        tras[k] = tras[k - 1] + D[b][a]
+    return frente, tras
+
+def _dois_opt(D, caminho, prazo, vizinhos=None):
+    """Aplica a primeira inversão de trecho que melhora o caminho; retorna True se aplicou"""
+    m = len(caminho)
+    frente, tras = _prefixos(D, caminho)
+    posicao = {no: k for k, no in enumerate(caminho)}
+    for i in range(1, m - 2):
+        if time.perf_counter() > prazo:
+            return False
+        a, ci = caminho[i - 1], caminho[i]
+        if vizinhos is not None:
+            # Só testa trechos cujo novo arco (a -> caminho[j]) liga vizinhos próximos
+            candidatos = sorted(posicao[v] for v in vizinhos[a] if v in posicao and posicao[v] > i and posicao[v] < m - 1)
+        else:
+            candidatos = range(i + 1, m - 1)
+        base_a = D[a][ci]
+        for j in candidatos:
+            cj, b = caminho[j], caminho[j + 1]
+            delta = (D[a][cj] + D[ci][b] - base_a - D[cj][b]
+                     + (tras[j] - tras[i]) - (frente[j] - frente[i]))
+            if delta < -1e-9:
+                caminho[i:j + 1] = caminho[i:j + 1][::-1]
+                return True
+    return False
+
+def _or_opt(D, caminho, prazo, tamanho_max=3, vizinhos=None):
+    """Move um trecho de 1 a tamanho_max pontos para outra posição (direto ou invertido)"""
+    m = len(caminho)
+    frente, tras = _prefixos(D, caminho)
+    posicao = {no: k for k, no in enumerate(caminho)}
+    for tamanho in range(1, tamanho_max + 1):
+        for i in range(1, m - tamanho):
+            if time.perf_counter() > prazo:
+                return False
+            j = i + tamanho - 1  # Trecho caminho[i..j]
+            if j >= m - 1:
+                break
+            p, s, e, q = caminho[i - 1], caminho[i], caminho[j], caminho[j + 1]
+            ganho_remocao = D[p][s] + D[e][q] - D[p][q]
+            if ganho_remocao <= 1e-9:
+                continue
+            inversao = (tras[j] - tras[i]) - (frente[j] - frente[i])
+            if vizinhos is not None:
+                # Insere o trecho logo antes ou logo depois de um vizinho de suas pontas
+                alvos = [posicao[v] for v in vizinhos[s] + vizinhos[e] if v in posicao]
+                posicoes = sorted({k for t in alvos for k in (t - 1, t) if 0 <= k < m - 1})
+            else:
+                posicoes = range(0, m - 1)
+            for k in posicoes:
+                if i - 1 <= k <= j:
+                    continue
+                a, b = caminho[k], caminho[k + 1]
+                custo_direto = D[a][s] + D[e][b] - D[a][b]
+                custo_invertido = D[a][e] + D[s][b] - D[a][b] + inversao
+                melhor = min(custo_direto, custo_invertido)
+                if melhor - ganho_remocao < -1e-9:
+                    trecho = caminho[i:j + 1]
+                    if custo_invertido < custo_direto:
+                        trecho = trecho[::-1]
+                    resto = caminho[:i] + caminho[j + 1:]
+                    destino = k + 1 if k < i else k + 1 - tamanho
+                    caminho[:] = resto[:destino] + trecho + resto[destino:]
+                    return True
+    return False
+
+def busca_local(dist_matrix, rota_inicial, tempo_limite=10.0, fechada=False, vizinhos=None):
+    """Melhora a rota com 2-opt e Or-opt até não haver melhoria ou o tempo acabar.
+
+    vizinhos, se informado, é uma lista com os índices candidatos de cada ponto;
+    os movimentos só criam arcos entre pontos candidatos. Com um diário ativo, a rota
+    é gravada nele periodicamente e ao final (ver diario).
+    """
+    n = len(dist_matrix)
+    diario = diario_atual()
+    D = _matriz_estendida(dist_matrix, fechada)
+    vizinhos = _vizinhos_estendidos(vizinhos, n)
+    caminho = list(rota_inicial) + [n]
+    prazo = time.perf_counter() + tempo_limite
+    iteracoes = 0
+    while time.perf_counter() < prazo:
+        if _dois_opt(D, caminho, prazo, vizinhos) or _or_opt(D, caminho, prazo, vizinhos=vizinhos):
+            iteracoes += 1
+            if diario is not None:
+                diario.registrar_rota(caminho[:-1])
+            continue
+        break
+    if diario is not None:
+        diario.registrar_rota(caminho[:-1], forcar=True)
+    return caminho[:-1], iteracoes
+
+def inserir_mais_barato(dist_matrix, rota, novos, fechada=False):
+    """Insere os pontos novos na rota, um a um, sempre no par (ponto, posição) de menor acréscimo.
+
+    rota começa no ponto de partida (índice 0); na rota aberta o ponto também pode
+    entrar depois da última parada, custando só o arco de chegada.
+    """
+    d = np.asarray(dist_matrix, dtype=float)
+    d = np.where(np.isfinite(d), d, 1e9)
+    rota = list(rota)
+    pendentes = list(novos)
+    while pendentes:
+        antes = np.asarray(rota)
+        depois = np.append(antes[1:], antes[0])
+        p = np.asarray(pendentes)
+        # custos[x, k]: inserir pendentes[x] entre rota[k] e rota[k + 1]
+        custos = d[np.ix_(antes, p)].T + d[np.ix_(p, depois)] - d[antes, depois]
+        if not fechada:
+            custos[:, -1] = d[antes[-1], p]
+        x, k = np.unravel_index(int(np.argmin(custos)), custos.shape)
+        rota.insert(int(k) + 1, pendentes.pop(int(x)))
+    return rota
+
+def reparar_rota(dist_matrix, rota, novos, tempo_limite=2.0, fechada=False):
+    """Insere os pontos novos por inserção mais barata e repara a rota com a busca local"""
+    rota = inserir_mais_barato(dist_matrix, rota, novos, fechada)
+    return busca_local(dist_matrix, rota, tempo_limite, fechada)
+
+def _resolver_guloso(dist_matrix, tempo_limite, fechada, vizinhos, estimativa=None):
+    return rota_vizinho_mais_proximo(dist_matrix), 0
+
+def _rota_inicial(dist_matrix, tempo_limite, fechada, vizinhos, estimativa=None):
+    inicial = rota_vizinho_mais_proximo(dist_matrix)
+    # Ao retomar uma execução interrompida, continua da melhor rota gravada no diário
+    diario = diario_atual()
+    gravada = diario.rota if diario is not None else None
+    if (gravada is not None and sorted(gravada) == list(range(len(dist_matrix)))
+            and custo_rota(dist_matrix, gravada, fechada) < custo_rota(dist_matrix, inicial, fechada)):
+        return gravada
+    if estimativa is not None:
+        # Otimiza primeiro na matriz em linha reta (barata) e usa o resultado
+        # como ponto de partida se ele já for melhor na matriz real
+        prevista, _ = busca_local(estimativa, rota_vizinho_mais_proximo(estimativa),
+                                  tempo_limite * 0.2, fechada, vizinhos)
+        if custo_rota(dist_matrix, prevista, fechada) < custo_rota(dist_matrix, inicial, fechada):
+            inicial = prevista
+    return inicial
+
+def _resolver_busca_local(dist_matrix, tempo_limite, fechada, vizinhos, estimativa=None):
+    inicial = _rota_inicial(dist_matrix, tempo_limite, fechada, vizinhos, estimativa)
+    return busca_local(dist_matrix, inicial, tempo_limite, fechada, vizinhos)
+
+# Busca local iterada com vários inícios: cada semente parte de uma rota gulosa
+# aleatorizada (a semente 0, da rota inicial) e alterna perturbações double-bridge
+# com a busca local até o prazo; vence a melhor rota de todas as sementes.
+PROCESSOS_MULTI_INICIO = None  # None: um processo por CPU
+CANDIDATOS_GULOSO = 3  # A rota gulosa aleatorizada sorteia entre os mais próximos
+
+def _custo_caminho(D, caminho):
+    return sum(D[a][b] for a, b in zip(caminho, caminho[1:]))
+
+def _gulosa_aleatoria(D, n, rng):
+    caminho = [0]
+    restantes = set(range(1, n))
+    while restantes:
+        linha = D[caminho[-1]]
+        proximos = sorted(restantes, key=linha.__getitem__)[:CANDIDATOS_GULOSO]
+        proximo = proximos[int(rng.integers(len(proximos)))]
+        caminho.append(proximo)
+        restantes.remove(proximo)
+    return caminho + [n]
+
+def _double_bridge(caminho, rng):
+    """Corta o caminho (sem a partida e o fim) em quatro trechos A B C D e religa como A C B D"""
+    interno = caminho[1:-1]
+    p, q, r = sorted(rng.choice(np.arange(1, len(interno)), size=3, replace=False).tolist())
+    return [caminho[0]] + interno[:p] + interno[q:r] + interno[p:q] + interno[r:] + [caminho[-1]]
+
+def _melhorar(D, caminho, prazo, vizinhos):
+    iteracoes = 0
+    while time.perf_counter() < prazo:
+        if _dois_opt(D, caminho, prazo, vizinhos) or _or_opt(D, caminho, prazo, vizinhos=vizinhos):
+            iteracoes += 1
+            continue
+        break
+    return iteracoes
+
+def _busca_iterada(D, inicial, semente, prazo, vizinhos):
+    """ILS de uma semente em D estendida (listas); retorna (rota, custo, iteracoes)"""
+    n = len(D) - 1
+    rng = np.random.default_rng(semente)
+    caminho = list(inicial) + [n] if semente == 0 else _gulosa_aleatoria(D, n, rng)
+    iteracoes = _melhorar(D, caminho, prazo, vizinhos)
+    melhor, custo_melhor = caminho, _custo_caminho(D, caminho)
+    # Com poucos pontos a busca local já esgota as vizinhanças que a perturbação alcançaria
+    while n > 8 and time.perf_counter() < prazo:
+        caminho = _double_bridge(melhor, rng)
+        iteracoes += 1 + _melhorar(D, caminho, prazo, vizinhos)
+        custo = _custo_caminho(D, caminho)
+        if custo < custo_melhor - 1e-9:
+            melhor, custo_melhor = caminho, custo
+    return melhor[:-1], custo_melhor, iteracoes
+
+def _busca_iterada_compartilhada(nome, n, inicial, semente, fim, vizinhos):
+    """Executa em um processo filho: a matriz estendida é lida do bloco de memória compartilhada"""
+    # Os processos do pool usam o resource_tracker do pai: só ele apaga o bloco (unlink)
+    memoria = shared_memory.SharedMemory(name=nome)
+    try:
+        D = np.ndarray((n + 1, n + 1), dtype=float, buffer=memoria.buf).tolist()
+    finally:
+        memoria.close()
+    # fim é um instante do relógio de parede, comum a todos os processos
+    return _busca_iterada(D, inicial, semente, time.perf_counter() + fim - time.time(), vizinhos)
+
+def _resolver_multi_inicio(dist_matrix, tempo_limite, fechada, vizinhos, estimativa=None):
+    n = len(dist_matrix)
+    inicio = time.time()
+    inicial = _rota_inicial(dist_matrix, tempo_limite, fechada, vizinhos, estimativa)
+    fim = inicio + tempo_limite
+    vizinhos = _vizinhos_estendidos(vizinhos, n)
+    processos = PROCESSOS_MULTI_INICIO or os.cpu_count() or 1
+    if processos <= 1 or multiprocessing.parent_process() is not None:
+        # Um só processo (ou já dentro de um processo do lote): uma semente com todo o prazo
+        D = _matriz_estendida(dist_matrix, fechada)
+        resultados = [_busca_iterada(D, inicial, 0, time.perf_counter() + fim - time.time(), vizinhos)]
+    else:
+        # A matriz vai uma vez para a memória compartilhada em vez de ser serializada para cada processo
+        D = _matriz_estendida_array(dist_matrix, fechada)
+        memoria = shared_memory.SharedMemory(create=True, size=D.nbytes)
+        try:
+            np.ndarray(D.shape, dtype=D.dtype, buffer=memoria.buf)[:] = D
+            with ProcessPoolExecutor(max_workers=processos) as executor:
+                tarefas = [executor.submit(_busca_iterada_compartilhada, memoria.name, n, inicial, semente, fim,
+                                           vizinhos) for semente in range(processos)]
+                resultados = [tarefa.result() for tarefa in tarefas]
+        finally:
+            memoria.close()
+            memoria.unlink()
+    rota, _, _ = min(resultados, key=lambda r: r[1])
+    diario = diario_atual()
+    if diario is not None:
+        diario.registrar_rota(rota, forcar=True)
+    return rota, sum(r[2] for r in resultados)
+
+# Métodos disponíveis; novos resolvedores recebem (dist_matrix, tempo_limite, fechada, vizinhos,
+# estimativa) e retornam (rota, iteracoes)
+RESOLVEDORES = {
+    'guloso': _resolver_guloso,
+    'busca_local': _resolver_busca_local,
+    'multi_inicio': _resolver_multi_inicio,
+}
+
+def resolver(dist_matrix, metodo='busca_local', tempo_limite=10.0, fechada=False, vizinhos=None,
+             estimativa=None):
+    """Resolve a rota e compara com a rota gulosa (vizinho mais próximo).
+
+    estimativa é uma matriz aproximada (ex.: linha reta) usada apenas para gerar
+    uma solução inicial barata.
+
+    Retorna um dicionário com a rota, a distância, a distância da rota gulosa,
+    a melhoria em km e em %, o número de movimentos aplicados e o tempo gasto.
+    """
+    n = len(dist_matrix)
+    if n <= 1:
+        return {'rota': [0] if n else [], 'distancia': 0.0, 'distancia_gulosa': 0.0,
+                'melhoria_km': 0.0, 'melhoria_percentual': 0.0, 'iteracoes': 0, 'tempo': 0.0}
+    if metodo not in RESOLVEDORES:
+        raise ValueError(f"Método de otimização desconhecido: {metodo}")
+    inicio = time.perf_counter()
+    rota, iteracoes = RESOLVEDORES[metodo](dist_matrix, tempo_limite, fechada, vizinhos, estimativa)
+    tempo = time.perf_counter() - inicio
+    distancia = custo_rota(dist_matrix, rota, fechada)
+    distancia_gulosa = custo_rota(dist_matrix, rota_vizinho_mais_proximo(dist_matrix), fechada)
+    melhoria = distancia_gulosa - distancia
+    return {
+        'rota': rota,
+        'distancia': distancia,
+        'distancia_gulosa': distancia_gulosa,
+        'melhoria_km': melhoria,
+        'melhoria_percentual': 100 * melhoria / distancia_gulosa if distancia_gulosa > 0 else 0.0,
+        'iteracoes': iteracoes,
+        'tempo': tempo,
+    }
+
+def encontrar_melhor_rota(dist_matrix, enderecos_validos, metodo=METODO_OTIMIZACAO,
+                          tempo_limite=TEMPO_OTIMIZACAO, fechada=ROTA_FECHADA, estimativa=None,
+                          vizinhos=None):
+    """Encontra a melhor rota a partir do ponto de partida (índice 0) usando o otimizador"""
+    n = len(dist_matrix)
+    if n <= 1:
+        return [0]
+
+    resultado = resolver(dist_matrix, metodo=metodo, tempo_limite=tempo_limite,
+                         fechada=fechada, estimativa=estimativa, vizinhos=vizinhos)
+    rota = resultado['rota']
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for ponto_atual, proximo_ponto in zip(rota, rota[1:]):
+            distancia = dist_matrix[ponto_atual][proximo_ponto]
+            print_colorido(f"De {enderecos_validos[ponto_atual]} para {enderecos_validos[proximo_ponto]}: {distancia:.2f} km",
+                           Fore.WHITE, nivel=logging.DEBUG)
+
+    print_colorido(f"\nRota gulosa (vizinho mais próximo): {resultado['distancia_gulosa']:.2f} km", Fore.WHITE)
+    print_colorido(f"Rota otimizada ({metodo}): {resultado['distancia']:.2f} km "
+                   f"| economia de {resultado['melhoria_km']:.2f} km ({resultado['melhoria_percentual']:.1f}%) "
+                   f"em {resultado['tempo']:.2f}s, {resultado['iteracoes']} movimentos", Fore.GREEN)
+    return rota
+
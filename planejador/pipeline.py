@@ -0,0 +1,105 @@
+"""Pipeline assíncrono que sobrepõe a geocodificação e o cálculo das distâncias.
+
+Cada endereço geocodificado é publicado em uma fila assim que fica pronto; o
+roteador junta o que já chegou em um lote e consulta as linhas e colunas novas
+da matriz enquanto o restante ainda está sendo geocodificado. As chamadas de
+rede continuam síncronas (cliente_http), executadas em threads via asyncio,
+para que o limitador de taxa e o pool de conexões sejam os mesmos do modo
+sequencial; os semáforos limitam a concorrência de cada serviço.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+async def _executar(itens, geocodificar, coords_partida, calcular_bloco,
+                    max_geocodificacao, max_roteamento, tamanho_lote):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_geocodificacao + max_roteamento)
+    loop.set_default_executor(executor)
+
+    fila = asyncio.Queue()
+    resultados = [None] * len(itens)
+    resolvidos = {0: coords_partida}
+    distancias = {(0, 0): 0.0}
+    semaforo_geo = asyncio.Semaphore(max_geocodificacao)
+    semaforo_rota = asyncio.Semaphore(max_roteamento)
+
+    async def geocodificar_item(indice, item):
+        async with semaforo_geo:
+            resultado = await loop.run_in_executor(None, geocodificar, item)
+        resultados[indice] = resultado
+        await fila.put((indice + 1, resultado[1]))
+
+    async def rotear(novos, conhecidos):
+        """Executa com uma vaga do semáforo de roteamento já adquirida"""
+        ids_todos = conhecidos + novos
+        try:
+            # Linhas novas contra todos os pontos e colunas novas contra os já conhecidos
+            linhas = await loop.run_in_executor(
+                None, calcular_bloco, [resolvidos[i] for i in novos], [resolvidos[j] for j in ids_todos])
+            colunas = None
+            if conhecidos:
+                colunas = await loop.run_in_executor(
+                    None, calcular_bloco, [resolvidos[i] for i in conhecidos], [resolvidos[j] for j in novos])
+        finally:
+            semaforo_rota.release()
+        for a, i in enumerate(novos):
+            for b, j in enumerate(ids_todos):
+                distancias[(i, j)] = float(linhas[a][b])
+        if colunas is not None:
+            for a, i in enumerate(conhecidos):
+                for b, j in enumerate(novos):
+                    distancias[(i, j)] = float(colunas[a][b])
+
+    produtores = [asyncio.create_task(geocodificar_item(i, item)) for i, item in enumerate(itens)]
+
+    async def sinalizar_fim():
+        try:
+            await asyncio.gather(*produtores)
+        finally:
+            await fila.put(None)
+
+    finalizador = asyncio.create_task(sinalizar_fim())
+    tarefas_rota = []
+    terminou = False
+    try:
+        while not terminou:
+            # Só monta o próximo lote quando há vaga para roteá-lo; enquanto isso a fila
+            # acumula os pontos geocodificados e os lotes ficam maiores
+            await semaforo_rota.acquire()
+            item = await fila.get()
+            lote = []
+            while True:
+                if item is None:
+                    terminou = True
+                    break
+                if item[1] is not None:
+                    lote.append(item)
+                if fila.empty() or len(lote) >= tamanho_lote:
+                    break
+                item = fila.get_nowait()
+            if lote:
+                conhecidos = list(resolvidos)
+                for id_ponto, coords in lote:
+                    resolvidos[id_ponto] = coords
+                tarefas_rota.append(asyncio.create_task(rotear([i for i, _ in lote], conhecidos)))
+            else:
+                semaforo_rota.release()
+        await finalizador
+        await asyncio.gather(*tarefas_rota)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return resultados, distancias
+
+def executar_pipeline(itens, geocodificar, coords_partida, calcular_bloco,
+                      max_geocodificacao=6, max_roteamento=2, tamanho_lote=25):
+    """Geocodifica os itens e calcula as distâncias entre eles ao mesmo tempo.
+
+    geocodificar(item) deve retornar (endereco, coords ou None, status) e
+    calcular_bloco(coords_origem, coords_destino) uma matriz de distâncias em km.
+    O ponto de partida recebe o id 0 e o item i recebe o id i + 1.
+
+    Retorna (resultados, distancias): os resultados da geocodificação na ordem dos
+    itens e um dicionário {(id_origem, id_destino): km} com todos os pares resolvidos.
+    """
+    return asyncio.run(_executar(itens, geocodificar, coords_partida, calcular_bloco,
+                                 max_geocodificacao, max_roteamento, tamanho_lote))
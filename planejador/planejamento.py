@@ -0,0 +1,329 @@
+"""Execução completa de um planejamento: planilha -> geocodificação -> matriz -> rota -> PDF."""
+import logging
+import os
+
+import numpy as np
+from colorama import Fore, Style
+from tqdm import tqdm
+
+from . import pipeline
+from .cliente_http import obter_cliente
+from .distancias import (METODO_OUTLIER, RAIO_OUTLIER_KM, calcular_distancias_pares, calcular_matriz_distancias, grafo_candidatos,
+                         matriz_haversine, obter_cache_distancia, outliers_espaciais, revalidar_distancias)
+from .diario import Diario, caminho_diario, diario_atual
+from .estado import caminho_estado, salvar_estado
+from .geocodificacao import (CacheGeocodificacao, geocodificar_lote, geocodificar_ponto_partida, processar_endereco,
+                             revalidar_geocodificacoes)
+from .metricas import Execucao
+from .normalizacao import indexar_enderecos, nomes_por_endereco
+from .otimizador import METODO_OTIMIZACAO, ROTA_FECHADA, TEMPO_OTIMIZACAO, encontrar_melhor_rota
+from .planilha import ARQUIVO_EXCEL, COLUNA_ENDERECOS, COLUNA_NOMES, ler_planilha_grupos, marcar_enderecos_erro_excel
+from .relatorio import PASTA_ROTAS, caminho_pdf, gerar_pdf, titulo_rota
+from .util import logger, print_colorido
+
+PONTO_PARTIDA = "Rua Floriano Peixoto, 368, Centro, Itapuí - SP"
+
+class ErroPlanejamento(Exception):
+    """Erro que impede a geração da rota (planilha ausente, nenhum endereço válido etc.)"""
+
+def imprimir_metricas_http():
+    for endpoint, m in obter_cliente().resumo().items():
+        print_colorido(f"   {endpoint}: {m['requisicoes']} requisições, {m['retentativas']} retentativas, "
+                       f"latência média {m['latencia_media'] * 1000:.0f} ms, espera {m['espera_total']:.1f}s, "
+                       f"429: {m['http_429']}, 403: {m['http_403']}, erros de conexão: {m['erros_conexao']}", Fore.WHITE)
+
+def _com_taxas(estatisticas):
+    consultas = sum(v for k, v in estatisticas.items() if k in ('acertos', 'negativos', 'faltas'))
+    resumo = dict(estatisticas)
+    for chave in ('acertos', 'obsoletos', 'faltas', 'expirados'):
+        if chave in estatisticas:
+            resumo[f'taxa_{chave}'] = round(estatisticas[chave] / consultas, 4) if consultas else 0.0
+    return resumo
+
+def resumo_caches(cache_geo):
+    """Contadores e taxas de acerto/falta/expiração dos dois caches para o relatório"""
+    return {'geocodificacao': _com_taxas(cache_geo.estatisticas),
+            'distancias': _com_taxas(obter_cache_distancia().estatisticas)}
+
+def revalidar_caches(execucao, cache_geo):
+    """Atualiza, depois do PDF e com limite por execução, as entradas vencidas que os caches serviram"""
+    if not (cache_geo.obsoletos() or obter_cache_distancia().obsoletos()):
+        return
+    print_colorido("\n🔁 Revalidando entradas vencidas dos caches...", Fore.CYAN)
+    with execucao.etapa('revalidacao'):
+        geocodificacoes = revalidar_geocodificacoes(cache_geo)
+        distancias = revalidar_distancias()
+    print_colorido(f"   {geocodificacoes} endereços e {distancias} distâncias atualizados", Fore.WHITE)
+
+def imprimir_etapas(execucao):
+    for nome, segundos in execucao.etapas.items():
+        print_colorido(f"   {nome}: {segundos:.2f}s", Fore.WHITE)
+
+def abrir_diario(arquivo_pdf, parametros, retomar=False):
+    """Diário da execução ao lado de arquivo_pdf (ver diario), retomado se pedido e existente"""
+    arquivo = caminho_diario(arquivo_pdf)
+    if not retomar and os.path.exists(arquivo):
+        print_colorido(f"ℹ️ Descartando o diário de uma execução interrompida ({arquivo}); "
+                       "use --retomar para continuar de onde ela parou.", Fore.YELLOW)
+    diario = Diario(arquivo, parametros, retomar)
+    if diario.retomado:
+        print_colorido(f"♻️ Retomando a execução interrompida: {len(diario.geocodificacoes)} geocodificações e "
+                       f"{len(diario.distancias)} distâncias do diário", Fore.CYAN)
+    elif retomar:
+        print_colorido("ℹ️ Nenhuma execução interrompida para retomar; começando do zero.", Fore.YELLOW)
+    return diario
+
+def verificar_isolados(execucao, coordenadas, enderecos_validos, raio_km=RAIO_OUTLIER_KM, indices=None,
+                       metodo=METODO_OUTLIER):
+    """Procura os pontos isolados antes da matriz e avisa sobre eles.
+
+    Retorna os índices (em coordenadas) dos pontos isolados segundo metodo (ver
+    distancias.outliers_espaciais): sem nenhuma outra parada a menos de raio_km
+    ('dbscan') ou longe demais da média ('distancia'); indices restringe o aviso a
+    esses pontos (os demais ainda contam como vizinhos).
+    """
+    with execucao.etapa('outliers'):
+        isolados = outliers_espaciais(coordenadas, raio_km, metodo=metodo)
+    if indices is not None:
+        indices = set(indices)
+        isolados = [i for i in isolados if i in indices]
+    execucao.contar('pontos_isolados', len(isolados))
+    motivo = (f"nenhuma outra parada a menos de {raio_km:g} km" if metodo == 'dbscan'
+              else "distância média às outras paradas muito acima da média")
+    for i in isolados:
+        print_colorido(f"⚠️ Ponto isolado ({motivo}): {enderecos_validos[i]}", Fore.YELLOW, nivel=logging.WARNING)
+    return isolados
+
+def planejar_rota(cidade, arquivo_excel=ARQUIVO_EXCEL, ponto_partida=PONTO_PARTIDA, pasta_saida=PASTA_ROTAS,
+                  nome_coluna_enderecos=COLUNA_ENDERECOS, nome_coluna_nomes=COLUNA_NOMES,
+                  workers_geocodificacao=6, workers_roteamento=2, usar_pipeline=True,
+                  k_vizinhos=None, simetrica=False, metodo=METODO_OTIMIZACAO,
+                  tempo_otimizacao=TEMPO_OTIMIZACAO, rota_fechada=ROTA_FECHADA,
+                  revisar_isolados=False, raio_isolados_km=RAIO_OUTLIER_KM, metodo_isolados=METODO_OUTLIER,
+                  retomar=False, perfil=None, etapas_perfil=None):
+    """Gera o PDF da rota de entregas e retorna o caminho do arquivo.
+
+    k_vizinhos ativa o grafo de candidatos (ver distancias.grafo_candidatos); nesse
+    modo o pipeline não é usado, pois os candidatos dependem de todas as coordenadas.
+
+    Os pontos isolados (metodo_isolados 'dbscan': sem outra parada a menos de
+    raio_isolados_km; 'distancia': distância média em linha reta muito acima da das
+    outras) são sempre avisados antes da matriz; com revisar_isolados eles saem da
+    rota e vão para a lista de erros do PDF e da planilha, sem gastar consultas de
+    rota (o pipeline não é usado).
+
+    Ao lado do PDF é gravado um relatório JSON com o tempo de cada etapa, os
+    contadores e as métricas de cache e HTTP; perfil ('cprofile' ou 'pyinstrument')
+    perfila as etapas em etapas_perfil (todas se None), ver metricas.Execucao.
+
+    As geocodificações, os blocos da matriz e a melhor rota vão para um diário ao lado
+    do PDF (ver diario); com retomar=True, uma execução interrompida continua de onde
+    parou, sem repetir as consultas já feitas.
+    """
+    parametros = {k: v for k, v in locals().items() if k not in ('perfil', 'etapas_perfil', 'retomar')}
+    diario = abrir_diario(caminho_pdf(titulo_rota(cidade), pasta_saida), parametros, retomar)
+    with diario, Execucao(dict(parametros, retomar=retomar), perfil=perfil, etapas_perfil=etapas_perfil) as execucao:
+        return _planejar_rota(execucao, **parametros)
+
+def _planejar_rota(execucao, cidade, arquivo_excel, ponto_partida, pasta_saida, nome_coluna_enderecos,
+                   nome_coluna_nomes, workers_geocodificacao, workers_roteamento, usar_pipeline, k_vizinhos,
+                   simetrica, metodo, tempo_otimizacao, rota_fechada, revisar_isolados, raio_isolados_km,
+                   metodo_isolados):
+    print_colorido("\n🚀 Iniciando processamento...", Fore.GREEN, Style.BRIGHT)
+
+    # Verificar se o arquivo Excel existe
+    if not os.path.exists(arquivo_excel):
+        raise ErroPlanejamento(f"O arquivo {arquivo_excel} não foi encontrado.")
+
+    # LER PLANILHA
+    print_colorido("\n📊 Lendo planilha...", Fore.CYAN)
+    try:
+        with execucao.etapa('planilha'):
+            linhas, enderecos, nomes, _ = ler_planilha_grupos(arquivo_excel, nome_coluna_enderecos, nome_coluna_nomes)
+    except Exception as e:
+        raise ErroPlanejamento(f"Erro ao ler planilha: {str(e)}") from e
+    execucao.contar('enderecos', len(enderecos))
+    print_colorido(f"✅ Total de endereços encontrados: {len(enderecos)}", Fore.GREEN)
+
+    if not enderecos:
+        raise ErroPlanejamento("Nenhum endereço encontrado na planilha.")
+
+    # Endereços repetidos (mesma chave normalizada) viram um único ponto da rota
+    unicos, indice = indexar_enderecos(enderecos)
+    posicoes_por_ponto = [[] for _ in unicos]
+    for posicao, u in enumerate(indice):
+        posicoes_por_ponto[u].append(posicao)
+    enderecos_unicos = [enderecos[i] for i in unicos]
+    if len(unicos) < len(enderecos):
+        execucao.contar('enderecos_repetidos', len(enderecos) - len(unicos))
+        print_colorido(f"🔗 {len(enderecos) - len(unicos)} endereços repetidos agrupados: {len(unicos)} pontos",
+                       Fore.GREEN)
+
+    # GEOCODIFICAÇÃO
+    print_colorido("\n🌍 Iniciando geocodificação...", Fore.CYAN)
+    coordenadas = []
+    enderecos_validos = []
+    enderecos_com_erro = []
+
+    # Primeiro, geocodificar o ponto de partida
+    print_colorido(f"\n📍 Processando ponto de partida: {ponto_partida}", Fore.CYAN)
+    cache_geo = CacheGeocodificacao()
+    try:
+        with execucao.etapa('geocodificacao'):
+            coordenadas.append(geocodificar_ponto_partida(ponto_partida, cache_geo))
+    except ValueError as e:
+        raise ErroPlanejamento(str(e)) from e
+    enderecos_validos.append(ponto_partida)
+
+    print_colorido("\n🔄 Geocodificando endereços...", Fore.CYAN)
+    distancias_pipeline = None
+    usa_pipeline = usar_pipeline and not k_vizinhos and not revisar_isolados
+    # No pipeline a geocodificação e as distâncias se sobrepõem e são medidas juntas
+    with execucao.etapa('geocodificacao_e_matriz' if usa_pipeline else 'geocodificacao'):
+        if usa_pipeline:
+            # As distâncias de cada endereço começam a ser consultadas assim que ele é geocodificado
+            with tqdm(total=len(enderecos_unicos), desc="Progresso", unit="endereço",
+                      disable=not logger.isEnabledFor(logging.INFO)) as barra:
+                def geocodificar_com_progresso(endereco):
+                    resultado = processar_endereco(endereco, cache_geo)
+                    barra.update(1)
+                    return resultado
+                resultados, distancias_pipeline = pipeline.executar_pipeline(
+                    enderecos_unicos, geocodificar_com_progresso, coordenadas[0], calcular_distancias_pares,
+                    max_geocodificacao=workers_geocodificacao, max_roteamento=workers_roteamento)
+            cache_geo.salvar()
+        else:
+            resultados = geocodificar_lote(enderecos_unicos, cache_geo, max_workers=workers_geocodificacao,
+                                           progresso=logger.isEnabledFor(logging.INFO))
+
+    # Filtrar resultados válidos e coletar erros
+    ids_validos = [0]  # Ids do pipeline: 0 é o ponto de partida, i é o i-ésimo endereço único
+    for i, (endereco, coords, status) in enumerate(resultados, 1):
+        if coords:
+            coordenadas.append(coords)
+            enderecos_validos.append(endereco)
+            ids_validos.append(i)
+        else:
+            enderecos_com_erro.extend((linhas[p], enderecos[p]) for p in posicoes_por_ponto[i - 1])
+        # Imprime o status de cada endereço em ordem
+        if status == 'cache':
+            print_colorido(f"Usando cache para: {endereco}", Fore.YELLOW, nivel=logging.DEBUG)
+        elif status == 'geocodificado':
+            print_colorido(f"Geocodificado: {endereco}", Fore.GREEN, nivel=logging.DEBUG)
+        elif status == 'local':
+            print_colorido(f"Encontrado no índice local: {endereco}", Fore.GREEN, nivel=logging.DEBUG)
+        elif status == 'coordenada':
+            print_colorido(f"Endereço já é coordenada: {endereco}", Fore.CYAN, nivel=logging.DEBUG)
+        elif status == 'erro_cache':
+            print_colorido(f"Endereço não encontrado em execução recente (cache): {endereco}", Fore.RED,
+                           nivel=logging.WARNING)
+        else:
+            print_colorido(f"Erro ao geocodificar: {endereco}", Fore.RED, nivel=logging.WARNING)
+
+    # PONTOS ISOLADOS: verificados em linha reta, antes de qualquer consulta de rota
+    isolados = verificar_isolados(execucao, coordenadas, enderecos_validos, raio_isolados_km,
+                                  metodo=metodo_isolados)
+    if isolados and revisar_isolados:
+        enderecos_com_erro = sorted(enderecos_com_erro + [(linhas[p], enderecos[p]) for i in isolados
+                                                          for p in posicoes_por_ponto[ids_validos[i] - 1]])
+        fora = set(isolados)
+        mantidos = [i for i in range(len(coordenadas)) if i not in fora]
+        coordenadas = [coordenadas[i] for i in mantidos]
+        enderecos_validos = [enderecos_validos[i] for i in mantidos]
+        ids_validos = [ids_validos[i] for i in mantidos]
+        print_colorido(f"⚠️ {len(isolados)} pontos isolados separados para revisão", Fore.YELLOW)
+
+    if enderecos_com_erro:
+        marcar_enderecos_erro_excel(arquivo_excel, nome_coluna_enderecos, enderecos_com_erro)
+
+    if len(enderecos_validos) <= 1:
+        raise ErroPlanejamento("Nenhum endereço foi geocodificado com sucesso além do ponto de partida.")
+
+    execucao.contar('geocodificados', len(enderecos_validos) - 1)
+    execucao.contar('enderecos_com_erro', len(enderecos_com_erro))
+    print_colorido(f"\n✅ Total de endereços geocodificados com sucesso: {len(enderecos_validos)}", Fore.GREEN)
+    print_colorido(f"⚠️ Total de endereços com erro: {len(enderecos_com_erro)}", Fore.YELLOW)
+
+    # MATRIZ DE DISTÂNCIA
+    print_colorido("\n📏 Calculando matriz de distância...", Fore.CYAN)
+    n = len(coordenadas)
+    with execucao.etapa('matriz'):
+        vizinhos = grafo_candidatos(coordenadas, k_vizinhos) if k_vizinhos else None
+        if distancias_pipeline is not None:
+            dist_matrix = np.array([[distancias_pipeline[(a, b)] for b in ids_validos] for a in ids_validos])
+        else:
+            dist_matrix = calcular_matriz_distancias(coordenadas, vizinhos=vizinhos, simetrica=simetrica)
+
+    # Uma linha por par: só em DEBUG, para não pagar n² impressões no modo resumido
+    if logger.isEnabledFor(logging.DEBUG):
+        for i in range(n):
+            for j in range(n):
+                dist = dist_matrix[i][j]
+                if i != j and dist != float('inf'):
+                    print_colorido(f"   De {enderecos_validos[i]} para {enderecos_validos[j]}: {dist:.2f} km",
+                                   Fore.WHITE, nivel=logging.DEBUG)
+
+    # ENCONTRAR MELHOR ROTA
+    print_colorido("\n🗺️ Calculando melhor rota...", Fore.CYAN)
+    diario_atual().definir_pontos(enderecos_validos)
+    with execucao.etapa('otimizacao'):
+        ordem_rota = encontrar_melhor_rota(dist_matrix, enderecos_validos, metodo=metodo,
+                                           tempo_limite=tempo_otimizacao, fechada=rota_fechada,
+                                           estimativa=matriz_haversine(coordenadas), vizinhos=vizinhos)
+
+    return gerar_saidas(execucao, cidade, ponto_partida, pasta_saida, linhas, enderecos, nomes, enderecos_validos,
+                        coordenadas, dist_matrix, ordem_rota, rota_fechada, enderecos_com_erro, cache_geo)
+
+def gerar_saidas(execucao, cidade, ponto_partida, pasta_saida, linhas, enderecos, nomes, enderecos_validos,
+                 coordenadas, dist_matrix, ordem_rota, rota_fechada, enderecos_com_erro, cache_geo):
+    """Gera o PDF, o relatório da execução e o estado usado pelo replanejamento; retorna o caminho do PDF.
+
+    linhas, enderecos e nomes são as colunas alinhadas da planilha; enderecos_com_erro
+    usa os números de linha de linhas.
+    """
+    # Verifica se a rota está correta
+    if ordem_rota is None or len(ordem_rota) != len(coordenadas):
+        raise ErroPlanejamento("A rota não inclui todos os pontos!")
+
+    # Calcula a distância total da rota e as distâncias parciais
+    distancia_total = 0
+    distancias_parciais = []
+    for i in range(len(ordem_rota) - 1):
+        dist = dist_matrix[ordem_rota[i]][ordem_rota[i + 1]]
+        distancia_total += dist
+        distancias_parciais.append(dist)
+    if rota_fechada:
+        distancia_total += dist_matrix[ordem_rota[-1]][ordem_rota[0]]
+    print_colorido(f"\n📊 Distância total da rota: {distancia_total:.2f} km", Fore.GREEN)
+
+    enderecos_ordenados = [enderecos_validos[i] for i in ordem_rota]
+    # Clientes com o mesmo endereço aparecem juntos na parada
+    nomes_validos = nomes_por_endereco(enderecos, nomes, enderecos_validos)
+    nomes_ordenados = [nomes_validos[i] for i in ordem_rota]
+    nomes_por_linha = [""] * max(linhas)
+    for linha, nome in zip(linhas, nomes):
+        nomes_por_linha[linha - 1] = nome
+
+    # GERAR PDF
+    print_colorido("\n📄 Gerando PDF...", Fore.CYAN)
+    titulo = titulo_rota(cidade)
+    with execucao.etapa('pdf'):
+        arquivo_saida_pdf = gerar_pdf(caminho_pdf(titulo, pasta_saida), titulo, ponto_partida, distancia_total,
+                                      nomes_ordenados, enderecos_ordenados, distancias_parciais,
+                                      enderecos_com_erro, nomes_por_linha)
+    print_colorido(f"\n✅ PDF gerado com sucesso: {arquivo_saida_pdf}", Fore.GREEN)
+    salvar_estado(caminho_estado(arquivo_saida_pdf), ponto_partida, enderecos_validos, coordenadas,
+                  dist_matrix, ordem_rota, rota_fechada)
+    revalidar_caches(execucao, cache_geo)
+
+    print_colorido("\n🌐 Requisições externas:", Fore.CYAN)
+    imprimir_metricas_http()
+    print_colorido("\n⏱️ Tempo por etapa:", Fore.CYAN)
+    imprimir_etapas(execucao)
+
+    execucao.registrar('caches', resumo_caches(cache_geo))
+    execucao.registrar('resultado', {'pdf': arquivo_saida_pdf, 'paradas': len(ordem_rota) - 1,
+                                     'distancia_km': round(float(distancia_total), 1)})
+    relatorio = execucao.salvar(os.path.splitext(arquivo_saida_pdf)[0] + ".json")
+    print_colorido(f"📝 Relatório da execução: {relatorio}", Fore.CYAN)
+    return arquivo_saida_pdf
@@ -0,0 +1,298 @@
+"""Leitura da planilha de endereços e marcação das linhas com erro.
+
+Aceita .xlsx/.xlsm (python-calamine se instalado, senão uma leitura em streaming do
+XML da planilha), .xls (pandas), .csv (vírgula ou ponto e vírgula) e .parquet (pandas com
+pyarrow). Só as colunas usadas são convertidas, e cada linha leva o seu número na
+planilha (1 = primeira linha após o cabeçalho) como identificador em todas as etapas.
+
+As linhas com erro são pintadas de vermelho no próprio .xlsx em uma passada sobre o
+XML da planilha, sem carregar o workbook; nos outros formatos (ou se o .xlsx não puder
+ser alterado) elas vão para um arquivo <planilha>.erros.csv ao lado.
+
+pandas, openpyxl e calamine são importados apenas dentro das funções, para que
+importar o pacote continue rápido.
+"""
+import csv
+import logging
+import os
+import re
+import zipfile
+
+from colorama import Fore
+
+from .util import print_colorido
+
+ARQUIVO_EXCEL = "ENDERECOS-ROTA.xlsx"
+COLUNA_ENDERECOS = "Endereco"
+COLUNA_NOMES = "Nome"
+
+FORMATOS = ('.xlsx', '.xlsm', '.xls', '.csv', '.parquet')
+
+_NS_XLSX = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+def _indice_coluna(referencia):
+    """'A1' -> 0, 'AB7' -> 27"""
+    indice = 0
+    for letra in referencia:
+        if not letra.isalpha():
+            break
+        indice = indice * 26 + ord(letra.upper()) - 64
+    return indice - 1
+
+def _linhas_xlsx_xml(arquivo):
+    """Lê a primeira planilha direto do XML, em streaming (bem mais rápido que o openpyxl)"""
+    import xml.etree.ElementTree as ET
+
+    with zipfile.ZipFile(arquivo) as z:
+        compartilhadas = []
+        if 'xl/sharedStrings.xml' in z.namelist():
+            for _, elem in ET.iterparse(z.open('xl/sharedStrings.xml')):
+                if elem.tag == _NS_XLSX + 'si':
+                    compartilhadas.append("".join(t.text or "" for t in elem.iter(_NS_XLSX + 't')))
+                    elem.clear()
+        linhas = []
+        for _, elem in ET.iterparse(z.open(_caminho_primeira_planilha(z))):
+            if elem.tag != _NS_XLSX + 'row':
+                continue
+            numero = int(elem.get('r', len(linhas) + 1))
+            while len(linhas) < numero - 1:
+                linhas.append(())  # Linhas vazias não aparecem no XML
+            valores = {}
+            for celula in elem.iter(_NS_XLSX + 'c'):
+                tipo = celula.get('t')
+                v = celula.find(_NS_XLSX + 'v')
+                if tipo == 's' and v is not None:
+                    valor = compartilhadas[int(v.text)]
+                elif tipo == 'inlineStr':
+                    valor = "".join(t.text or "" for t in celula.iter(_NS_XLSX + 't'))
+                else:
+                    valor = v.text if v is not None else None
+                valores[_indice_coluna(celula.get('r')) if celula.get('r') else len(valores)] = valor
+            linhas.append(tuple(valores.get(k) for k in range(max(valores, default=-1) + 1)))
+            elem.clear()
+    return linhas
+
+def _linhas_xlsx(arquivo):
+    """Linhas (tuplas de valores) da primeira planilha, com o cabeçalho"""
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        pass
+    else:
+        return CalamineWorkbook.from_path(arquivo).get_sheet_by_index(0).to_python(skip_empty_area=False)
+    try:
+        return _linhas_xlsx_xml(arquivo)
+    except (KeyError, ValueError, AttributeError, zipfile.BadZipFile):
+        import openpyxl
+
+        wb = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            return list(wb.worksheets[0].iter_rows(values_only=True))
+        finally:
+            wb.close()
+
+def _linhas_csv(arquivo):
+    for codificacao in ('utf-8-sig', 'cp1252'):
+        try:
+            with open(arquivo, newline='', encoding=codificacao) as f:
+                cabecalho = f.readline()
+                f.seek(0)
+                delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+                return list(csv.reader(f, delimiter=delimitador))
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Não foi possível decodificar {arquivo}")
+
+def _linhas_pandas(arquivo, colunas):
+    import pandas as pd
+
+    if arquivo.lower().endswith('.parquet'):
+        df = pd.read_parquet(arquivo, columns=colunas)
+    else:
+        df = pd.read_excel(arquivo)
+    df = df.astype(object).where(df.notna(), None)
+    return [tuple(df.columns)] + list(df.itertuples(index=False, name=None))
+
+def ler_colunas(arquivo, colunas):
+    """Lê as colunas pedidas; retorna {coluna: valores}, um valor (None se vazio) por linha de dados"""
+    extensao = os.path.splitext(arquivo)[1].lower()
+    if extensao not in FORMATOS:
+        raise ValueError(f"Formato de planilha não suportado: {extensao} (use {', '.join(FORMATOS)})")
+    if extensao in ('.xlsx', '.xlsm'):
+        linhas = _linhas_xlsx(arquivo)
+    elif extensao == '.csv':
+        linhas = _linhas_csv(arquivo)
+    else:
+        linhas = _linhas_pandas(arquivo, colunas)
+    if not linhas:
+        raise KeyError(f"Coluna '{colunas[0]}' não encontrada na planilha")
+    cabecalho = [str(c).strip() if c is not None else "" for c in linhas[0]]
+    resultado = {}
+    for coluna in colunas:
+        if coluna not in cabecalho:
+            raise KeyError(f"Coluna '{coluna}' não encontrada na planilha")
+        k = cabecalho.index(coluna)
+        resultado[coluna] = [_valor(linha[k]) if k < len(linha) else None for linha in linhas[1:]]
+    # Linhas vazias no fim (comuns em planilhas editadas à mão) não contam
+    n = len(linhas) - 1
+    while n and all(valores[n - 1] is None for valores in resultado.values()):
+        n -= 1
+    return {coluna: valores[:n] for coluna, valores in resultado.items()}
+
+def _valor(v):
+    if v is None or v != v:  # v != v: NaN
+        return None
+    v = str(v).strip()
+    return v or None
+
+def ler_planilha(arquivo_excel=ARQUIVO_EXCEL, nome_coluna_enderecos=COLUNA_ENDERECOS, nome_coluna_nomes=COLUNA_NOMES):
+    """Retorna (enderecos, nomes) alinhados, das linhas com nome e endereço preenchidos"""
+    _, enderecos, nomes, _ = ler_planilha_grupos(arquivo_excel, nome_coluna_enderecos, nome_coluna_nomes)
+    return enderecos, nomes
+
+def ler_planilha_grupos(arquivo_excel, nome_coluna_enderecos, nome_coluna_nomes, nome_coluna_grupo=None):
+    """Retorna (linhas, enderecos, nomes, grupos) alinhados, das linhas com nome e endereço.
+
+    linhas é o número de cada linha entre os dados da planilha (1 = primeira linha
+    após o cabeçalho), o mesmo usado por marcar_enderecos_erro_excel; grupos é None
+    quando nome_coluna_grupo não é informado.
+    """
+    colunas = [nome_coluna_enderecos, nome_coluna_nomes] + ([nome_coluna_grupo] if nome_coluna_grupo else [])
+    dados = ler_colunas(arquivo_excel, colunas)
+    linhas = [i for i, (endereco, nome) in enumerate(zip(dados[nome_coluna_enderecos], dados[nome_coluna_nomes]), 1)
+              if endereco is not None and nome is not None]
+    enderecos = [dados[nome_coluna_enderecos][i - 1] for i in linhas]
+    nomes = [dados[nome_coluna_nomes][i - 1] for i in linhas]
+    grupos = [dados[nome_coluna_grupo][i - 1] or "" for i in linhas] if nome_coluna_grupo else None
+    return linhas, enderecos, nomes, grupos
+
+# --- Marcação das linhas com erro ------------------------------------------------
+
+PREENCHIMENTO_ERRO = ('<fill><patternFill patternType="solid"><fgColor rgb="FFFF0000"/>'
+                      '<bgColor rgb="FFFF0000"/></patternFill></fill>')
+
+def _atributo(tag, nome, padrao=None):
+    m = re.search(rf'\s{nome}="([^"]*)"', tag)
+    return m.group(1) if m else padrao
+
+def _trocar_atributos(tag, **atributos):
+    """Remove os atributos da tag de abertura e os acrescenta com os novos valores"""
+    for nome in atributos:
+        tag = re.sub(rf'\s{nome}="[^"]*"', '', tag)
+    nome_tag = re.match(r'<[\w:]+', tag).group(0)
+    novos = "".join(f' {k}="{v}"' for k, v in atributos.items())
+    return nome_tag + novos + tag[len(nome_tag):]
+
+def _caminho_primeira_planilha(zin):
+    workbook = zin.read('xl/workbook.xml').decode('utf-8')
+    rid = re.search(r'<(?:\w+:)?sheet\b[^>]*\s\w+:id="([^"]+)"', workbook).group(1)
+    rels = zin.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+    for rel in re.findall(r'<(?:\w+:)?Relationship\b[^>]*>', rels):
+        if _atributo(rel, 'Id') == rid:
+            alvo = _atributo(rel, 'Target')
+            return alvo[1:] if alvo.startswith('/') else 'xl/' + alvo
+    raise ValueError("Planilha não encontrada no workbook")
+
+def _estilos_com_erro(estilos, usados):
+    """Acrescenta o preenchimento vermelho e uma cópia vermelha de cada estilo usado.
+
+    Retorna (xml, {estilo: estilo vermelho}); preenchimento e cópias já existentes
+    (de uma marcação anterior) são reaproveitados.
+    """
+    fills = re.search(r'(<fills\b[^>]*>)(.*?)</fills>', estilos, re.S)
+    lista = re.findall(r'<fill\b[^>]*/>|<fill\b.*?</fill>', fills.group(2), re.S)
+    if PREENCHIMENTO_ERRO in lista:
+        id_preenchimento = lista.index(PREENCHIMENTO_ERRO)
+    else:
+        id_preenchimento = len(lista)
+        abertura = _trocar_atributos(fills.group(1), count=len(lista) + 1)
+        estilos = (estilos[:fills.start()] + abertura + fills.group(2) + PREENCHIMENTO_ERRO + '</fills>'
+                   + estilos[fills.end():])
+
+    xfs_bloco = re.search(r'(<cellXfs\b[^>]*>)(.*?)</cellXfs>', estilos, re.S)
+    xfs = re.findall(r'<xf\b[^>]*/>|<xf\b[^>]*>.*?</xf>', xfs_bloco.group(2), re.S)
+    novos = []
+    mapa = {}
+    for estilo in sorted(usados):
+        xf = xfs[estilo] if estilo < len(xfs) else xfs[0]
+        abertura = re.match(r'<xf\b[^>]*>', xf).group(0)
+        copia = _trocar_atributos(abertura, fillId=id_preenchimento, applyFill=1) + xf[len(abertura):]
+        if copia in xfs:
+            mapa[estilo] = xfs.index(copia)
+        else:
+            xfs.append(copia)
+            novos.append(copia)
+            mapa[estilo] = len(xfs) - 1
+    abertura = _trocar_atributos(xfs_bloco.group(1), count=len(xfs))
+    estilos = (estilos[:xfs_bloco.start()] + abertura + xfs_bloco.group(2) + "".join(novos) + '</cellXfs>'
+               + estilos[xfs_bloco.end():])
+    return estilos, mapa
+
+_LINHA_XML = re.compile(r'<(?:\w+:)?row\b[^>]*?(?:/>|>.*?</(?:\w+:)?row>)', re.S)
+_CELULA_XML = re.compile(r'<(?:\w+:)?c\b[^>]*?/?>')
+
+def _pintar_linhas_xlsx(arquivo, linhas):
+    """Pinta de vermelho as linhas (de dados) do .xlsx reescrevendo só o XML da planilha e dos estilos"""
+    alvos = {linha + 1 for linha in linhas}  # +1 por causa do cabeçalho
+    with zipfile.ZipFile(arquivo) as zin:
+        caminho = _caminho_primeira_planilha(zin)
+        planilha = zin.read(caminho).decode('utf-8')
+        estilos = zin.read('xl/styles.xml').decode('utf-8')
+
+        def alvo(m):
+            return int(_atributo(m.group(0)[:m.group(0).index('>') + 1], 'r', 0)) in alvos
+
+        usados = {0}
+        for m in _LINHA_XML.finditer(planilha):
+            if alvo(m):
+                usados.update(int(_atributo(c, 's', 0)) for c in _CELULA_XML.findall(m.group(0)))
+        estilos, mapa = _estilos_com_erro(estilos, usados)
+
+        def pintar(m):
+            if not alvo(m):
+                return m.group(0)
+            linha = m.group(0)
+            abertura = re.match(r'<(?:\w+:)?row\b[^>]*?/?>', linha).group(0)
+            linha = _trocar_atributos(abertura, s=mapa[0], customFormat=1) + linha[len(abertura):]
+            return _CELULA_XML.sub(lambda c: _trocar_atributos(c.group(0), s=mapa[int(_atributo(c.group(0), 's', 0))]),
+                                   linha)
+        planilha = _LINHA_XML.sub(pintar, planilha)
+
+        temporario = arquivo + ".tmp"
+        with zipfile.ZipFile(temporario, 'w', zipfile.ZIP_DEFLATED) as zout:
+            for item in zin.infolist():
+                if item.filename == caminho:
+                    zout.writestr(item, planilha.encode('utf-8'))
+                elif item.filename == 'xl/styles.xml':
+                    zout.writestr(item, estilos.encode('utf-8'))
+                else:
+                    zout.writestr(item, zin.read(item.filename))
+    os.replace(temporario, arquivo)
+
+def caminho_erros(arquivo):
+    return os.path.splitext(arquivo)[0] + ".erros.csv"
+
+def gravar_erros_csv(arquivo, nome_coluna_enderecos, enderecos_com_erro):
+    """Grava as (linha, endereco) com erro em <planilha>.erros.csv e retorna o caminho"""
+    destino = caminho_erros(arquivo)
+    with open(destino, 'w', newline='', encoding='utf-8-sig') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['Linha', nome_coluna_enderecos])
+        escritor.writerows(enderecos_com_erro)
+    return destino
+
+def marcar_enderecos_erro_excel(arquivo_excel, nome_coluna_enderecos, enderecos_com_erro):
+    """Pinta as linhas com erro no .xlsx; nos outros formatos, ou se falhar, grava <planilha>.erros.csv"""
+    if os.path.splitext(arquivo_excel)[1].lower() in ('.xlsx', '.xlsm'):
+        try:
+            _pintar_linhas_xlsx(arquivo_excel, sorted({linha for linha, _ in enderecos_com_erro}))
+            print_colorido("Linhas dos endereços com erro marcadas em vermelho na planilha.", Fore.RED,
+                           nivel=logging.WARNING)
+            return
+        except Exception as e:
+            print_colorido(f"Erro ao marcar células na planilha: {str(e)}", Fore.RED, nivel=logging.ERROR)
+    try:
+        destino = gravar_erros_csv(arquivo_excel, nome_coluna_enderecos, enderecos_com_erro)
+        print_colorido(f"Endereços com erro gravados em {destino}.", Fore.RED, nivel=logging.WARNING)
+    except OSError as e:
+        print_colorido(f"Erro ao gravar os endereços com erro: {str(e)}", Fore.RED, nivel=logging.ERROR)
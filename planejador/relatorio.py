@@ -0,0 +1,242 @@
+"""Geração do PDF com a rota de entregas.
+
+As tabelas seguem modelos fixos (COLUNAS_ROTA e COLUNAS_ERROS) e o cabeçalho da
+tabela é repetido pela própria quebra de página. O logo é decodificado uma vez por
+processo e reaproveitado em todos os PDFs, e o texto usa uma fonte TrueType com
+acentos (DejaVu Sans, Arial ou FONTE_PDF): um subconjunto latino dela é gerado uma
+vez e guardado em PASTA_CACHE_FONTES para as próximas execuções. Sem fonte
+TrueType, volta para a Helvetica embutida. Cada processo mantém o logo e a fonte
+carregados entre um PDF e outro.
+
+O fpdf é importado apenas dentro das funções, para que importar o pacote continue rápido,
+e verificar_fpdf confere que é o fpdf2 (o pacote fpdf 1.x usa o mesmo nome de módulo).
+"""
+import logging
+import os
+import re
+from datetime import datetime
+
+from .util import remover_acentos
+
+PASTA_ROTAS = "ROTAS-GERADAS"
+LOGO = os.path.join("assets", "logo.png")
+
+PASTA_CACHE_FONTES = "fontes_cache"
+# (normal, negrito); a primeira que existir é usada
+FONTES = (
+    (os.environ.get("FONTE_PDF"), os.environ.get("FONTE_PDF_NEGRITO")),
+    (os.path.join("assets", "fonts", "DejaVuSans.ttf"), os.path.join("assets", "fonts", "DejaVuSans-Bold.ttf")),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/TTF/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf"),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+    ("/Library/Fonts/Arial.ttf", "/Library/Fonts/Arial Bold.ttf"),
+)
+# Latim básico, Latim-1, Latim estendido A e pontuação geral: tudo o que aparece nas planilhas
+CARACTERES_FONTE = list(range(0x20, 0x7F)) + list(range(0xA0, 0x180)) + list(range(0x2000, 0x2070)) + [0x20AC]
+
+# (título, largura, alinhamento, máximo de caracteres)
+COLUNAS_ROTA = (("Nº", 10, "C", None), ("Nome", 45, "L", 30), ("Endereço", 65, "L", 45),
+                ("Distância", 30, "C", None), ("Link", 40, "C", None))
+COLUNAS_ERROS = (("Linha", 20, "C", None), ("Nome", 50, "L", 30), ("Endereço", 120, "L", 70))
+ALTURA_LINHA = 15
+ALTURA_CABECALHO = 10
+
+FPDF2_MINIMO = (2, 7, 7)  # new_x/new_y e fpdf.image_datastructures.ImageCache com reset_usages
+
+def verificar_fpdf():
+    """Importa o fpdf e retorna o módulo; levanta ImportError com a instalação certa se não for o fpdf2"""
+    try:
+        import fpdf
+    except ImportError as e:
+        raise ImportError("Gerar o PDF requer o fpdf2 (pip install fpdf2)") from e
+    versao = str(getattr(fpdf, "FPDF_VERSION", "0"))
+    if tuple(int(p) for p in re.findall(r"\d+", versao)[:3]) < FPDF2_MINIMO:
+        minimo = ".".join(map(str, FPDF2_MINIMO))
+        raise ImportError(f"Gerar o PDF requer o fpdf2 >= {minimo}, mas o fpdf {versao} está instalado "
+                          f"(pip uninstall fpdf && pip install -U 'fpdf2>={minimo}')")
+    return fpdf
+
+def titulo_rota(cidade, data=None):
+    data_atual = (data or datetime.now()).strftime("%Y/%m/%d")
+    return f"{data_atual} - Rota de Entregas - {cidade}"
+
+def caminho_pdf(titulo, pasta_rotas=PASTA_ROTAS):
+    nome_arquivo = remover_acentos(titulo).replace(" ", "_").replace("/", "-")
+    if not os.path.exists(pasta_rotas):
+        os.makedirs(pasta_rotas)
+    return os.path.join(pasta_rotas, f"{nome_arquivo}.pdf")
+
+def link_maps(endereco):
+    return f"https://www.google.com/maps/search/?api=1&query={remover_acentos(endereco).replace(' ', '+')}"
+
+_subconjuntos = {}  # caminho absoluto da fonte -> caminho absoluto do subconjunto
+
+def _subconjunto_fonte(arquivo):
+    """Caminho do subconjunto latino da fonte, gerado uma vez e reaproveitado entre execuções"""
+    try:
+        from fontTools import subset
+    except ImportError:
+        return arquivo
+    arquivo = os.path.abspath(arquivo)
+    destino = _subconjuntos.get(arquivo)
+    if destino and os.path.exists(destino):
+        return destino
+    # Absoluto no diretório atual: o processo pode ter mudado de diretório desde o último PDF
+    pasta = os.path.abspath(PASTA_CACHE_FONTES)
+    info = os.stat(arquivo)
+    nome = os.path.splitext(os.path.basename(arquivo))[0]
+    destino = os.path.join(pasta, f"{nome}-{int(info.st_mtime)}-{info.st_size}.ttf")
+    if not os.path.exists(destino):
+        os.makedirs(pasta, exist_ok=True)
+        logging.getLogger("fontTools").setLevel(logging.ERROR)  # Avisos de tabelas que não entram no subconjunto
+        opcoes = subset.Options()
+        opcoes.notdef_outline = True
+        opcoes.name_IDs = ['*']
+        fonte = subset.load_font(arquivo, opcoes)
+        subconjunto = subset.Subsetter(opcoes)
+        subconjunto.populate(unicodes=CARACTERES_FONTE)
+        subconjunto.subset(fonte)
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        subset.save_font(fonte, temporario, opcoes)
+        os.replace(temporario, destino)
+    _subconjuntos[arquivo] = destino
+    return destino
+
+def _fontes_unicode():
+    """(normal, negrito) do subconjunto em cache, ou None sem fonte TrueType"""
+    for normal, negrito in FONTES:
+        if normal and os.path.exists(normal):
+            normal = _subconjunto_fonte(normal)
+            negrito = _subconjunto_fonte(negrito) if negrito and os.path.exists(negrito) else normal
+            return normal, negrito
+    return None
+
+_cache_imagens = None
+
+def _imagens():
+    """Cache de imagens do fpdf compartilhado pelos PDFs do processo: o logo é decodificado uma vez"""
+    global _cache_imagens
+    if _cache_imagens is None:
+        verificar_fpdf()
+        from fpdf.image_datastructures import ImageCache
+        _cache_imagens = ImageCache()
+    _cache_imagens.reset_usages()
+    return _cache_imagens
+
+_classe_pdf = None
+
+def _nova_pdf():
+    global _classe_pdf
+    if _classe_pdf is None:
+        FPDF = verificar_fpdf().FPDF
+
+        class RelatorioPDF(FPDF):
+            """FPDF que repete o cabeçalho da tabela em andamento a cada página nova"""
+            tabela = None
+
+            def header(self):
+                if self.tabela:
+                    self.cabecalho_tabela(self.tabela)
+
+            def texto(self, valor, limite=None):
+                valor = str(valor)[:limite] if limite else str(valor)
+                if self.familia == "Helvetica":
+                    return valor.encode('latin-1', 'replace').decode('latin-1')
+                return valor
+
+            def cabecalho_tabela(self, colunas):
+                self.set_font(self.familia, "B", 12)
+                self.set_fill_color(255, 0, 0)  # Vermelho
+                self.set_text_color(255, 255, 255)  # Texto branco
+                for k, (titulo, largura, _, _) in enumerate(colunas):
+                    ultima = k == len(colunas) - 1
+                    self.cell(largura, ALTURA_CABECALHO, self.texto(titulo), 1, align="C", fill=True,
+                              new_x="LMARGIN" if ultima else "RIGHT", new_y="NEXT" if ultima else "TOP")
+                self.set_font(self.familia, "", 10)
+                self.set_text_color(0, 0, 0)  # Texto preto
+                self.set_fill_color(255, 240, 240)
+
+            def iniciar_tabela(self, colunas):
+                self.tabela = colunas
+                self.cabecalho_tabela(colunas)
+
+            def linha_tabela(self, valores, link=None):
+                """Uma linha da tabela atual; link vai na última coluna, em vermelho"""
+                colunas = self.tabela
+                for k, ((_, largura, alinhamento, limite), valor) in enumerate(zip(colunas, valores)):
+                    ultima = k == len(colunas) - 1
+                    if ultima and link:
+                        self.set_text_color(255, 0, 0)
+                    self.cell(largura, ALTURA_LINHA, self.texto(valor, limite), 1, align=alinhamento, fill=True,
+                              new_x="LMARGIN" if ultima else "RIGHT", new_y="NEXT" if ultima else "TOP",
+                              link=link if ultima and link else "")
+                if link:
+                    self.set_text_color(0, 0, 0)
+
+        _classe_pdf = RelatorioPDF
+
+    pdf = _classe_pdf()
+    pdf.image_cache = _imagens()
+    fontes = _fontes_unicode()
+    if fontes:
+        pdf.add_font("Relatorio", "", fontes[0])
+        pdf.add_font("Relatorio", "B", fontes[1])
+        pdf.familia = "Relatorio"
+    else:
+        pdf.familia = "Helvetica"
+    return pdf
+
+def gerar_pdf(arquivo_saida_pdf, titulo, ponto_partida, distancia_total, nomes_ordenados, enderecos_ordenados,
+              distancias_parciais, enderecos_com_erro=(), nomes=()):
+    """Gera o PDF da rota.
+
+    nomes_ordenados e enderecos_ordenados incluem o ponto de partida na posição 0;
+    enderecos_com_erro é uma lista de (linha, endereco) e nomes é a lista de nomes
+    da planilha, usada para identificar o cliente de cada linha com erro.
+    """
+    pdf = _nova_pdf()
+    pdf.add_page()
+
+    # Adicionar logo
+    if os.path.exists(LOGO):
+        pdf.image(LOGO, x=170, y=10, w=31.5)
+
+    pdf.set_font(pdf.familia, "B", 16)
+    pdf.cell(0, 10, pdf.texto(titulo), align="C", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(10)
+
+    # Informações gerais
+    pdf.set_font(pdf.familia, "B", 12)
+    pdf.cell(0, 10, pdf.texto("Informações Gerais:"), new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font(pdf.familia, "", 12)
+    for linha in (f"Ponto de Partida: {ponto_partida}",
+                  f"Distância Total Estimada: {distancia_total:.2f} km",
+                  f"Número de Entregas: {len(enderecos_ordenados) - 1}",
+                  f"Total de Endereços com Erro: {len(enderecos_com_erro)}"):
+        pdf.cell(0, 10, pdf.texto(linha), new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(10)
+
+    # Tabela da rota
+    pdf.iniciar_tabela(COLUNAS_ROTA)
+    for i, (nome, endereco, dist) in enumerate(zip(nomes_ordenados[1:], enderecos_ordenados[1:],
+                                                   distancias_parciais), 1):
+        pdf.linha_tabela(('#' + str(i), nome, endereco, f"{round(dist, 1)} km", "Ver no Maps"),
+                         link=link_maps(endereco))
+    pdf.tabela = None
+
+    # Adicionar seção de endereços com erro
+    if enderecos_com_erro:
+        pdf.add_page()
+        pdf.set_font(pdf.familia, "B", 14)
+        pdf.cell(0, 10, pdf.texto("Endereços com Erro na Geocodificação"), align="C",
+                 new_x="LMARGIN", new_y="NEXT")
+        pdf.ln(10)
+        pdf.iniciar_tabela(COLUNAS_ERROS)
+        for linha, endereco in enderecos_com_erro:
+            # Obter nome do cliente de forma segura
+            nome_cliente = nomes[linha - 1] if 0 <= linha - 1 < len(nomes) else ""
+            pdf.linha_tabela((linha, nome_cliente, endereco))
+        pdf.tabela = None
+
+    pdf.output(arquivo_saida_pdf)
+    return arquivo_saida_pdf
@@ -0,0 +1,163 @@
+"""Replanejamento incremental a partir do estado salvo pela última execução do dia.
+
+A planilha é comparada com os endereços do estado: as paradas mantidas reaproveitam
+coordenadas, linhas da matriz e a ordem da rota; só os endereços novos são
+geocodificados e roteados (uma linha e uma coluna da matriz por parada nova). As
+paradas novas entram por inserção mais barata e a rota é reparada com a busca local.
+"""
+import logging
+import os
+
+import numpy as np
+from colorama import Fore, Style
+
+from .distancias import METODO_OUTLIER, RAIO_OUTLIER_KM, calcular_distancias_pares
+from .estado import caminho_estado, carregar_estado
+from .geocodificacao import CacheGeocodificacao, geocodificar_lote
+from .metricas import Execucao
+from .normalizacao import chave_endereco, indexar_enderecos
+from .otimizador import METODO_OTIMIZACAO, ROTA_FECHADA, TEMPO_OTIMIZACAO, reparar_rota
+from .planejamento import PONTO_PARTIDA, ErroPlanejamento, gerar_saidas, planejar_rota, verificar_isolados
+from .planilha import ARQUIVO_EXCEL, COLUNA_ENDERECOS, COLUNA_NOMES, ler_planilha_grupos, marcar_enderecos_erro_excel
+from .relatorio import PASTA_ROTAS, caminho_pdf, titulo_rota
+from .util import logger, print_colorido
+
+TEMPO_REPARO = 2.0  # Segundos de busca local depois das inserções
+
+def comparar_planilha(enderecos_estado, enderecos, linhas=None):
+    """Compara a planilha com o estado pela chave normalizada dos endereços.
+
+    enderecos_estado inclui o ponto de partida na posição 0. Retorna (mantidos, novos,
+    removidos): os índices do estado que continuam na planilha, as (linha, endereco)
+    que não estavam no estado e quantas paradas do estado saíram da planilha; linhas
+    são os números de linha de cada endereço (padrão: a posição, a partir de 1).
+    Endereços repetidos na planilha contam uma vez, como no planejamento completo.
+    """
+    restantes = {}
+    for indice, endereco in enumerate(enderecos_estado[1:], 1):
+        restantes.setdefault(chave_endereco(endereco), []).append(indice)
+    mantidos, novos = [], []
+    for i in indexar_enderecos(enderecos)[0]:
+        chave = chave_endereco(enderecos[i])
+        if restantes.get(chave):
+            mantidos.append(restantes[chave].pop(0))
+        else:
+            novos.append((linhas[i] if linhas else i + 1, enderecos[i]))
+    return mantidos, novos, sum(len(v) for v in restantes.values())
+
+def replanejar_rota(cidade, arquivo_excel=ARQUIVO_EXCEL, ponto_partida=PONTO_PARTIDA, pasta_saida=PASTA_ROTAS,
+                    nome_coluna_enderecos=COLUNA_ENDERECOS, nome_coluna_nomes=COLUNA_NOMES,
+                    workers_geocodificacao=6, workers_roteamento=2, usar_pipeline=True,
+                    k_vizinhos=None, simetrica=False, metodo=METODO_OTIMIZACAO,
+                    tempo_otimizacao=TEMPO_OTIMIZACAO, rota_fechada=ROTA_FECHADA, tempo_reparo=TEMPO_REPARO,
+                    revisar_isolados=False, raio_isolados_km=RAIO_OUTLIER_KM, metodo_isolados=METODO_OUTLIER,
+                    perfil=None, etapas_perfil=None):
+    """Atualiza a rota do dia com as mudanças da planilha e retorna o caminho do PDF.
+
+    Sem estado salvo para a cidade no dia (ou com outro ponto de partida ou tipo de
+    rota), faz o planejamento completo com planejar_rota e os mesmos parâmetros. Só as
+    paradas novas são verificadas como pontos isolados.
+    """
+    estado = carregar_estado(caminho_estado(caminho_pdf(titulo_rota(cidade), pasta_saida)))
+    if estado is None or estado['ponto_partida'] != ponto_partida or estado['fechada'] != bool(rota_fechada):
+        print_colorido("ℹ️ Nenhum estado compatível da execução anterior; fazendo o planejamento completo.",
+                       Fore.YELLOW)
+        return planejar_rota(cidade, arquivo_excel, ponto_partida, pasta_saida, nome_coluna_enderecos,
+                             nome_coluna_nomes, workers_geocodificacao, workers_roteamento, usar_pipeline,
+                             k_vizinhos, simetrica, metodo, tempo_otimizacao, rota_fechada,
+                             revisar_isolados, raio_isolados_km, metodo_isolados, perfil=perfil,
+                             etapas_perfil=etapas_perfil)
+
+    parametros = dict(cidade=cidade, arquivo_excel=arquivo_excel, ponto_partida=ponto_partida,
+                      pasta_saida=pasta_saida, nome_coluna_enderecos=nome_coluna_enderecos,
+                      nome_coluna_nomes=nome_coluna_nomes, workers_geocodificacao=workers_geocodificacao,
+                      rota_fechada=rota_fechada, tempo_reparo=tempo_reparo,
+                      revisar_isolados=revisar_isolados, raio_isolados_km=raio_isolados_km,
+                      metodo_isolados=metodo_isolados)
+    with Execucao(dict(parametros, incremental=True), perfil=perfil, etapas_perfil=etapas_perfil) as execucao:
+        return _replanejar_rota(execucao, estado, **parametros)
+
+def _replanejar_rota(execucao, estado, cidade, arquivo_excel, ponto_partida, pasta_saida, nome_coluna_enderecos,
+                     nome_coluna_nomes, workers_geocodificacao, rota_fechada, tempo_reparo, revisar_isolados,
+                     raio_isolados_km, metodo_isolados):
+    print_colorido("\n🚀 Iniciando replanejamento incremental...", Fore.GREEN, Style.BRIGHT)
+    if not os.path.exists(arquivo_excel):
+        raise ErroPlanejamento(f"O arquivo {arquivo_excel} não foi encontrado.")
+
+    # LER PLANILHA
+    print_colorido("\n📊 Lendo planilha...", Fore.CYAN)
+    try:
+        with execucao.etapa('planilha'):
+            linhas, enderecos, nomes, _ = ler_planilha_grupos(arquivo_excel, nome_coluna_enderecos, nome_coluna_nomes)
+    except Exception as e:
+        raise ErroPlanejamento(f"Erro ao ler planilha: {str(e)}") from e
+    if not enderecos:
+        raise ErroPlanejamento("Nenhum endereço encontrado na planilha.")
+
+    mantidos, novos, removidos = comparar_planilha(estado['enderecos'], enderecos, linhas)
+    execucao.contar('enderecos', len(enderecos))
+    execucao.contar('paradas_mantidas', len(mantidos))
+    execucao.contar('paradas_removidas', removidos)
+    print_colorido(f"✅ {len(mantidos)} paradas mantidas, {len(novos)} endereços novos, {removidos} removidos",
+                   Fore.GREEN)
+
+    # GEOCODIFICAÇÃO: só os endereços novos
+    cache_geo = CacheGeocodificacao()
+    enderecos_com_erro = []
+    coords_novas, enderecos_novos, linhas_novas = [], [], []
+    if novos:
+        print_colorido("\n🔄 Geocodificando endereços novos...", Fore.CYAN)
+        with execucao.etapa('geocodificacao'):
+            resultados = geocodificar_lote([e for _, e in novos], cache_geo, max_workers=workers_geocodificacao,
+                                           progresso=logger.isEnabledFor(logging.INFO))
+        for (linha, endereco), (_, coords, _) in zip(novos, resultados):
+            if coords:
+                coords_novas.append(coords)
+                enderecos_novos.append(endereco)
+                linhas_novas.append(linha)
+            else:
+                enderecos_com_erro.append((linha, endereco))
+                print_colorido(f"Erro ao geocodificar: {endereco}", Fore.RED, nivel=logging.WARNING)
+
+    indices_estado = [0] + mantidos
+    n_antigos = len(indices_estado)
+    coordenadas = [estado['coordenadas'][i] for i in indices_estado] + coords_novas
+    enderecos_validos = [estado['enderecos'][i] for i in indices_estado] + enderecos_novos
+    if coords_novas:
+        isolados = verificar_isolados(execucao, coordenadas, enderecos_validos, raio_isolados_km,
+                                      indices=range(n_antigos, len(coordenadas)), metodo=metodo_isolados)
+        if isolados and revisar_isolados:
+            fora = {i - n_antigos for i in isolados}
+            enderecos_com_erro = sorted(enderecos_com_erro + [(linhas_novas[i], enderecos_novos[i]) for i in fora])
+            coords_novas = [c for i, c in enumerate(coords_novas) if i not in fora]
+            enderecos_novos = [e for i, e in enumerate(enderecos_novos) if i not in fora]
+            coordenadas = coordenadas[:n_antigos] + coords_novas
+            enderecos_validos = enderecos_validos[:n_antigos] + enderecos_novos
+    if enderecos_com_erro:
+        marcar_enderecos_erro_excel(arquivo_excel, nome_coluna_enderecos, enderecos_com_erro)
+    execucao.contar('paradas_novas', len(enderecos_novos))
+    execucao.contar('enderecos_com_erro', len(enderecos_com_erro))
+
+    # MATRIZ: submatriz do estado + linhas e colunas das paradas novas
+    n = len(coordenadas)
+    if n <= 1:
+        raise ErroPlanejamento("Nenhum endereço foi geocodificado com sucesso além do ponto de partida.")
+    print_colorido(f"\n📏 Calculando distâncias de {len(coords_novas)} paradas novas...", Fore.CYAN)
+    with execucao.etapa('matriz'):
+        dist_matrix = np.empty((n, n))
+        dist_matrix[:n_antigos, :n_antigos] = estado['matriz'][np.ix_(indices_estado, indices_estado)]
+        if coords_novas:
+            dist_matrix[n_antigos:, :] = calcular_distancias_pares(coords_novas, coordenadas)
+            dist_matrix[:n_antigos, n_antigos:] = calcular_distancias_pares(coordenadas[:n_antigos], coords_novas)
+
+    # ROTA: rota anterior sem as paradas removidas, inserção das novas e reparo local
+    print_colorido("\n🗺️ Atualizando a rota...", Fore.CYAN)
+    posicao = {antigo: novo for novo, antigo in enumerate(indices_estado)}
+    rota_base = [posicao[i] for i in estado['rota'] if i in posicao]
+    with execucao.etapa('otimizacao'):
+        ordem_rota, iteracoes = reparar_rota(dist_matrix, rota_base, range(n_antigos, n), tempo_reparo, rota_fechada)
+    print_colorido(f"Rota reparada: {len(coords_novas)} paradas inseridas, {iteracoes} movimentos da busca local",
+                   Fore.GREEN)
+
+    return gerar_saidas(execucao, cidade, ponto_partida, pasta_saida, linhas, enderecos, nomes, enderecos_validos,
+                        coordenadas, dist_matrix, ordem_rota, rota_fechada, enderecos_com_erro, cache_geo)
@@ -0,0 +1,98 @@
+"""Funções auxiliares compartilhadas pelas etapas do planejador."""
+import logging
+import logging.handlers
+import re
+import sys
+import unicodedata
+import zlib
+
+import colorama
+from colorama import Fore, Style
+
+# Inicializa colorama para Windows
+colorama.init()
+
+logger = logging.getLogger("planejador")
+
+class FormatadorColorido(logging.Formatter):
+    """Aplica a cor e o estilo passados em print_colorido (extra) à mensagem do console"""
+
+    def format(self, record):
+        texto = super().format(record)
+        cor = getattr(record, 'cor', None)
+        if cor is None:
+            return texto
+        return f"{getattr(record, 'estilo', Style.NORMAL)}{cor}{texto}{Style.RESET_ALL}"
+
+def configurar_logging(nivel=logging.INFO, arquivo=None, tamanho_max=5 * 1024 * 1024, backups=3):
+    """Console colorido no nível pedido e, opcionalmente, um arquivo rotativo com tudo a partir de DEBUG.
+
+    No nível INFO o console mostra só o resumo de cada etapa; os detalhes por
+    endereço, por par de pontos e por trecho da rota aparecem em DEBUG.
+    """
+    if isinstance(nivel, str):
+        nivel = logging.getLevelName(nivel.upper())
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(nivel)
+    console.setFormatter(FormatadorColorido("%(message)s"))
+    logger.addHandler(console)
+    if arquivo:
+        em_arquivo = logging.handlers.RotatingFileHandler(arquivo, maxBytes=tamanho_max, backupCount=backups,
+                                                          encoding='utf-8')
+        em_arquivo.setLevel(logging.DEBUG)
+        em_arquivo.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(threadName)s %(message)s"))
+        logger.addHandler(em_arquivo)
+    logger.setLevel(min(nivel, logging.DEBUG) if arquivo else nivel)
+    logger.propagate = False
+    return logger
+
+def print_colorido(texto, cor=Fore.WHITE, estilo=Style.NORMAL, nivel=logging.INFO):
+    logger.log(nivel, texto, extra={'cor': cor, 'estilo': estilo})
+
+# Função para detectar se o endereço está no formato de coordenadas
+
+def is_coordenada(texto):
+    if not isinstance(texto, str):
+        return False
+    # Regex para latitude e longitude: -22.188655, -48.615678 (com ou sem texto adicional)
+    padrao = r"^\s*(-?\d{1,2}\.\d+),\s*(-?\d{1,3}\.\d+)(?:\s*[,;]\s*.*)?$"
+    return re.match(padrao, texto) is not None
+
+def extrair_coordenada(texto):
+    # Regex para extrair apenas latitude e longitude, ignorando texto adicional
+    padrao = r"^\s*(-?\d{1,2}\.\d+),\s*(-?\d{1,3}\.\d+)"
+    m = re.match(padrao, texto)
+    if m:
+        return (float(m.group(1)), float(m.group(2)))
+    return None
+
+# Identificador canônico de um local: as coordenadas na grade de CASAS_COORDENADA casas
+# decimais (~11 m). O mesmo cliente geocodificado com pequenas variações de um mês para o
+# outro, ou colado com mais casas na planilha, vira o mesmo local nos caches e na matriz.
+CASAS_COORDENADA = 4
+
+def ajustar_coordenada(coords):
+    """Coordenadas (lat, lon) arredondadas para a grade de CASAS_COORDENADA casas decimais"""
+    return (round(float(coords[0]), CASAS_COORDENADA), round(float(coords[1]), CASAS_COORDENADA))
+
+def id_local(coords):
+    """Identificador "lat,lon" do local na grade, usado como chave dos caches e das linhas da matriz"""
+    lat, lon = ajustar_coordenada(coords)
+    return f"{lat:.{CASAS_COORDENADA}f},{lon:.{CASAS_COORDENADA}f}"
+
+# Validade das entradas dos caches: cada chave recebe uma variação fixa de ±JITTER_EXPIRACAO,
+# para que as entradas gravadas na mesma execução não vençam todas no mesmo dia
+JITTER_EXPIRACAO = 0.2
+
+def validade_com_jitter(chave, dias):
+    """Validade em segundos da entrada chave: dias com a variação fixa da chave"""
+    fracao = zlib.crc32(chave.encode('utf-8')) / 0xFFFFFFFF
+    return dias * 86400 * (1 + JITTER_EXPIRACAO * (2 * fracao - 1))
+
+# Função para remover acentos
+def remover_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto)
+                  if unicodedata.category(c) != 'Mn')